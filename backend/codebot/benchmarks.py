@@ -0,0 +1,419 @@
+"""
+Benchmarks for the codebot analysis pipeline.
+
+Run from the backend folder, e.g.:
+    python -m codebot.benchmarks scan --files 50000 --workers 8
+    python -m codebot.benchmarks load --files 20000 --node-modules 50000
+    python -m codebot.benchmarks diff --lines 10000,100000 --changes 50
+    python -m codebot.benchmarks pipeline --sizes 1000,10000,100000 --llm-latency 0.5 --output bench.json
+"""
+import os
+import re
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import platform
+import resource
+import tempfile
+import threading
+import subprocess
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from .code_analyzer import find_relevant_files
+from .project_loader import scan_text_files
+
+WORDS = [
+    "user", "todo", "item", "list", "render", "state", "error", "handler", "request",
+    "response", "fetch", "update", "delete", "create", "value", "index", "title",
+    "status", "config", "token", "session", "button", "layout", "format", "parse",
+]
+
+
+def make_synthetic_project(root: str, n_files: int, seed: int = 0) -> str:
+    """
+    Generate a project of n_files small .py/.ts/.json files spread over nested folders.
+    """
+    rng = random.Random(seed)
+    for i in range(n_files):
+        folder = os.path.join(root, f"pkg{i % 50}", f"mod{(i // 50) % 20}")
+        os.makedirs(folder, exist_ok=True)
+        words = " ".join(rng.choice(WORDS) for _ in range(40))
+        kind = i % 3
+        if kind == 0:
+            path = os.path.join(folder, f"file{i}.py")
+            content = f"def {rng.choice(WORDS)}_{i}(value):\n    # {words}\n    return value\n"
+        elif kind == 1:
+            path = os.path.join(folder, f"file{i}.ts")
+            content = f"export function {rng.choice(WORDS)}{i}(value: string) {{\n  // {words}\n  return value;\n}}\n"
+        else:
+            path = os.path.join(folder, f"file{i}.json")
+            content = f'{{"id": {i}, "text": "{words}"}}\n'
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(content)
+    return root
+
+
+def add_noise(root: str, n_dependency_files: int, n_binaries: int = 200) -> None:
+    """
+    Add a node_modules tree and some binary files, like a real checkout.
+    """
+    for i in range(n_dependency_files):
+        folder = os.path.join(root, "node_modules", f"dep{i % 200}", "lib")
+        os.makedirs(folder, exist_ok=True)
+        with open(os.path.join(folder, f"index{i}.js"), "w", encoding="utf-8") as f:
+            f.write(f"module.exports = function dep{i}() {{ return {i}; }};\n")
+    assets = os.path.join(root, "assets")
+    os.makedirs(assets, exist_ok=True)
+    for i in range(n_binaries):
+        with open(os.path.join(assets, f"image{i}.dat"), "wb") as f:
+            f.write(os.urandom(4096) + b"\0")
+
+
+def legacy_load(project_path: str) -> int:
+    """
+    The previous load_project file pass: walk everything, run chardet on
+    2 KB of every file, then read it in full.
+    """
+    import chardet
+
+    count = 0
+    for root, dirs, files in os.walk(project_path):
+        for file in files:
+            full_path = os.path.join(root, file)
+            with open(full_path, "rb") as f:
+                encoding = chardet.detect(f.read(2048))["encoding"]
+            if encoding:
+                with open(full_path, "r", encoding=encoding, errors="ignore") as fr:
+                    fr.read()
+                count += 1
+    return count
+
+
+def timed(func, *args, **kwargs):
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return time.perf_counter() - start, result
+
+
+def bench_scan(n_files: int, workers: int, process_workers: int, top_k: int) -> dict:
+    """
+    Compare the serial walker with the parallel scan on a synthetic tree.
+    """
+    root = tempfile.mkdtemp(prefix="codebot_bench_")
+    try:
+        make_synthetic_project(root, n_files)
+        query = "render error in todo list handler"
+        serial_time, serial = timed(find_relevant_files, root, query, top_k=top_k)
+        parallel_time, parallel = timed(
+            find_relevant_files, root, query, top_k=top_k,
+            workers=workers, process_workers=process_workers,
+        )
+        return {
+            "files": n_files,
+            "workers": workers,
+            "process_workers": process_workers,
+            "serial_s": round(serial_time, 3),
+            "parallel_s": round(parallel_time, 3),
+            "speedup": round(serial_time / parallel_time, 2) if parallel_time else None,
+            "same_results": [s for _, s in serial] == [s for _, s in parallel],
+        }
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+
+def bench_load(n_files: int, n_dependency_files: int, workers: int, legacy: bool) -> dict:
+    """
+    Time the project file pass of load_project on a synthetic tree with
+    node_modules and binaries, optionally against the old chardet-based pass.
+    """
+    root = tempfile.mkdtemp(prefix="codebot_bench_")
+    try:
+        make_synthetic_project(root, n_files)
+        add_noise(root, n_dependency_files)
+        scan_time, text_files = timed(scan_text_files, root, workers=workers)
+        report = {
+            "files": n_files,
+            "dependency_files": n_dependency_files,
+            "workers": workers,
+            "text_files": len(text_files),
+            "scan_s": round(scan_time, 3),
+        }
+        if legacy:
+            try:
+                legacy_time, _ = timed(legacy_load, root)
+                report["legacy_s"] = round(legacy_time, 3)
+                report["speedup"] = round(legacy_time / scan_time, 2) if scan_time else None
+            except ImportError:
+                report["legacy_s"] = "chardet not installed"
+        return report
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+
+def make_generated_file(n_lines: int, repetitive: bool, seed: int = 0):
+    """
+    Lines of a large generated file: mostly distinct lines, or (repetitive)
+    a handful of lines such as braces and returns repeated throughout.
+    """
+    rng = random.Random(seed)
+    if repetitive:
+        vocabulary = ["}", "{", "", "  return value;", "  value += 1;", "  // generated"]
+        return [rng.choice(vocabulary) for _ in range(n_lines)]
+    return [f"export const {rng.choice(WORDS)}{i} = compute({i % 97}, '{rng.choice(WORDS)}');" for i in range(n_lines)]
+
+
+def bench_diff(n_lines: int, n_changes: int, repetitive: bool = False) -> dict:
+    """
+    Diff a generated file against a copy with n_changes edited lines and
+    one inserted line: the fast backend vs difflib.unified_diff.
+    """
+    import difflib
+    from .diffing import diff_lines, changed_lines
+
+    old = make_generated_file(n_lines, repetitive)
+    new = list(old)
+    for k in range(0, n_lines, max(1, n_lines // max(1, n_changes))):
+        new[k] = new[k] + " // fixed"
+    new.insert(n_lines // 2, "// inserted")
+
+    fast_time, hunks = timed(diff_lines, old, new)
+    difflib_time, diff = timed(lambda: list(difflib.unified_diff(old, new, lineterm="")))
+    return {
+        "lines": n_lines,
+        "repetitive": repetitive,
+        "fast_s": round(fast_time, 4),
+        "difflib_s": round(difflib_time, 4),
+        "speedup": round(difflib_time / fast_time, 2) if fast_time else None,
+        "fast_changed_lines": len(changed_lines(hunks)),
+        "difflib_changed_lines": sum(1 for line in diff if line[:1] in "+-" and line[:3] not in ("+++", "---")),
+    }
+
+
+AUDIT_EVENTS = {
+    "open": "file_opens",
+    "os.scandir": "dir_scans",
+    "os.listdir": "dir_scans",
+    "os.stat": "stats",  # not raised by every Python version
+    "subprocess.Popen": "subprocesses",
+}
+_audit_counts = None  # event counters while a stage is measured
+
+
+def _audit_hook(event, args):
+    if _audit_counts is not None and event in AUDIT_EVENTS:
+        key = AUDIT_EVENTS[event]
+        _audit_counts[key] = _audit_counts.get(key, 0) + 1
+
+
+def measure(label: str, report: dict, func, *args, **kwargs):
+    """
+    Run func and store its wall time, the process peak RSS afterwards and
+    the file-open/scandir/subprocess counts seen by the audit hook (all
+    threads) under report["stages"][label]. Returns func's result.
+    """
+    global _audit_counts
+    counts = {}
+    _audit_counts = counts
+    start = time.perf_counter()
+    try:
+        result = func(*args, **kwargs)
+    finally:
+        elapsed = time.perf_counter() - start
+        _audit_counts = None
+    report["stages"][label] = dict(
+        counts, wall_s=round(elapsed, 4), peak_rss_mb=round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    )
+    return result
+
+
+class FakeGeminiHandler(BaseHTTPRequestHandler):
+    """
+    Answers generateContent like Gemini after `latency` seconds. The "fix"
+    is the file named in the prompt, read from disk, with one line added.
+    """
+    latency = 0.0
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        prompt = body["contents"][0]["parts"][0]["text"]
+        time.sleep(self.latency)
+        match = re.search(r"Fix the bug in the following file: (\S+)", prompt)
+        text = fake_fix(match.group(1)) if match else ""
+        payload = json.dumps({
+            "candidates": [{"content": {"parts": [{"text": f"```\n{text}\n```"}]}}],
+            "usageMetadata": {"promptTokenCount": len(prompt) // 4, "candidatesTokenCount": len(text) // 4},
+        }).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *args):
+        pass
+
+
+def fake_fix(file_path: str) -> str:
+    with open(file_path, encoding="utf-8") as f:
+        code = f.read()
+    if file_path.endswith(".json"):
+        data = json.loads(code)
+        data["fixed"] = True
+        return json.dumps(data)
+    comment = "#" if file_path.endswith(".py") else "//"
+    return f"{code.rstrip()}\n{comment} fixed\n"
+
+
+def start_fake_gemini(latency: float):
+    """Start FakeGeminiHandler on a free local port; returns (server, base url)."""
+    handler = type("Handler", (FakeGeminiHandler,), {"latency": latency})
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/v1beta"
+
+
+def git_head(path: str):
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=path, capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def bench_pipeline(n_files: int, llm_latency: float = 0.2, top_k: int = 3, verify: bool = True) -> dict:
+    """
+    Time the fix pipeline end to end on a synthetic project: load_project
+    (cold and unchanged), find_relevant_files, the folder tree,
+    propose_fixes for the top files against a local fake Gemini, and
+    commit_changes for one applied fix. The LLM cache is off so every
+    proposal makes a request. With verify, proposals are syntax-checked;
+    TS files are reported unchecked unless typescript is installed.
+    """
+    from git import Repo
+    from .bot_core import CodeBot
+    from .folder_tree import build_tree
+
+    sys.addaudithook(_audit_hook)  # hooks cannot be removed; it only counts while measure() runs
+    root = tempfile.mkdtemp(prefix="codebot_bench_")
+    server, url = start_fake_gemini(llm_latency)
+    settings = {"CODEBOT_GEMINI_URL": url, "CODEBOT_LLM_CACHE": "0", "CODEBOT_WATCH": "0",
+                "CODEBOT_VERIFY": "1" if verify else "0"}
+    previous = {name: os.environ.get(name) for name in settings}
+    os.environ.update(settings)
+    try:
+        project = os.path.join(root, "project")
+        make_synthetic_project(project, n_files)
+        repo = Repo.init(project)
+        repo.git.add("--all")
+        repo.index.commit("Initial commit")
+
+        report = {"files": n_files, "llm_latency_s": llm_latency, "verify": verify, "stages": {}}
+        bot = CodeBot(storage_dir=os.path.join(root, "store"), gemini_api_key="bench")
+        measure("load_project", report, bot.load_project, project)
+        measure("load_project_unchanged", report, bot.load_project, project)
+        query = "render error in todo list handler"
+        relevant = measure("find_relevant_files", report, bot.find_relevant_files, query, top_k=top_k)
+        measure("folder_tree", report, build_tree, project, 3)
+
+        files = [path for path, _ in relevant]
+        proposals = measure("propose_fixes", report, bot.propose_fixes, files, query)
+        fixed = [p for p in proposals if "fixed_code" in p]
+        report["proposals"] = len(fixed)
+        if fixed:
+            from .utils import write_file
+            write_file(fixed[0]["file"], fixed[0]["fixed_code"])
+            outcome = measure("commit_changes", report, bot.commit_changes, fixed[0]["file"], query)
+            report["committed"] = outcome["commit"] is not None
+        return report
+    finally:
+        server.shutdown()
+        server.server_close()
+        for name, value in previous.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+        shutil.rmtree(root, ignore_errors=True)
+
+
+def run_pipeline_suite(sizes, llm_latency: float, verify: bool = True, output=None) -> dict:
+    """
+    bench_pipeline for each size, each in its own process so peak RSS is
+    per size. The results (with the commit they were measured at) go to
+    output as JSON for comparison across commits.
+    """
+    backend = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    results = {
+        "commit": git_head(backend),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "timestamp": time.time(),
+        "runs": [],
+    }
+    for n_files in sizes:
+        child = subprocess.run(
+            [sys.executable, "-m", "codebot.benchmarks", "pipeline-one",
+             "--files", str(n_files), "--llm-latency", str(llm_latency)] + ([] if verify else ["--no-verify"]),
+            cwd=backend, capture_output=True, text=True, check=True,
+        )
+        results["runs"].append(json.loads(child.stdout.strip().splitlines()[-1]))
+    if output:
+        with open(output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="codebot benchmarks")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    scan = sub.add_parser("scan", help="serial vs parallel find_relevant_files")
+    scan.add_argument("--files", type=int, default=50000)
+    scan.add_argument("--workers", type=int, default=8)
+    scan.add_argument("--process-workers", type=int, default=0)
+    scan.add_argument("--top-k", type=int, default=3)
+
+    load = sub.add_parser("load", help="load_project file pass on a tree with node_modules and binaries")
+    load.add_argument("--files", type=int, default=20000)
+    load.add_argument("--node-modules", type=int, default=50000)
+    load.add_argument("--workers", type=int, default=8)
+    load.add_argument("--no-legacy", action="store_true", help="skip the old chardet-based pass")
+
+    diff = sub.add_parser("diff", help="fast diff backend vs difflib on large generated files")
+    diff.add_argument("--lines", default="10000,100000", help="comma-separated file sizes in lines")
+    diff.add_argument("--changes", type=int, default=50)
+
+    pipeline = sub.add_parser("pipeline", help="load/find/tree/propose/commit with a fake Gemini, one process per size")
+    pipeline.add_argument("--sizes", default="1000,10000,100000", help="comma-separated project sizes")
+    pipeline.add_argument("--llm-latency", type=float, default=0.2, help="seconds the fake Gemini waits per request")
+    pipeline.add_argument("--no-verify", action="store_true", help="skip syntax checks of the proposals")
+    pipeline.add_argument("--output", help="write the results to this JSON file")
+
+    pipeline_one = sub.add_parser("pipeline-one", help="a single pipeline run, printed as JSON")
+    pipeline_one.add_argument("--files", type=int, default=1000)
+    pipeline_one.add_argument("--llm-latency", type=float, default=0.2)
+    pipeline_one.add_argument("--no-verify", action="store_true")
+
+    args = parser.parse_args(argv)
+    if args.command == "scan":
+        print(bench_scan(args.files, args.workers, args.process_workers, args.top_k))
+    elif args.command == "load":
+        print(bench_load(args.files, args.node_modules, args.workers, not args.no_legacy))
+    elif args.command == "diff":
+        for n_lines in [int(size) for size in args.lines.split(",") if size]:
+            for repetitive in (False, True):
+                print(bench_diff(n_lines, args.changes, repetitive))
+    elif args.command == "pipeline":
+        sizes = [int(size) for size in args.sizes.split(",") if size]
+        print(json.dumps(run_pipeline_suite(sizes, args.llm_latency, not args.no_verify, args.output), indent=2))
+    elif args.command == "pipeline-one":
+        print(json.dumps(bench_pipeline(args.files, args.llm_latency, verify=not args.no_verify)))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,20 +1,43 @@
 import os
-import difflib
 import json
-import requests
 import re
 import shutil
-import chardet
+import time
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from git import Repo
 from git import Repo, GitCommandError
-from .utils import read_file, write_file, verify_code
+from .utils import read_file, write_file, text_sha1, verify_code, verify_source, verify_sources
 from .frontend_utils import verify_typescript, verify_json, get_file_type
 from .code_analyzer import find_relevant_files, classify_bug_type
+from .file_index import FileIndex
+from .symbol_index import SymbolIndex
+from .manifest import ProjectManifest
+from .watcher import get_watcher
+from .ranking import get_scorer
+from .llm_cache import get_cache, make_key
+from .http_client import get_client
+from .git_sync import ensure_main_branch, commit_paths, push_in_background
+from .jobs import get_job_queue
+from .context_builder import estimate_tokens, pack_regions, related_context, get_usage_log
+from .patching import number_lines, parse_unified_diff, apply_hunks, PatchError
+from .tracing import span, traced
+from .diffing import diff_texts, unified_diff, changed_lines
+
+GEMINI_MODEL = "gemini-2.0-flash"
+GEMINI_URL = "https://generativelanguage.googleapis.com/v1beta"
+PROMPT_VERSION = 2  # bump when the fix prompt changes so cached responses are not reused
+PATCH_MIN_LINES = 200  # in "auto" patch mode, files at least this long get hunk-level fixes
+
+_remotes_ready = set()  # (repo path, remote url) pairs whose GitHub repo and origin are set up
+_remotes_lock = threading.Lock()
 
 # def extract_code(llm_output: str) -> str:
 #     matches = re.findall(r"```(?:python)?\n(.*?)```", llm_output, re.DOTALL)
 #     return matches[0].strip() if matches else llm_output.strip()
 
+@traced("extract_code")
 def extract_code(llm_output: str) -> str:
     """
     Extract code from LLM output, removing surrounding triple backticks and optional language.
@@ -24,11 +47,43 @@ def extract_code(llm_output: str) -> str:
         return matches[0].strip()  
     return llm_output.strip()
 
-def create_github_repo(token: str, repo_name: str, private: bool = True, description: str = "") -> bool:
+def combine_bug_descriptions(bug_descriptions) -> str:
+    """
+    One fix requirement covering several bugs, as a numbered list.
+    A single description is returned unchanged.
+    """
+    if len(bug_descriptions) == 1:
+        return bug_descriptions[0]
+    numbered = "\n".join(f"{number}. {description}" for number, description in enumerate(bug_descriptions, 1))
+    return f"Fix all of the following bugs that apply to this file (leave the rest alone):\n{numbered}"
+
+
+def iter_sse_text(response, usage=None):
+    """
+    Yield the text parts of a Gemini streamGenerateContent (alt=sse) response.
+    If a usage dict is given it is updated with the events' usageMetadata.
+    """
+    response.encoding = "utf-8"
+    try:
+        for line in response.iter_lines(decode_unicode=True):
+            if not line or not line.startswith("data:"):
+                continue
+            event = json.loads(line[len("data:"):].strip())
+            if usage is not None and "usageMetadata" in event:
+                usage.update(event["usageMetadata"])
+            for candidate in event.get("candidates", [])[:1]:
+                for part in candidate.get("content", {}).get("parts", []):
+                    if part.get("text"):
+                        yield part["text"]
+    finally:
+        response.close()
+
+def create_github_repo(token: str, repo_name: str, private: bool = True, description: str = "", client=None) -> bool:
     """
     Create a repo under the authenticated user's account using GitHub API.
     Returns True on success.
     """
+    client = client or get_client()
     url = "https://api.github.com/user/repos"
     headers = {
         "Authorization": f"token {token}",
@@ -40,7 +95,7 @@ def create_github_repo(token: str, repo_name: str, private: bool = True, descrip
         "description": description,
         "auto_init": False
     }
-    resp = requests.post(url, headers=headers, json=payload)
+    resp = client.post(url, headers=headers, json=payload)
     if resp.status_code in (201,):
         return True
     # If already exists, consider it success
@@ -56,10 +111,16 @@ class CodeBot:
         self.projects_dir = projects_dir
         self.project_path = project_path
         self.project_name = None
-        self.state_file = os.path.join(storage_dir, "project_state.json")
         self.groq_api_key = groq_api_key
         self.gemini_api_key = gemini_api_key
         self.state = {}
+        self.manifest = None
+        self.index = None
+        self.symbols = None
+        self.watcher = None
+        self.last_indexed = None
+        self.lock = threading.RLock()  # guards the indexes when the bot is shared between requests
+        self._memory_estimate = (None, 0)
         if not os.path.exists(self.storage_dir):
             os.makedirs(self.storage_dir)
 
@@ -68,101 +129,344 @@ class CodeBot:
         self.github_user = os.getenv("GITHUB_USERNAME")
         self.github_repo_name = os.getenv("GITHUB_REPO_NAME")  # optional pre-created name
 
+        # LLM request tuning (optional)
+        self.llm_concurrency = int(os.getenv("CODEBOT_LLM_CONCURRENCY", "3"))
+        self.llm_timeout = float(os.getenv("CODEBOT_LLM_TIMEOUT", "120"))
+        self.load_workers = int(os.getenv("CODEBOT_LOAD_WORKERS", "8"))
+        self.patch_mode = os.getenv("CODEBOT_PATCH_MODE", "auto")  # auto | always | off
+        self.watch = os.getenv("CODEBOT_WATCH", "0") == "1"  # keep indexes hot with a file watcher
+        self.verify = os.getenv("CODEBOT_VERIFY", "1") != "0"  # syntax-check proposals before preview
+        self.verify_retries = int(os.getenv("CODEBOT_VERIFY_RETRIES", "1"))  # re-prompts after a failed check
+        self.context_tokens = int(os.getenv("CODEBOT_CONTEXT_TOKENS", "6000"))  # budget for code sent per request
+        self.related_tokens = int(os.getenv("CODEBOT_RELATED_TOKENS", "800"))  # budget for imported files' signatures
+        self.gemini_url = os.getenv("CODEBOT_GEMINI_URL", GEMINI_URL).rstrip("/")  # e.g. a local stub for benchmarks
+        self.usage = get_usage_log()
+        self.http = get_client()
+        self.llm_cache = None
+        if os.getenv("CODEBOT_LLM_CACHE", "1") != "0":
+            self.llm_cache = get_cache(
+                storage_dir,
+                use_disk=os.getenv("CODEBOT_LLM_CACHE_DISK", "1") != "0",
+                ttl=float(os.getenv("CODEBOT_LLM_CACHE_TTL", str(24 * 60 * 60))),
+            )
+
     def load_project(self, project_path):
-        self.project_path = os.path.abspath(project_path)
-        self.project_name = os.path.basename(project_path.rstrip("/"))
+        project_path = os.path.abspath(project_path)
+        with self.lock:
+            if project_path != self.project_path or self.manifest is None:
+                # Another project: reopen its saved manifest and indexes
+                self.manifest = None
+                self.index = None
+                self.symbols = None
+                self.watcher = None
+            self.project_path = project_path
+            self.project_name = os.path.basename(project_path.rstrip("/"))
+            if self.watch:
+                self.watcher = get_watcher(self.project_path, start=True)
+
+            # Stat the tree against the saved manifest; only new or changed files are
+            # hashed, re-tokenized and re-parsed for symbols
+            self.refresh_project()
+            for rel_path in self.manifest.text_files():
+                self.state[f"{self.project_name}/{rel_path}"] = {"functions": []}
+            for rel_path, symbols in self.symbols.functions_by_file().items():
+                self.state[f"{self.project_name}/{rel_path}"] = symbols
 
-        # Copy files safely
-        for root, dirs, files in os.walk(project_path):
-            for file in files:
-                full_path = os.path.join(root, file)
-                rel_path = os.path.relpath(full_path, project_path)
+        # Initialize Git repo if not exists
+        if not os.path.exists(os.path.join(self.project_path, ".git")):
+            Repo.init(self.project_path)
 
-                try:
-                    with open(full_path, "rb") as f:
-                        raw = f.read(2048) 
-                        result = chardet.detect(raw)
-                        encoding = result["encoding"]
+        print(f"Project '{self.project_name}' loaded successfully!")
 
-                    if encoding:  # treat as text
-                        with open(full_path, "r", encoding=encoding, errors="ignore") as fr:
-                            content = fr.read()
-                        self.state[f"{self.project_name}/{rel_path}"] = {"functions": []}
+    def refresh_project(self):
+        """
+        Bring the manifest, token index and symbol index up to date with the
+        files on disk, loading them from storage_dir first if needed. With a
+        file watcher running only the paths it reported are looked at.
+        Returns the (changed, removed) relative paths seen by the manifest.
+        """
+        with self.lock:
+            return self._refresh_project()
+
+    def _refresh_project(self):
+        if self.manifest is None:
+            self.manifest = ProjectManifest.open(self.project_path, self.storage_dir)
+        watcher = self.get_watcher()
+        with span("project_walk"):
+            if watcher is not None and not watcher.needs_full_scan:
+                changed, removed = self.manifest.apply_changes(watcher.drain_changes(), workers=self.load_workers)
+            else:
+                if watcher is not None:
+                    # Drain before walking: anything reported after this is applied next time
+                    watcher.needs_full_scan = False
+                    watcher.drain_changes()
+                changed, removed = self.manifest.refresh(workers=self.load_workers)
+        if changed or removed:
+            print(f"Manifest: {len(changed)} changed and {len(removed)} removed files")
+        self.manifest.save()
+
+        if self.index is None:
+            self.index = FileIndex.open(self.project_path, self.storage_dir)
+        with span("index_sync"):
+            indexed, dropped = self.index.sync(self.manifest.source_files())
+        if indexed or dropped:
+            print(f"Indexed {len(indexed)} changed and {len(dropped)} removed files")
+        self.index.save()  # writes only the rows of changed files, if any
+
+        self._sync_symbols()
+        self.last_indexed = time.time()
+        if watcher is not None:
+            watcher.mark_indexed()
+        return changed, removed
+
+    def get_watcher(self):
+        """
+        The running ProjectWatcher for this project, if any (see CODEBOT_WATCH).
+        """
+        if self.watcher is None and self.project_path:
+            self.watcher = get_watcher(self.project_path)
+        return self.watcher
 
-                    # else:  # binary file
-                    #     # shutil.copy2(full_path, dest_file)
-                    #     print(f"⚠️ Skipping binary file {full_path}")
+    def read_source(self, file_path: str) -> str:
+        """
+        Read a project file, through the watcher's content cache when one is running.
+        """
+        watcher = self.get_watcher()
+        abs_path = os.path.abspath(file_path)
+        if watcher is not None and abs_path.startswith(watcher.project_path + os.sep):
+            return watcher.read(os.path.relpath(abs_path, watcher.project_path))
+        return read_file(file_path)
 
+    def get_index(self) -> FileIndex:
+        """
+        Return the project's token index, re-tokenizing only files whose
+        content changed since it was saved. The symbol index is kept in step with it.
+        """
+        self.refresh_project()
+        return self.index
 
-                except Exception as e:
-                    print(f"⚠️ Skipping {full_path}: {e}")
-                    # shutil.copy2(full_path, dest_file)
+    def get_symbols(self) -> SymbolIndex:
+        """
+        Return the project's function/class index (see SymbolIndex.lookup).
+        """
+        self.get_index()
+        return self.symbols
 
-        # Initialize Git repo if not exists
-        if not os.path.exists(os.path.join(self.project_path, ".git")):
-            Repo.init(self.project_path)
+    def _sync_symbols(self) -> None:
+        if self.symbols is None:
+            self.symbols = SymbolIndex.open(self.project_path, self.storage_dir)
+        self.symbols.sync(self.index.indexed_files())
+        self.symbols.save()  # writes only the rows of changed files, if any
 
-        print(f"Project '{self.project_name}' loaded successfully!")
+    def find_relevant_files(self, bug_description: str, min_score: float = 0.3, top_k=None):
+        """
+        Rank project files for a bug description with BM25 over the token index.
+        """
+        with self.lock:
+            scorer = get_scorer(self.get_index())
+            with span("score"):
+                return find_relevant_files(self.project_path, bug_description, min_score=min_score, scorer=scorer, top_k=top_k)
 
-    def smart_fix_bug(self, bug_description: str) -> None:
+    def approx_memory_bytes(self) -> int:
         """
-        Automatically find and fix bugs based on description without requiring file path
+        Rough size of the in-memory manifest and indexes, recomputed when the token index changes.
+        """
+        with self.lock:
+            if self.index is None:
+                return 0
+            if self._memory_estimate[0] == self.index.generation:
+                return self._memory_estimate[1]
+            positions = sum(len(hits) for postings in self.index.postings.values() for hits in postings.values())
+            symbols = sum(len(entry["symbols"]) for entry in self.symbols.files.values()) if self.symbols else 0
+            manifest = len(self.manifest.files) if self.manifest else 0
+            size = 36 * positions + 200 * len(self.index.postings) + 400 * (manifest + len(self.index.files)) + 300 * symbols
+            self._memory_estimate = (self.index.generation, size)
+            return size
+
+    def smart_fix_bug(self, bug_description: str, should_stop=None) -> dict:
+        """
+        Automatically find and fix bugs based on description without requiring file path.
+        Returns a summary with the proposal for each file looked at.
+        should_stop is an optional callable checked between files (used for job cancellation).
         """
         if not self.project_path:
             print("No project loaded. Please load a project first.")
-            return
+            return {"message": "No project loaded", "files": []}
 
         # Find potentially relevant files
         print("Analyzing project files to locate the bug...")
-        relevant_files = find_relevant_files(self.project_path, bug_description)
+        relevant_files = self.find_relevant_files(bug_description, top_k=3)
 
         if not relevant_files:
             print("Could not find any relevant files matching the bug description.")
-            return
+            return {"message": "No relevant files found for this bug.", "files": []}
 
         # Get bug type classification
         bug_types = classify_bug_type(bug_description)
         most_likely_type = max(bug_types.items(), key=lambda x: x[1])[0]
         print(f"Bug appears to be {most_likely_type}-related\n")
 
-        # Process files in order of relevance
+        # Generate fixes for the top files concurrently
         files_fixed = False
-        for file_path, score in relevant_files[:3]:  # Look at top 3 most relevant files
+        scores = dict(relevant_files)
+        results = []
+        for file_path, response in self.iter_proposals([path for path, _ in relevant_files], bug_description):
             rel_path = os.path.relpath(file_path, self.project_path)
-            print(f"\nAnalyzing {rel_path} (relevance score: {score:.2f})")
-            
-            try:
-                response = self._propose_fix(file_path, bug_description)
-                if response:
-                    print(f"Successfully fixed {rel_path}")
-                    files_fixed = True
-            except Exception as e:
-                print(f"Error while fixing {rel_path}: {str(e)}")
-            
+            print(f"\nAnalyzed {rel_path} (relevance score: {scores[file_path]:.2f})")
+            if "error" in response:
+                print(f"Error while fixing {rel_path}: {response['error']}")
+            elif response.get("changes"):
+                print(f"Successfully fixed {rel_path}")
+                files_fixed = True
+            results.append({"file": file_path, "score": scores[file_path], "proposal": response})
+            if should_stop is not None and should_stop():
+                print("Bug fixing cancelled.")
+                break
+
         if not files_fixed:
             print("\nNo files were successfully fixed for this bug.")
 
+        return {"bug_type": most_likely_type, "files": results}
+
+    def smart_fix_bugs(self, bug_descriptions, should_stop=None, top_k: int = 3) -> dict:
+        """
+        Batch version of smart_fix_bug. Every description is ranked against
+        the token index in one pass, the descriptions are grouped by the
+        files they point at, and each file gets a single LLM request
+        covering all of its bugs.
+        Returns {"bugs": [{"description", "bug_type", "files"}], "files": [...]}
+        where each file entry also lists the indexes of its bugs.
+        """
+        bug_descriptions = [d.strip() for d in bug_descriptions if d and d.strip()]
+        if not self.project_path:
+            print("No project loaded. Please load a project first.")
+            return {"message": "No project loaded", "bugs": [], "files": []}
+        if not bug_descriptions:
+            return {"message": "No bug descriptions given", "bugs": [], "files": []}
+
+        print(f"Analyzing project files to locate {len(bug_descriptions)} bugs...")
+        with self.lock:
+            scorer = get_scorer(self.get_index())
+            with span("score"):
+                ranked = [
+                    find_relevant_files(self.project_path, description, scorer=scorer, top_k=top_k)
+                    for description in bug_descriptions
+                ]
+
+        bugs = []
+        by_file = {}  # file path -> (indexes of its bugs, best score), in first-seen order
+        for number, (description, relevant_files) in enumerate(zip(bug_descriptions, ranked)):
+            bug_types = classify_bug_type(description)
+            bugs.append({
+                "description": description,
+                "bug_type": max(bug_types.items(), key=lambda x: x[1])[0],
+                "files": [path for path, _ in relevant_files],
+            })
+            for file_path, score in relevant_files:
+                numbers, best = by_file.get(file_path, ([], 0.0))
+                by_file[file_path] = (numbers + [number], max(best, score))
+
+        if not by_file:
+            print("Could not find any relevant files matching the bug descriptions.")
+            return {"message": "No relevant files found for these bugs.", "bugs": bugs, "files": []}
+
+        prompts = {
+            file_path: combine_bug_descriptions([bug_descriptions[number] for number in numbers])
+            for file_path, (numbers, _) in by_file.items()
+        }
+        # Rank patch regions on the bug texts alone, not the combined prompt's wording
+        queries = {
+            file_path: "\n".join(bug_descriptions[number] for number in numbers)
+            for file_path, (numbers, _) in by_file.items()
+        }
+        print(f"{len(bug_descriptions)} bugs touch {len(by_file)} files; sending one request per file")
+
+        results = []
+        for file_path, response in self.iter_proposals(list(by_file), prompts, queries=queries):
+            numbers, score = by_file[file_path]
+            rel_path = os.path.relpath(file_path, self.project_path)
+            if "error" in response:
+                print(f"Error while fixing {rel_path}: {response['error']}")
+            elif response.get("changes"):
+                print(f"Proposed a fix for {rel_path} covering {len(numbers)} bug(s)")
+            results.append({"file": file_path, "score": score, "bugs": numbers, "proposal": response})
+            if should_stop is not None and should_stop():
+                print("Bug fixing cancelled.")
+                break
+
+        return {"bugs": bugs, "files": results}
+
+    def iter_proposals(self, file_paths, prompt, on_chunk=None, queries=None):
+        """
+        Run _propose_fix for several files concurrently (at most llm_concurrency
+        LLM calls in flight) and yield (file_path, proposal) as each one completes.
+        prompt is one bug description for all files, or a {file_path: prompt} dict.
+        queries optionally maps file paths to the text their regions are ranked
+        on, when that should differ from the prompt.
+        A failed file yields {"file": ..., "error": ...} instead of raising.
+        If on_chunk is given, responses are streamed and on_chunk(file_path, text)
+        is called from the worker threads for every partial chunk.
+        """
+        if not file_paths:
+            return
+
+        def propose(file_path):
+            file_prompt = prompt[file_path] if isinstance(prompt, dict) else prompt
+            query = (queries or {}).get(file_path)
+            if on_chunk is None:
+                return self._propose_fix(file_path, file_prompt, query=query)
+            return self._propose_fix(file_path, file_prompt, on_chunk=lambda text: on_chunk(file_path, text), query=query)
+
+        workers = max(1, min(self.llm_concurrency, len(file_paths)))
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            # Each worker runs in a copy of our context so its spans reach the request's trace
+            futures = {
+                pool.submit(contextvars.copy_context().run, propose, file_path): file_path
+                for file_path in file_paths
+            }
+            try:
+                for future in as_completed(futures):
+                    file_path = futures[future]
+                    try:
+                        yield file_path, future.result()
+                    except Exception as e:
+                        yield file_path, {"file": file_path, "error": str(e)}
+            finally:
+                # If the caller stops early, don't start the remaining LLM calls
+                for future in futures:
+                    future.cancel()
+
+    def propose_fixes(self, file_paths, prompt: str) -> list:
+        """
+        Concurrent _propose_fix for several files, returned in the order given.
+        """
+        proposals = dict(self.iter_proposals(file_paths, prompt))
+        return [proposals[file_path] for file_path in file_paths]
+
 
-    def _propose_fix(self, file_path: str, prompt: str) -> dict:
+    def _propose_fix(self, file_path: str, prompt: str, on_chunk=None, query=None) -> dict:
         """
         Generate proposed fixes for a file, but don't apply them yet.
         Returns a dict with proposed changes, so the UI can confirm.
+        query is the text patch regions are ranked on (default: prompt).
         """
         if not os.path.exists(file_path):
             return {"error": f"File {file_path} not found."}
 
         # Read and fix code
-        code = read_file(file_path)
-        fixed_code = self.get_groq_fix(code, file_path, prompt)
-        fixed_code_clean = extract_code(fixed_code)
-
-        # Generate diff
-        code_lines = code.splitlines()
-        fixed_lines = fixed_code_clean.splitlines()
-        diff = list(difflib.unified_diff(code_lines, fixed_lines, lineterm=''))
-
-        # Only keep meaningful changes (+ / - lines)
-        changes = [line for line in diff if line.startswith('+ ') or line.startswith('- ')]
+        code = self.read_source(file_path)
+        fixed_code_clean = self._request_fix(code, file_path, prompt, on_chunk=on_chunk, query=query)
+        if fixed_code_clean is None:
+            return {
+                "file": file_path,
+                "error": f"File is larger than the context budget ({self.context_tokens} tokens) and no patch for it applied.",
+            }
+        fixed_code_clean, verification = self._verify_proposal(code, file_path, prompt, fixed_code_clean, query=query)
+
+        # Diff once; the hunks give the changed lines, the unified text and the UI view
+        with span("diff"):
+            hunks = diff_texts(code, fixed_code_clean)
+        changes = changed_lines(hunks)
 
         if not changes:
             return {"message": "No changes needed"}
@@ -170,10 +474,78 @@ class CodeBot:
         return {
             "file": file_path,
             "changes": changes,
-            "full_diff": "\n".join(diff),
-            "fixed_code": fixed_code_clean
+            "full_diff": unified_diff(hunks),
+            "hunks": hunks,
+            "fixed_code": fixed_code_clean,
+            "original_sha1": text_sha1(code),
+            "verification": verification,
         }
 
+    def _verify_proposal(self, code: str, file_path: str, prompt: str, fixed_code: str, query=None):
+        """
+        Syntax-check a proposed fix in memory. On failure the model is asked
+        again, with the checker's errors, up to verify_retries times.
+        Returns (fixed code, verification) where verification is
+        {"checked", "passed", "errors", "attempts"}.
+        """
+        if not self.verify:
+            return fixed_code, {"checked": False, "passed": None, "errors": "", "attempts": 1}
+
+        attempts = 1
+        passed, errors = verify_source(file_path, fixed_code)
+        while passed is False and attempts <= self.verify_retries:
+            print(f"Fix for {file_path} failed verification, asking again ({attempts}/{self.verify_retries})")
+            retry_prompt = f"{prompt}\n\nA previous fix for this file did not pass a syntax check:\n{errors}\n"
+            retried = self._request_fix(code, file_path, retry_prompt, query=query or prompt)
+            if retried is None:
+                break
+            fixed_code = retried
+            attempts += 1
+            passed, errors = verify_source(file_path, fixed_code)
+        return fixed_code, {"checked": passed is not None, "passed": passed, "errors": errors, "attempts": attempts}
+
+    def _request_fix(self, code: str, file_path: str, prompt: str, on_chunk=None, query=None):
+        """
+        Ask the model for a fixed version of code without sending more than
+        context_tokens of it: a patch of the relevant regions in patch mode,
+        and the whole file only when it fits the budget.
+        Returns the fixed code, or None if neither could be used.
+        """
+        if self._use_patch_mode(code):
+            fixed_code = self._propose_patch(code, file_path, prompt, on_chunk=on_chunk, query=query)
+            if fixed_code is not None:
+                return fixed_code
+        if estimate_tokens(code) > self.context_tokens:
+            print(f"{file_path} does not fit the context budget and no patch applied; not sending the whole file")
+            return None
+        return extract_code(self.get_groq_fix(code, file_path, prompt, on_chunk=on_chunk))
+
+    def _use_patch_mode(self, code: str) -> bool:
+        if self.patch_mode == "always":
+            return True
+        if self.patch_mode == "auto":
+            return code.count("\n") + 1 >= PATCH_MIN_LINES or estimate_tokens(code) > self.context_tokens
+        return False
+
+    def _propose_patch(self, code: str, file_path: str, prompt: str, on_chunk=None, regions=None, query=None):
+        """
+        Ask only for a diff of the regions relevant to the bug and apply it.
+        Regions are ranked on query, or on the prompt when query is None.
+        Returns the patched code, or None if no region was found or the
+        model's diff does not apply (the caller then falls back to a full-file fix
+        if the file fits the context budget).
+        """
+        if regions is None:
+            symbols = self.symbols.symbols_for(file_path) if self.symbols is not None else None
+            regions = pack_regions(code, file_path, query or prompt, self.context_tokens, symbols=symbols)
+        if not regions:
+            return None
+        try:
+            diff_text = self.get_groq_patch(code, file_path, prompt, regions, on_chunk=on_chunk)
+            return apply_hunks(code, parse_unified_diff(extract_code(diff_text)))
+        except PatchError as e:
+            print(f"Patch for {file_path} did not apply ({e}), requesting the full file instead")
+            return None
 
     def _apply_fix(self, file_path: str, fixed_code_clean: str, prompt: str) -> dict:
         """
@@ -201,15 +573,88 @@ class CodeBot:
         #     return {"status": "failed", "error": error_message}
 
 
+    def apply_fixes(self, fixes: list, message: str, commit: bool = True) -> dict:
+        """
+        Apply several file edits as one transaction. fixes is a list of
+        {"file_path", "fixed_code", "original_sha1"?}. A fix with original_sha1
+        (the proposal's hash of the file it was made from) is refused with
+        status "stale" if the file has changed since. All files are
+        syntax-checked together in memory first; nothing is written unless
+        every check passes. Files are then written atomically, and if any
+        write fails the ones already written are restored. The batch is
+        committed once.
+        """
+        paths = [fix["file_path"] for fix in fixes]
+        if len(set(paths)) != len(paths):
+            return {"status": "failed", "error": "The same file appears more than once in the batch"}
+
+        stale = []
+        for fix in fixes:
+            if fix.get("original_sha1"):
+                try:
+                    current = text_sha1(read_file(fix["file_path"]))
+                except (OSError, UnicodeDecodeError):
+                    current = None
+                if current != fix["original_sha1"]:
+                    stale.append(fix["file_path"])
+        if stale:
+            return {
+                "status": "stale",
+                "error": "Files changed after the fix was proposed; no files were changed",
+                "files": stale,
+            }
+
+        checks = verify_sources([(fix["file_path"], fix["fixed_code"]) for fix in fixes])
+        results = [
+            {"file": path, "passed": passed, "errors": errors}
+            for path, (passed, errors) in zip(paths, checks)
+        ]
+        if any(result["passed"] is False for result in results):
+            return {"status": "failed", "error": "Verification failed; no files were changed", "results": results}
+
+        originals = {}
+        try:
+            for fix in fixes:
+                path = fix["file_path"]
+                originals[path] = read_file(path) if os.path.exists(path) else None
+                write_file(path, fix["fixed_code"])
+        except Exception as e:
+            for path, original in originals.items():
+                try:
+                    if original is None:
+                        if os.path.exists(path):
+                            os.remove(path)
+                    else:
+                        write_file(path, original)
+                except OSError as restore_error:
+                    print(f"Failed to roll back {path}: {restore_error}")
+            return {"status": "failed", "error": f"Writing fixes failed, changes rolled back: {e}", "results": results}
+
+        for result in results:
+            result["message"] = f"Applied and verified {result['file']}"
+        if commit:
+            self.commit_changes(paths, message)
+        return {"status": "success", "message": f"Applied and verified {len(paths)} file(s)", "results": results}
+
     def fix_bug(self, func_name_or_file, prompt):
         """
-        Legacy method for fixing bugs in a specific file
+        Legacy method for fixing bugs in a specific file or function.
+        A function/class name is resolved through the symbol index and only its
+        span is sent to the model; otherwise the file goes through _request_fix,
+        so no more than context_tokens of it is sent.
         """
         target_file = None
-        for key, meta in self.state.items():
-            if func_name_or_file in meta.get("functions", []) or func_name_or_file in key:
-                target_file = key
-                break
+        symbol_span = None
+        if self.project_path:
+            definitions = self.get_symbols().lookup(func_name_or_file)
+            if definitions:
+                target_file = definitions[0]["file"]
+                symbol_span = (definitions[0]["start"] - 1, definitions[0]["end"] - 1)
+        if not target_file:
+            for key, meta in self.state.items():
+                if func_name_or_file in key:
+                    target_file = os.path.join(os.path.dirname(self.project_path), key) if self.project_path else key
+                    break
         if not target_file:
             target_file = f"{func_name_or_file}"
 
@@ -219,16 +664,17 @@ class CodeBot:
             return
 
         code = read_file(file_path)
-        fixed_code = self.get_groq_fix(code, target_file, prompt)
-        fixed_code_clean = extract_code(fixed_code)
-
-        # Split code into lines
-        code_lines = code.splitlines()
-        fixed_lines = fixed_code_clean.splitlines()
+        fixed_code_clean = None
+        if symbol_span is not None and estimate_tokens(number_lines(code.splitlines(), *symbol_span)) <= self.context_tokens:
+            fixed_code_clean = self._propose_patch(code, file_path, prompt, regions=[symbol_span])
+        if fixed_code_clean is None:
+            fixed_code_clean = self._request_fix(code, file_path, prompt)
+        if fixed_code_clean is None:
+            print(f"Could not fix {target_file} within the context budget ({self.context_tokens} tokens)")
+            return
 
-        # Use difflib to find differences
-        diff = difflib.unified_diff(code_lines, fixed_lines, lineterm='')
-        changes = [line for line in diff if line.startswith('+ ') or line.startswith('- ')]
+        with span("diff"):
+            changes = changed_lines(diff_texts(code, fixed_code_clean))
         
         if changes:
             print("Changes made:")
@@ -240,18 +686,9 @@ class CodeBot:
         write_file(file_path, fixed_code_clean)
         print(f"Bug fixed in {target_file}")
 
-        # Determine file type and verify accordingly
-        file_type = get_file_type(file_path)
-        verification_passed = False
-        error_message = ""
-
-        if file_type == 'typescript':
-            verification_passed, error_message = verify_typescript(file_path)
-        elif file_type == 'json':
-            verification_passed, error_message = verify_json(file_path)
-        elif file_path.endswith('.py'):  # Python files
-            verification_passed = verify_code(file_path)
-        else:
+        # Verify the fixed source in memory according to its file type
+        verification_passed, error_message = verify_source(file_path, fixed_code_clean)
+        if verification_passed is None:
             print(f"Warning: No syntax verification available for this file type")
             verification_passed = True  # Skip verification for unsupported types
 
@@ -265,15 +702,130 @@ class CodeBot:
         self.commit_changes(file_path, prompt)
 
 
-    def get_groq_fix(self, code, file_path, prompt):
+    def get_groq_fix(self, code, file_path, prompt, on_chunk=None):
+        """
+        Ask Gemini for a fixed version of the file. Identical requests
+        (same model, prompt version, file content and bug description) are
+        answered from the LLM cache.
+        With on_chunk, the streaming endpoint is used and on_chunk(text) is
+        called for each partial chunk; the full text is still returned.
+        """
+        with span("prompt_build"):
+            related = self.related_context(code, file_path)
+            cache_key = make_key(GEMINI_MODEL, PROMPT_VERSION, file_path, code, prompt, related)
+            llm_prompt = self.build_fix_prompt(code, file_path, prompt, related)
+        return self._generate(llm_prompt, cache_key, on_chunk=on_chunk, label=("fix", file_path))
+
+    def get_groq_patch(self, code, file_path, prompt, regions, on_chunk=None):
+        """
+        Ask Gemini for a unified diff that fixes the bug, sending only the
+        given (start, end) line regions of the file instead of the whole file.
+        """
+        with span("prompt_build"):
+            related = self.related_context(code, file_path)
+            cache_key = make_key(GEMINI_MODEL, PROMPT_VERSION, "patch", file_path, code, prompt, regions, related)
+            llm_prompt = self.build_patch_prompt(code, file_path, prompt, regions, related)
+        return self._generate(llm_prompt, cache_key, on_chunk=on_chunk, label=("patch", file_path))
+
+    def related_context(self, code, file_path):
+        """
+        Imports and signatures of the project files that file_path imports, within related_tokens.
+        """
+        def symbols_for(path):
+            return self.symbols.symbols_for(path) if self.symbols is not None else []
+
+        return related_context(code, file_path, self.project_path, self.related_tokens, self.read_source, symbols_for)
+
+    def _generate(self, llm_prompt, cache_key, on_chunk=None, label=("fix", None)):
+        """
+        Send one prompt to Gemini (streaming when on_chunk is given), going
+        through the LLM cache, and record its token usage and latency.
+        """
+        started = time.perf_counter()
+        estimated = estimate_tokens(llm_prompt)
+        if self.llm_cache is not None:
+            cached = self.llm_cache.get(cache_key)
+            if cached is not None:
+                if on_chunk is not None:
+                    on_chunk(cached)
+                self.usage.record(label[0], label[1], 0, 0, estimated, time.perf_counter() - started, cached=True)
+                return cached
 
-        url = f"https://generativelanguage.googleapis.com/v1beta/models/gemini-2.0-flash:generateContent?key={self.gemini_api_key}"
         headers = {"Content-Type": "application/json"}
 
+        data = {
+            "contents": [
+                {
+                    "parts": [{"text": llm_prompt}]
+                }
+            ]
+        }
+
+        with span("llm"):
+            if on_chunk is None:
+                url = f"{self.gemini_url}/models/{GEMINI_MODEL}:generateContent?key={self.gemini_api_key}"
+                response = self.http.post(url, headers=headers, data=json.dumps(data), timeout=self.llm_timeout)
+                response.raise_for_status()
+                result = response.json()
+                text = result["candidates"][0]["content"]["parts"][0]["text"]
+                usage = result.get("usageMetadata", {})
+            else:
+                url = f"{self.gemini_url}/models/{GEMINI_MODEL}:streamGenerateContent?alt=sse&key={self.gemini_api_key}"
+                response = self.http.post(url, headers=headers, data=json.dumps(data), timeout=self.llm_timeout, stream=True)
+                response.raise_for_status()
+                chunks = []
+                usage = {}
+                for chunk in iter_sse_text(response, usage):
+                    chunks.append(chunk)
+                    on_chunk(chunk)
+                text = "".join(chunks)
+
+        self.usage.record(
+            label[0], label[1], usage.get("promptTokenCount", 0), usage.get("candidatesTokenCount", 0),
+            estimated, time.perf_counter() - started,
+        )
+        if self.llm_cache is not None:
+            self.llm_cache.set(cache_key, text)
+        return text
+
+    def build_patch_prompt(self, code, file_path, prompt, regions, related=""):
         file_type = get_file_type(file_path)
         language = "TypeScript" if file_type == "typescript" else "JSON" if file_type == "json" else "Python"
+        lines = code.splitlines()
+        excerpts = "\n    ...\n".join(number_lines(lines, start, end) for start, end in regions)
 
-        llm_prompt = f"""
+        return f"""
+    You are a code-fixing assistant specializing in {language}.
+    Task: Fix the bug in the file {file_path} ({len(lines)} lines).
+    Only the parts of the file relevant to the bug are shown below, with line numbers.
+
+    IMPORTANT:
+    - Return ONLY a unified diff (--- a/file, +++ b/file, @@ -start,count +start,count @@ hunks).
+    - Context and removed lines must be copied exactly from the code shown, without the line number prefix.
+    - Change only what is needed to fix the bug.
+    - Do NOT include explanations.
+    - Maintain proper syntax, types, and best practices for {language}.
+
+    Code excerpts:
+{excerpts}
+{self._related_section(related)}
+    Fix requirement:
+    {prompt}
+    """
+
+    def _related_section(self, related):
+        if not related:
+            return ""
+        return f"""
+    Signatures from files it imports (for reference, do not return them):
+{related}
+"""
+
+    def build_fix_prompt(self, code, file_path, prompt, related=""):
+        file_type = get_file_type(file_path)
+        language = "TypeScript" if file_type == "typescript" else "JSON" if file_type == "json" else "Python"
+
+        return f"""
     You are a code-fixing assistant specializing in {language}.
     Task: Fix the bug in the following file: {file_path}
 
@@ -287,30 +839,24 @@ class CodeBot:
 
     Code:
     {code}
-
+{self._related_section(related)}
     Fix requirement:
     {prompt}
     """
 
-        data = {
-            "contents": [
-                {
-                    "parts": [{"text": llm_prompt}]
-                }
-            ]
-        }
-
-        response = requests.post(url, headers=headers, data=json.dumps(data))
-        response.raise_for_status()
-        result = response.json()
-
-        return result["candidates"][0]["content"]["parts"][0]["text"]
-
 
     def commit_changes(self, file_path, message):
         """
         Commit locally then push to GitHub if credentials are available.
+        file_path may be a list of paths committed together. Only those paths
+        are staged, the GitHub repo and origin remote are set up once per
+        project, and the push runs on the background job queue with retries.
+        Returns {"commit": sha or None, "push_job": job id or None}.
         """
+        file_paths = [file_path] if isinstance(file_path, str) else list(file_path)
+        file_path = file_paths[0]
+        outcome = {"commit": None, "push_job": None}
+
         # Find project root containing .git
         repo_path = os.path.dirname(file_path)
         while repo_path and not os.path.exists(os.path.join(repo_path, ".git")):
@@ -321,45 +867,56 @@ class CodeBot:
 
         if not os.path.exists(os.path.join(repo_path, ".git")):
             print(f"No git repository found for {file_path}. Aborting push.")
-            return
+            return outcome
 
         repo = Repo(repo_path)
 
         # Commit changes locally
         try:
-            repo.git.add(all=True)
-            # Ensure a branch "main" exists and is current
-            try:
-                repo.git.rev_parse("--verify", "main")
-                repo.git.checkout("main")
-            except GitCommandError:
-                # rename current branch to main
-                try:
-                    repo.git.branch("-M", "main")
-                except GitCommandError:
-                    pass
-            repo.index.commit(f"CodeBot fix: {message} in {os.path.relpath(file_path, repo_path)}")
-            print(f"Local commit created for {file_path}")
+            ensure_main_branch(repo)
+            changed = ", ".join(os.path.relpath(path, repo_path) for path in file_paths)
+            outcome["commit"] = commit_paths(repo, repo_path, file_paths, f"CodeBot fix: {message} in {changed}")
+            if outcome["commit"] is None:
+                print(f"Nothing to commit for {changed}")
+                return outcome
+            print(f"Local commit created for {changed}")
         except Exception as e:
             print(f"Failed to create local commit: {e}")
-            return
+            return outcome
 
         # If GitHub credentials are available, push
         if not self.github_token or not self.github_user:
             print("GITHUB_TOKEN or GITHUB_USERNAME not set in .env — skipping push to GitHub.")
-            return
+            return outcome
+
+        if not self._ensure_remote(repo, repo_path):
+            return outcome
+
+        outcome["push_job"] = push_in_background(
+            repo_path, get_job_queue(self.storage_dir), retries=int(os.getenv("CODEBOT_PUSH_RETRIES", "3")),
+        )
+        return outcome
 
+    def _ensure_remote(self, repo, repo_path) -> bool:
+        """
+        Make sure the GitHub repo exists and origin points at it. Done once per
+        project and remote URL; later commits skip the API call and remote checks.
+        """
         # Determine repo name to use on GitHub
         repo_name = self.github_repo_name if self.github_repo_name else os.path.basename(repo_path)
 
+        # Remote URL uses token for authentication. Note: token in URL is sensitive.
+        remote_url = f"https://{self.github_token}@github.com/{self.github_user}/{repo_name}.git"
+        ready_key = (os.path.abspath(repo_path), remote_url)
+        with _remotes_lock:
+            if ready_key in _remotes_ready:
+                return True
+
         # Create remote repo if needed (safe-check)
-        created = create_github_repo(self.github_token, repo_name, private=True, description=f"Repo for {repo_name} created by CodeBot")
+        created = create_github_repo(self.github_token, repo_name, private=True, description=f"Repo for {repo_name} created by CodeBot", client=self.http)
         if not created:
             print("Could not ensure remote GitHub repository exists. Skipping push.")
-            return
-
-        # Remote URL uses token for authentication. Note: token in URL is sensitive.
-        remote_url = f"https://{self.github_token}@github.com/{self.github_user}/{repo_name}.git"
+            return False
 
         # Add or set origin
         try:
@@ -374,14 +931,9 @@ class CodeBot:
                 repo.create_remote("origin", remote_url)
             except Exception as e:
                 print(f"Failed to create remote origin: {e}")
-                return
-
-        # Push to GitHub
-        try:
-            # push main and set upstream
-            repo.git.push("--set-upstream", "origin", "main")
-            print(f"Pushed changes to https://github.com/{self.github_user}/{repo_name}")
-        except GitCommandError as e:
-            print(f"Failed to push to remote: {e}")
-
+                return False
 
+        with _remotes_lock:
+            _remotes_ready.add(ready_key)
+        print(f"Pushing to https://github.com/{self.github_user}/{repo_name}")
+        return True
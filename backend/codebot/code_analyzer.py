@@ -1,69 +1,195 @@
 import os
 import re
-from typing import List, Dict, Tuple
+import heapq
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, FIRST_COMPLETED, wait
+from typing import List, Dict, Tuple, Optional
 
-EXCLUDE_DIRS = {"venv", "__pycache__", ".git", "codebot"}
+EXCLUDE_DIRS = {"venv", "__pycache__", ".git", "codebot", "node_modules", "dist", "build"}
+SOURCE_EXTENSIONS = ('.py', '.tsx', '.ts', '.js', '.jsx', '.json', '.css', '.html')
+LARGE_FILE_CHARS = 256 * 1024  # files above this are tokenized in the process pool, if any
+
+WORD_RE = re.compile(r'\w+')
+SUBWORD_RE = re.compile(r'[A-Z]+(?![a-z])|[A-Z]?[a-z]+|\d+')
+
+
+def tokenize(text: str) -> List[Tuple[str, int]]:
+    """
+    Split text into lowercase (token, position) pairs.
+    Identifiers such as getUserName or user_id also yield their parts
+    (get, user, name / user, id) at the same position.
+    """
+    tokens = []
+    for position, match in enumerate(WORD_RE.finditer(text)):
+        word = match.group()
+        lowered = word.lower()
+        tokens.append((lowered, position))
+        parts = SUBWORD_RE.findall(word)
+        if len(parts) > 1:
+            for part in parts:
+                tokens.append((part.lower(), position))
+    return tokens
+
+
+def query_terms(bug_description: str) -> List[str]:
+    """
+    Extract the distinct search terms from a bug description.
+    """
+    return sorted({token for token, _ in tokenize(bug_description)})
+
+
+def is_excluded_dir(name: str) -> bool:
+    """
+    Folders never worth walking: VCS metadata, virtualenvs, caches, dependencies and build output.
+    """
+    return name in EXCLUDE_DIRS or name.startswith('.') or name.endswith('env')
+
+
+def iter_project_files(project_path: str):
+    """
+    Yield the paths of all files in the project, pruning excluded folders before descending.
+    """
+    for root, dirs, files in os.walk(project_path):
+
+        dirs[:] = [d for d in dirs if not is_excluded_dir(d)]
+
+        for file in files:
+            if file.startswith('.') and any(excluded in file for excluded in EXCLUDE_DIRS):
+                continue
+            yield os.path.join(root, file)
+
+
+def iter_source_files(project_path: str):
+    """
+    Yield the paths of all source files in the project, skipping excluded folders.
+    """
+    for file_path in iter_project_files(project_path):
+        if file_path.endswith(SOURCE_EXTENSIONS):
+            yield file_path
+
+def score_content(content: str, key_terms) -> float:
+    """
+    Score already-read file content against a set of bug description terms.
+    Returns a score between 0 and 1.
+    """
+    if not key_terms:
+        return 0.0
+
+    # Count matching terms in the content
+    matched = set(key_terms) & {token for token, _ in tokenize(content)}
+
+    # Calculate basic relevance score
+    score = len(matched) / len(key_terms)
+
+    # Boost score based on specific indicators
+    if 'error' in matched:
+        score += 0.2
+    if 'bug' in matched:
+        score += 0.2
+
+    return min(score, 1.0)  # Cap at 1.0
 
 def analyze_file_content(file_path: str, bug_description: str) -> float:
     """
     Analyze a file's content to determine how likely it is to contain the described bug.
     Returns a score between 0 and 1, where 1 means highly likely.
+    Terms are matched as whole tokens, so "id" does not match inside "width".
     """
     try:
         with open(file_path, 'r', encoding='utf-8') as f:
-            content = f.read().lower()
-        
-        # Convert description to lowercase for case-insensitive matching
-        bug_description = bug_description.lower()
-        
-        # Extract key terms from bug description
-        key_terms = set(re.findall(r'\w+', bug_description))
-        
-        # Count matching terms in the content
-        matches = sum(1 for term in key_terms if term in content)
-        
-        # Calculate basic relevance score
-        score = matches / len(key_terms) if key_terms else 0
-        
-        # Boost score based on specific indicators
-        if 'error' in content and 'error' in bug_description:
-            score += 0.2
-        if 'bug' in content and 'bug' in bug_description:
-            score += 0.2
-            
-        return min(score, 1.0)  # Cap at 1.0
+            content = f.read()
+        return score_content(content, frozenset(query_terms(bug_description)))
     except:
         return 0.0
 
-def find_relevant_files(project_path: str, bug_description: str, min_score: float = 0.3) -> List[Tuple[str, float]]:
+def _collect(results, item, top_k: Optional[int]) -> None:
     """
-    Find files that are likely to contain the described bug.
-    Returns a list of (file_path, relevance_score) tuples.
+    Add a (score, file_path) item to the results, keeping at most top_k of them in a min-heap.
     """
-    relevant_files = []
-    project_path = project_path.strip()
+    if top_k is None:
+        results.append(item)
+    elif len(results) < top_k:
+        heapq.heappush(results, item)
+    elif item > results[0]:
+        heapq.heappushpop(results, item)
 
-    for root, dirs, files in os.walk(project_path):
+def _scan_parallel(files, key_terms, min_score: float, top_k: Optional[int],
+                   workers: int, process_workers: int) -> List[Tuple[float, str]]:
+    """
+    Score files on a thread pool. Large files are handed to a process pool
+    for tokenization when process_workers > 0. At most a few tasks per worker
+    are in flight at once, so memory stays bounded on huge trees.
+    """
+    results = []
+    process_pool = ProcessPoolExecutor(max_workers=process_workers) if process_workers > 0 else None
 
-        dirs[:] = [d for d in dirs if d not in EXCLUDE_DIRS and not d.startswith('.') and not d.endswith('env')]
+    def score_path(file_path):
+        try:
+            with open(file_path, 'r', encoding='utf-8') as f:
+                content = f.read()
+            if process_pool is not None and len(content) >= LARGE_FILE_CHARS:
+                return process_pool.submit(score_content, content, key_terms).result()
+            return score_content(content, key_terms)
+        except Exception:
+            return 0.0
 
-        for file in files:
-            if file.startswith('.') and any(excluded in file for excluded in EXCLUDE_DIRS):
-                continue
-            if file.endswith(('.py', '.tsx', '.ts', '.js', '.jsx', '.json', '.css', '.html')):
-                file_path = os.path.join(root, file)
-                try:
-                    score = analyze_file_content(file_path, bug_description)
-                except Exception as e:
-                    print(f"Error analyzing {file_path}: {e}")
-                    continue
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            pending = {}
+            max_in_flight = workers * 4
+            for file_path in files:
+                if len(pending) >= max_in_flight:
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        score = future.result()
+                        if score >= min_score:
+                            _collect(results, (score, pending[future]), top_k)
+                        del pending[future]
+                pending[pool.submit(score_path, file_path)] = file_path
+            for future, file_path in pending.items():
+                score = future.result()
                 if score >= min_score:
-                    relevant_files.append((file_path, score))
+                    _collect(results, (score, file_path), top_k)
+    finally:
+        if process_pool is not None:
+            process_pool.shutdown()
+    return results
+
+def find_relevant_files(project_path: str, bug_description: str, min_score: float = 0.3,
+                        scorer=None, top_k: Optional[int] = None,
+                        workers: int = 0, process_workers: int = 0) -> List[Tuple[str, float]]:
+    """
+    Find files that are likely to contain the described bug.
+    Returns a list of (file_path, relevance_score) tuples, best first.
+    If a scorer (see ranking.BM25Scorer) is given, files are ranked from its
+    index instead of being read; its scores are relative to the best match,
+    which must first clear the scorer's absolute floor (BM25_MIN_SCORE).
+    top_k limits the result to the k best files.
+    Without a scorer, workers > 0 scans files on a thread pool and
+    process_workers > 0 tokenizes large files in separate processes.
+    """
+    if scorer is not None:
+        return [(path, score) for path, score in scorer.score(bug_description, top_k=top_k) if score >= min_score]
+
+    project_path = project_path.strip()
+    key_terms = frozenset(query_terms(bug_description))
+
+    if workers > 0:
+        results = _scan_parallel(iter_source_files(project_path), key_terms, min_score, top_k, workers, process_workers)
+    else:
+        results = []
+        for file_path in iter_source_files(project_path):
+            try:
+                with open(file_path, 'r', encoding='utf-8') as f:
+                    score = score_content(f.read(), key_terms)
+            except Exception as e:
+                print(f"Error analyzing {file_path}: {e}")
+                continue
+            if score >= min_score:
+                _collect(results, (score, file_path), top_k)
 
-    
     # Sort by relevance score in descending order
-    relevant_files.sort(key=lambda x: x[1], reverse=True)
-    return relevant_files
+    results.sort(reverse=True)
+    return [(file_path, score) for score, file_path in results]
 
 def classify_bug_type(bug_description: str) -> Dict[str, float]:
     """
@@ -0,0 +1,186 @@
+import os
+import re
+import threading
+from collections import deque
+from typing import Callable, List, Optional, Tuple
+
+from .patching import rank_blocks, merge_ranges, number_lines, CONTEXT_LINES
+
+CHARS_PER_TOKEN = 4  # rough average for code with Gemini/GPT-style tokenizers
+
+PY_IMPORT_RE = re.compile(r'^\s*(?:from\s+(\.*[\w.]*)\s+import\b|import\s+([\w.]+))', re.M)
+SCRIPT_IMPORT_RE = re.compile(
+    r'''(?:import|export)\s[^'";]*?from\s+['"](\.{1,2}/[^'"]+)['"]'''
+    r'''|import\s+['"](\.{1,2}/[^'"]+)['"]'''
+    r'''|require\(\s*['"](\.{1,2}/[^'"]+)['"]\s*\)'''
+)
+SCRIPT_SUFFIXES = ('', '.ts', '.tsx', '.js', '.jsx', '/index.ts', '/index.tsx', '/index.js')
+
+_usage_log = None
+_usage_lock = threading.Lock()
+
+
+def estimate_tokens(text: str) -> int:
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def pack_regions(code: str, file_path: str, bug_description: str, budget_tokens: int,
+                 symbols=None, context: int = CONTEXT_LINES) -> List[Tuple[int, int]]:
+    """
+    The most relevant blocks of a file (keyword hits widened to their
+    enclosing function/class, see patching.rank_blocks) that fit in
+    budget_tokens once line-numbered, as merged 0-based ranges in file order.
+    Blocks are taken best first; if even the best one is too big it is cut
+    at the budget.
+    """
+    lines = code.splitlines()
+    chosen = []
+    for (start, end), _ in rank_blocks(lines, file_path, bug_description, symbols):
+        start, end = max(0, start - context), min(len(lines) - 1, end + context)
+        candidate = merge_ranges(chosen + [(start, end)])
+        cost = sum(estimate_tokens(number_lines(lines, s, e)) for s, e in candidate)
+        if cost <= budget_tokens:
+            chosen = candidate
+        elif not chosen:
+            used = 0
+            clipped = start
+            while clipped < end and used + estimate_tokens(number_lines(lines, clipped, clipped)) <= budget_tokens:
+                used += estimate_tokens(number_lines(lines, clipped, clipped))
+                clipped += 1
+            chosen = [(start, max(start, clipped - 1))]
+    return chosen
+
+
+def _existing(candidates) -> Optional[str]:
+    for path in candidates:
+        if os.path.isfile(path):
+            return path
+    return None
+
+
+def imported_files(code: str, file_path: str, project_path: str) -> List[str]:
+    """
+    Project files imported by a Python or TS/JS file: relative imports,
+    and for Python also absolute module paths under the project root.
+    """
+    folder = os.path.dirname(os.path.abspath(file_path))
+    found = []
+    if file_path.endswith('.py'):
+        for relative, absolute in PY_IMPORT_RE.findall(code):
+            module = relative or absolute
+            dots = len(module) - len(module.lstrip('.'))
+            parts = [part for part in module.lstrip('.').split('.') if part]
+            if not parts:
+                continue
+            if dots:
+                base = folder
+                for _ in range(dots - 1):
+                    base = os.path.dirname(base)
+                roots = [base]
+            else:
+                roots = [project_path, folder]
+            for root in roots:
+                target = os.path.join(root, *parts)
+                path = _existing([target + '.py', os.path.join(target, '__init__.py')])
+                if path:
+                    found.append(path)
+                    break
+    elif file_path.endswith(('.ts', '.tsx', '.js', '.jsx')):
+        for groups in SCRIPT_IMPORT_RE.findall(code):
+            spec = next(group for group in groups if group)
+            target = os.path.normpath(os.path.join(folder, spec))
+            path = _existing(target + suffix for suffix in SCRIPT_SUFFIXES)
+            if path:
+                found.append(path)
+
+    project_path = os.path.abspath(project_path)
+    unique = []
+    for path in found:
+        path = os.path.abspath(path)
+        if path.startswith(project_path + os.sep) and path != os.path.abspath(file_path) and path not in unique:
+            unique.append(path)
+    return unique
+
+
+def outline(code: str, symbols: List[dict]) -> str:
+    """
+    Import lines plus the signature line of every function/class, no bodies.
+    """
+    lines = code.splitlines()
+    keep = set()
+    for number, line in enumerate(lines):
+        if re.match(r'\s*(import\s|from\s+\S+\s+import\s|export\s.*\sfrom\s)', line):
+            keep.add(number)
+    for symbol in symbols:
+        for number in range(symbol["start"] - 1, min(symbol["end"], len(lines))):
+            if symbol["name"] in lines[number]:
+                keep.add(number)
+                break
+    return "\n".join(lines[number] for number in sorted(keep))
+
+
+def related_context(code: str, file_path: str, project_path: str, budget_tokens: int,
+                    read: Callable[[str], str], symbols_for: Callable[[str], List[dict]]) -> str:
+    """
+    Outlines of the project files imported by file_path, as many as fit in budget_tokens.
+    """
+    if not project_path or budget_tokens <= 0:
+        return ""
+    parts = []
+    used = 0
+    for path in imported_files(code, file_path, project_path):
+        try:
+            summary = outline(read(path), symbols_for(path))
+        except (OSError, UnicodeDecodeError):
+            continue
+        if not summary:
+            continue
+        part = f"# {os.path.relpath(path, project_path)}\n{summary}"
+        cost = estimate_tokens(part)
+        if used + cost > budget_tokens:
+            break
+        parts.append(part)
+        used += cost
+    return "\n\n".join(parts)
+
+
+class UsageLog:
+    """
+    Per-request LLM token counts and latency: the model's reported
+    usageMetadata when available, alongside our own prompt estimate.
+    Keeps the last max_records requests and running totals.
+    """
+
+    def __init__(self, max_records: int = 1000):
+        self.records = deque(maxlen=max_records)
+        self.totals = {"requests": 0, "cached": 0, "prompt_tokens": 0, "output_tokens": 0,
+                       "estimated_prompt_tokens": 0, "latency_s": 0.0}
+        self._lock = threading.Lock()
+
+    def record(self, kind: str, file_path: str, prompt_tokens: int, output_tokens: int,
+               estimated_prompt_tokens: int, latency_s: float, cached: bool = False) -> dict:
+        entry = {
+            "kind": kind, "file": file_path, "prompt_tokens": prompt_tokens, "output_tokens": output_tokens,
+            "estimated_prompt_tokens": estimated_prompt_tokens, "latency_s": round(latency_s, 4), "cached": cached,
+        }
+        with self._lock:
+            self.records.append(entry)
+            self.totals["requests"] += 1
+            self.totals["cached"] += int(cached)
+            self.totals["prompt_tokens"] += prompt_tokens
+            self.totals["output_tokens"] += output_tokens
+            self.totals["estimated_prompt_tokens"] += estimated_prompt_tokens
+            self.totals["latency_s"] += latency_s
+        return entry
+
+    def summary(self, recent: int = 20) -> dict:
+        with self._lock:
+            return {"totals": dict(self.totals), "recent": list(self.records)[-recent:] if recent > 0 else []}
+
+
+def get_usage_log() -> UsageLog:
+    global _usage_log
+    with _usage_lock:
+        if _usage_log is None:
+            _usage_log = UsageLog()
+        return _usage_log
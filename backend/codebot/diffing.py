@@ -0,0 +1,274 @@
+"""
+Line diffs as structured hunks, computed once and reused for a proposal's
+"changes", "full_diff" and "hunks".
+
+The default "fast" backend trims the common prefix and suffix, maps lines to
+integer ids, anchors on lines that occur once on each side (patience diff) and
+runs Myers' O(ND) diff on the gaps between anchors. Gaps that would need more
+than MYERS_MAX_EDITS edits are reported as one replaced block instead.
+The "difflib" backend uses difflib.SequenceMatcher, as before.
+"""
+import os
+import difflib
+from bisect import bisect_left
+from typing import Callable, Dict, List, Tuple
+
+CONTEXT_LINES = 3
+MYERS_MAX_EDITS = 2000  # Myers keeps O(D^2) state; larger gaps become a single replace
+
+Opcode = Tuple[str, int, int, int, int]
+
+
+def _hash_lines(a: List[str], b: List[str]) -> Tuple[List[int], List[int]]:
+    ids: Dict[str, int] = {}
+    return [ids.setdefault(line, len(ids)) for line in a], [ids.setdefault(line, len(ids)) for line in b]
+
+
+def _unique_anchors(a, b, a_lo, a_hi, b_lo, b_hi) -> List[Tuple[int, int]]:
+    """
+    Pairs (i, j) of lines that occur exactly once in a[a_lo:a_hi] and in
+    b[b_lo:b_hi], reduced to the longest run increasing on both sides.
+    """
+    counts: Dict[int, list] = {}
+    for i in range(a_lo, a_hi):
+        entry = counts.get(a[i])
+        if entry is None:
+            counts[a[i]] = [1, i, 0, -1]
+        else:
+            entry[0] += 1
+    for j in range(b_lo, b_hi):
+        entry = counts.get(b[j])
+        if entry is not None:
+            entry[2] += 1
+            entry[3] = j
+    pairs = sorted((entry[1], entry[3]) for entry in counts.values() if entry[0] == 1 and entry[2] == 1)
+    if not pairs:
+        return []
+
+    # Longest increasing subsequence on j (patience sorting)
+    tails: List[int] = []
+    tail_index: List[int] = []
+    previous = [-1] * len(pairs)
+    for k, (_, j) in enumerate(pairs):
+        pos = bisect_left(tails, j)
+        if pos == len(tails):
+            tails.append(j)
+            tail_index.append(k)
+        else:
+            tails[pos] = j
+            tail_index[pos] = k
+        previous[k] = tail_index[pos - 1] if pos else -1
+    anchors = []
+    k = tail_index[-1]
+    while k != -1:
+        anchors.append(pairs[k])
+        k = previous[k]
+    anchors.reverse()
+    return anchors
+
+
+def _myers(a, b, a_lo, a_hi, b_lo, b_hi, max_edits: int):
+    """
+    Matching (i, j) pairs of a shortest edit script between the two ranges,
+    or None if it needs more than max_edits edits.
+    """
+    n, m = a_hi - a_lo, b_hi - b_lo
+    limit = min(n + m, max_edits)
+    offset = limit + 1
+    v = [0] * (2 * limit + 3)
+    trace = []
+    for d in range(limit + 1):
+        trace.append(v[offset - d - 1:offset + d + 2])
+        for k in range(-d, d + 1, 2):
+            if k == -d or (k != d and v[offset + k - 1] < v[offset + k + 1]):
+                x = v[offset + k + 1]
+            else:
+                x = v[offset + k - 1] + 1
+            y = x - k
+            while x < n and y < m and a[a_lo + x] == b[b_lo + y]:
+                x += 1
+                y += 1
+            v[offset + k] = x
+            if x >= n and y >= m:
+                return _backtrack(trace, d, n, m, a_lo, b_lo)
+    return None
+
+
+def _backtrack(trace, d, n, m, a_lo, b_lo) -> List[Tuple[int, int]]:
+    matches = []
+    x, y = n, m
+    for depth in range(d, 0, -1):
+        v = trace[depth]  # v[k] of the previous round, stored as k + depth + 1
+        k = x - y
+        if k == -depth or (k != depth and v[k - 1 + depth + 1] < v[k + 1 + depth + 1]):
+            prev_k = k + 1
+        else:
+            prev_k = k - 1
+        prev_x = v[prev_k + depth + 1]
+        prev_y = prev_x - prev_k
+        while x > prev_x and y > prev_y:
+            x -= 1
+            y -= 1
+            matches.append((a_lo + x, b_lo + y))
+        x, y = prev_x, prev_y
+    while x > 0 and y > 0:
+        x -= 1
+        y -= 1
+        matches.append((a_lo + x, b_lo + y))
+    matches.reverse()
+    return matches
+
+
+def _matches(a: List[int], b: List[int], max_edits: int) -> List[Tuple[int, int]]:
+    """Matching (i, j) line pairs between a and b, in order."""
+    matches = []
+    stack = [(0, len(a), 0, len(b))]
+    while stack:
+        a_lo, a_hi, b_lo, b_hi = stack.pop()
+        while a_lo < a_hi and b_lo < b_hi and a[a_lo] == b[b_lo]:
+            matches.append((a_lo, b_lo))
+            a_lo += 1
+            b_lo += 1
+        while a_lo < a_hi and b_lo < b_hi and a[a_hi - 1] == b[b_hi - 1]:
+            a_hi -= 1
+            b_hi -= 1
+            matches.append((a_hi, b_hi))
+        if a_lo == a_hi or b_lo == b_hi:
+            continue
+
+        anchors = _unique_anchors(a, b, a_lo, a_hi, b_lo, b_hi)
+        if anchors:
+            start_a, start_b = a_lo, b_lo
+            for i, j in anchors:
+                matches.append((i, j))
+                stack.append((start_a, i, start_b, j))
+                start_a, start_b = i + 1, j + 1
+            stack.append((start_a, a_hi, start_b, b_hi))
+        else:
+            found = _myers(a, b, a_lo, a_hi, b_lo, b_hi, max_edits)
+            if found:
+                matches.extend(found)
+    matches.sort()
+    return matches
+
+
+def fast_opcodes(a: List[str], b: List[str], max_edits: int = MYERS_MAX_EDITS) -> List[Opcode]:
+    """
+    difflib-style opcodes ("equal", "replace", "delete", "insert") from the
+    patience/Myers diff of two line lists.
+    """
+    hashed_a, hashed_b = _hash_lines(a, b)
+    opcodes = []
+    i = j = 0
+    for mi, mj in _matches(hashed_a, hashed_b, max_edits) + [(len(a), len(b))]:
+        if i < mi and j < mj:
+            opcodes.append(("replace", i, mi, j, mj))
+        elif i < mi:
+            opcodes.append(("delete", i, mi, j, j))
+        elif j < mj:
+            opcodes.append(("insert", i, i, j, mj))
+        if mi < len(a):
+            if opcodes and opcodes[-1][0] == "equal":
+                tag, i1, _, j1, _ = opcodes.pop()
+                opcodes.append(("equal", i1, mi + 1, j1, mj + 1))
+            else:
+                opcodes.append(("equal", mi, mi + 1, mj, mj + 1))
+        i, j = mi + 1, mj + 1
+    return opcodes
+
+
+def difflib_opcodes(a: List[str], b: List[str]) -> List[Opcode]:
+    return difflib.SequenceMatcher(None, a, b).get_opcodes()
+
+
+BACKENDS: Dict[str, Callable[[List[str], List[str]], List[Opcode]]] = {
+    "fast": fast_opcodes,
+    "difflib": difflib_opcodes,
+}
+
+
+def _group(opcodes: List[Opcode], context: int) -> List[List[Opcode]]:
+    """Changes with `context` equal lines around them, split where the gap is wider (as difflib does)."""
+    if not opcodes or all(tag == "equal" for tag, *_ in opcodes):
+        return []
+    codes = list(opcodes)
+    if codes[0][0] == "equal":
+        tag, i1, i2, j1, j2 = codes[0]
+        codes[0] = tag, max(i1, i2 - context), i2, max(j1, j2 - context), j2
+    if codes[-1][0] == "equal":
+        tag, i1, i2, j1, j2 = codes[-1]
+        codes[-1] = tag, i1, min(i2, i1 + context), j1, min(j2, j1 + context)
+
+    groups = []
+    group = []
+    for tag, i1, i2, j1, j2 in codes:
+        if tag == "equal" and i2 - i1 > 2 * context:
+            group.append((tag, i1, min(i2, i1 + context), j1, min(j2, j1 + context)))
+            groups.append(group)
+            group = []
+            i1, j1 = max(i1, i2 - context), max(j1, j2 - context)
+        group.append((tag, i1, i2, j1, j2))
+    if group and not (len(group) == 1 and group[0][0] == "equal"):
+        groups.append(group)
+    return groups
+
+
+def _format_range(start: int, stop: int) -> str:
+    beginning, length = start + 1, stop - start
+    if length == 1:
+        return str(beginning)
+    if not length:
+        beginning -= 1
+    return f"{beginning},{length}"
+
+
+def diff_lines(a: List[str], b: List[str], context: int = CONTEXT_LINES, backend: str = None) -> List[dict]:
+    """
+    Hunks turning line list a into b. Each hunk is {"old_start", "old_count",
+    "new_start", "new_count" (1-based, as in a unified diff header),
+    "header", "lines"} where lines are " "/"-"/"+" prefixed.
+    backend defaults to CODEBOT_DIFF_BACKEND ("fast" or "difflib").
+    """
+    opcodes = BACKENDS[backend or os.getenv("CODEBOT_DIFF_BACKEND", "fast")](a, b)
+    hunks = []
+    for group in _group(opcodes, context):
+        first, last = group[0], group[-1]
+        lines = []
+        for tag, i1, i2, j1, j2 in group:
+            if tag == "equal":
+                lines.extend(" " + line for line in a[i1:i2])
+                continue
+            if tag in ("replace", "delete"):
+                lines.extend("-" + line for line in a[i1:i2])
+            if tag in ("replace", "insert"):
+                lines.extend("+" + line for line in b[j1:j2])
+        old_range, new_range = _format_range(first[1], last[2]), _format_range(first[3], last[4])
+        hunks.append({
+            "old_start": first[1] + 1,
+            "old_count": last[2] - first[1],
+            "new_start": first[3] + 1,
+            "new_count": last[4] - first[3],
+            "header": f"@@ -{old_range} +{new_range} @@",
+            "lines": lines,
+        })
+    return hunks
+
+
+def diff_texts(old: str, new: str, context: int = CONTEXT_LINES, backend: str = None) -> List[dict]:
+    return diff_lines(old.splitlines(), new.splitlines(), context=context, backend=backend)
+
+
+def unified_diff(hunks: List[dict]) -> str:
+    """The hunks as unified diff text, like "\\n".join(difflib.unified_diff(..., lineterm=''))."""
+    if not hunks:
+        return ""
+    parts = ["--- ", "+++ "]
+    for hunk in hunks:
+        parts.append(hunk["header"])
+        parts.extend(hunk["lines"])
+    return "\n".join(parts)
+
+
+def changed_lines(hunks: List[dict]) -> List[str]:
+    """Every removed and added line, "-"/"+" prefixed."""
+    return [line for hunk in hunks for line in hunk["lines"] if line[:1] in ("-", "+")]
@@ -0,0 +1,194 @@
+import os
+import hashlib
+from typing import Dict, List, Set, Tuple
+
+from .code_analyzer import tokenize, iter_source_files
+from .row_store import RowStore
+
+INDEX_VERSION = 2
+MAX_INDEX_FILE_BYTES = 2 * 1024 * 1024  # skip huge generated/minified files
+
+
+def index_path_for(project_path: str, storage_dir: str) -> str:
+    """
+    Location of the on-disk index for a project inside storage_dir.
+    """
+    key = hashlib.sha1(os.path.abspath(project_path).encode("utf-8")).hexdigest()[:12]
+    return os.path.join(storage_dir, f"index_{key}.sqlite3")
+
+
+class FileIndex:
+    """
+    Persistent inverted index of the project's source files.
+
+    postings maps term -> {relative path: [token positions]} and files maps
+    relative path -> {"mtime", "size", "length"}. Files are only re-tokenized
+    when their mtime or size changes. Files too large or unreadable to index
+    are kept with "skipped": True so they compare as unchanged next time.
+
+    The index is stored as one row per file (its entry and its terms), and
+    file_terms lists each file's terms, so updating or saving a changed file
+    only touches that file's postings and row.
+    """
+
+    def __init__(self, project_path: str, index_path: str):
+        self.project_path = os.path.abspath(project_path)
+        self.index_path = index_path
+        self.store = RowStore(index_path, INDEX_VERSION, self.project_path)
+        self.files: Dict[str, dict] = {}
+        self.postings: Dict[str, Dict[str, List[int]]] = {}
+        self.file_terms: Dict[str, List[str]] = {}
+        self.generation = 0  # bumped on every change so scorers can refresh corpus stats
+        self._dirty: Set[str] = set()  # paths whose row needs writing (or deleting) on save
+
+    @classmethod
+    def open(cls, project_path: str, storage_dir: str) -> "FileIndex":
+        """
+        Load the index for a project from storage_dir, or start an empty one.
+        """
+        index = cls(project_path, index_path_for(project_path, storage_dir))
+        index.load()
+        return index
+
+    def load(self) -> None:
+        rows = self.store.load()
+        if not rows:
+            return
+        for rel_path, row in rows.items():
+            self.files[rel_path] = row["file"]
+            for term, positions in row["terms"].items():
+                self.postings.setdefault(term, {})[rel_path] = positions
+            self.file_terms[rel_path] = list(row["terms"])
+        self.generation += 1
+
+    def save(self) -> None:
+        """
+        Write the rows of the files changed or removed since the last save.
+        """
+        if not self._dirty:
+            return
+        rows = {
+            rel_path: {
+                "file": self.files[rel_path],
+                "terms": {term: self.postings[term][rel_path] for term in self.file_terms.get(rel_path, ())},
+            }
+            for rel_path in self._dirty if rel_path in self.files
+        }
+        self.store.write(rows, [rel_path for rel_path in self._dirty if rel_path not in self.files])
+        self._dirty.clear()
+
+    def refresh(self) -> Tuple[List[str], List[str]]:
+        """
+        Bring the index up to date with the files on disk.
+        Only stats unchanged files; changed and new files are re-tokenized.
+        Returns (changed, removed) relative paths.
+        """
+        seen = {}
+        for file_path in iter_source_files(self.project_path):
+            try:
+                st = os.stat(file_path)
+            except OSError:
+                continue
+            seen[os.path.relpath(file_path, self.project_path)] = st
+
+        changed = [
+            rel_path for rel_path, st in seen.items()
+            if rel_path not in self.files
+            or self.files[rel_path]["mtime"] != st.st_mtime
+            or self.files[rel_path]["size"] != st.st_size
+        ]
+        removed = [rel_path for rel_path in self.files if rel_path not in seen]
+
+        if changed or removed:
+            self.update_files(changed, removed)
+        return changed, removed
+
+    def sync(self, file_meta: Dict[str, dict]) -> Tuple[List[str], List[str]]:
+        """
+        Bring the index in line with file_meta ({relative path: {"mtime", "size", "sha1"?}},
+        e.g. from the project manifest) without walking the tree. Files whose
+        mtime changed but whose sha1 did not are not re-tokenized.
+        Returns (changed, removed) relative paths.
+        """
+        changed = []
+        for rel_path, meta in file_meta.items():
+            entry = self.files.get(rel_path)
+            if entry is not None and entry["mtime"] == meta["mtime"] and entry["size"] == meta["size"]:
+                continue
+            if entry is not None and meta.get("sha1") and entry.get("sha1") == meta["sha1"]:
+                entry["mtime"] = meta["mtime"]  # touched, not modified
+                self._dirty.add(rel_path)
+                continue
+            changed.append(rel_path)
+        removed = [rel_path for rel_path in self.files if rel_path not in file_meta]
+
+        if changed or removed:
+            self.update_files(changed, removed, file_meta)
+        return changed, removed
+
+    def update_files(self, changed: List[str], removed: List[str] = (), file_meta: Dict[str, dict] = None) -> None:
+        """
+        Re-tokenize the given relative paths and drop the removed ones.
+        """
+        stale = set(changed) | set(removed)
+        if not stale:
+            return
+
+        for rel_path in stale:
+            for term in self.file_terms.pop(rel_path, ()):
+                docs = self.postings[term]
+                del docs[rel_path]
+                if not docs:
+                    del self.postings[term]
+        self._dirty.update(stale)
+
+        for rel_path in removed:
+            self.files.pop(rel_path, None)
+
+        for rel_path in changed:
+            sha1 = (file_meta or {}).get(rel_path, {}).get("sha1")
+            self._add_file(rel_path, sha1)
+        self.generation += 1
+
+    def indexed_files(self) -> Dict[str, dict]:
+        """files without the skipped entries: the documents that are actually indexed."""
+        return {rel_path: meta for rel_path, meta in self.files.items() if not meta.get("skipped")}
+
+    def _add_file(self, rel_path: str, sha1: str = None) -> None:
+        file_path = os.path.join(self.project_path, rel_path)
+        try:
+            st = os.stat(file_path)
+        except OSError as e:
+            print(f"⚠️ Skipping {file_path}: {e}")
+            self.files.pop(rel_path, None)
+            return
+        try:
+            if st.st_size > MAX_INDEX_FILE_BYTES:
+                raise OSError(f"larger than {MAX_INDEX_FILE_BYTES} bytes")
+            with open(file_path, "r", encoding="utf-8", errors="ignore") as f:
+                content = f.read()
+        except OSError as e:
+            print(f"⚠️ Skipping {file_path}: {e}")
+            self.files[rel_path] = {"mtime": st.st_mtime, "size": st.st_size, "length": 0, "skipped": True}
+            return
+
+        tokens = tokenize(content)
+        terms = {}
+        for term, position in tokens:
+            terms.setdefault(term, []).append(position)
+        for term, positions in terms.items():
+            self.postings.setdefault(term, {})[rel_path] = positions
+        self.file_terms[rel_path] = list(terms)
+        self.files[rel_path] = {"mtime": st.st_mtime, "size": st.st_size, "length": len(tokens)}
+        if sha1:
+            self.files[rel_path]["sha1"] = sha1
+
+    def lookup(self, terms: List[str]) -> Dict[str, Dict[str, int]]:
+        """
+        Return {relative path: {term: term frequency}} for files containing any of the terms.
+        """
+        hits: Dict[str, Dict[str, int]] = {}
+        for term in terms:
+            for rel_path, positions in self.postings.get(term, {}).items():
+                hits.setdefault(rel_path, {})[term] = len(positions)
+        return hits
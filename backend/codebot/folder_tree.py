@@ -0,0 +1,117 @@
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Iterable, List, Optional
+
+TREE_EXCLUDE = {
+    "__pycache__", "venv", "env", ".env", ".git",
+    "node_modules", "dist", "build", ".idea", ".vscode"
+}
+MAX_CACHED_DIRS = int(os.getenv("CODEBOT_TREE_CACHE", "4096"))
+
+_listings = OrderedDict()
+_listings_lock = threading.Lock()
+
+
+def is_hidden_from_tree(name: str) -> bool:
+    return name in TREE_EXCLUDE or name.startswith(".") or name.endswith('env')
+
+
+def list_directory(path: str) -> List[dict]:
+    """
+    Visible entries of one directory as {"name", "type": "dir" | "file"},
+    folders first. Listings are cached and reused while the directory's
+    mtime is unchanged (adding, removing or renaming an entry bumps it).
+    """
+    path = os.path.abspath(path)
+    mtime = os.stat(path).st_mtime_ns
+    with _listings_lock:
+        cached = _listings.get(path)
+        if cached is not None and cached[0] == mtime:
+            _listings.move_to_end(path)
+            return cached[1]
+
+    entries = []
+    with os.scandir(path) as it:
+        for entry in it:
+            if is_hidden_from_tree(entry.name):
+                continue
+            try:
+                is_dir = entry.is_dir()
+            except OSError:
+                continue
+            entries.append({"name": entry.name, "type": "dir" if is_dir else "file"})
+    entries.sort(key=lambda e: (e["type"] != "dir", e["name"]))
+
+    with _listings_lock:
+        _listings[path] = (mtime, entries)
+        while len(_listings) > MAX_CACHED_DIRS:
+            _listings.popitem(last=False)
+    return entries
+
+
+def child_count(path: str) -> int:
+    try:
+        return len(list_directory(path))
+    except OSError:
+        return 0
+
+
+def expand_directory(path: str) -> List[dict]:
+    """
+    One level of the tree for lazy expansion: the entries of `path`, with
+    the number of visible children of each folder so the UI can show expanders.
+    """
+    entries = []
+    for entry in list_directory(path):
+        item = dict(entry)
+        if entry["type"] == "dir":
+            item["children"] = child_count(os.path.join(path, entry["name"]))
+        entries.append(item)
+    return entries
+
+
+def build_tree(path: str, depth: int) -> Optional[dict]:
+    """
+    Nested {name: subtree or file name} dictionary, `depth` folder levels deep.
+    Folders past the limit that have visible content are returned as {} so
+    the UI can fetch them lazily; empty folders are left out.
+    """
+    if is_hidden_from_tree(Path(path).name):
+        return None
+    if os.path.isfile(path):
+        return Path(path).name
+
+    structure = {}
+    for entry in list_directory(path):
+        child = os.path.join(path, entry["name"])
+        if entry["type"] == "file":
+            structure[entry["name"]] = entry["name"]
+        elif depth > 1:
+            subtree = build_tree(child, depth - 1)
+            if subtree:
+                structure[entry["name"]] = subtree
+        elif child_count(child):
+            structure[entry["name"]] = {}
+    return structure if structure else None
+
+
+def tree_from_files(rel_paths: Iterable[str], depth: int) -> Optional[dict]:
+    """
+    The build_tree dictionary for a project from a list of relative file
+    paths (e.g. ProjectWatcher.files()), without touching the filesystem.
+    """
+    structure = {}
+    for rel_path in rel_paths:
+        parts = Path(rel_path).parts
+        if any(is_hidden_from_tree(part) for part in parts):
+            continue
+        node = structure
+        for level, part in enumerate(parts[:-1]):
+            node = node.setdefault(part, {})
+            if level + 1 >= depth:
+                break
+        else:
+            node[parts[-1]] = parts[-1]
+    return structure if structure else None
@@ -1,25 +1,219 @@
-import subprocess
+import os
+import re
 import json
+import queue
+import shutil
+import tempfile
+import threading
+import subprocess
+from typing import List, Optional, Tuple
 
-def verify_typescript(file_path):
+TS_CHECKER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "ts_checker.js")
+SCRIPT_EXTENSIONS = ('.ts', '.tsx', '.js', '.jsx')
+
+_ts_checker = None
+_ts_checker_lock = threading.Lock()
+
+
+class TypeScriptChecker:
     """
-    Verify TypeScript/TSX syntax using tsc (TypeScript compiler)
-    Returns (bool, str): (success, error_message)
+    A long-lived node process (ts_checker.js) that syntax-checks TS/JS
+    sources with the project's typescript module. One batch of files is one
+    JSON line each way, so verifying N fixes costs one warm process instead
+    of N `npx tsc` cold starts. The process is restarted if it dies.
+    """
+
+    def __init__(self, node: str = "node", script: str = TS_CHECKER_SCRIPT, timeout: float = 30):
+        self.node = node
+        self.script = script
+        self.timeout = timeout
+        self._proc = None
+        self._lines = None
+        self._next_id = 0
+        self._lock = threading.Lock()
+
+    def _start(self) -> None:
+        self._proc = subprocess.Popen(
+            [self.node, self.script],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+            text=True, encoding="utf-8", bufsize=1,
+        )
+        self._lines = queue.Queue()
+        threading.Thread(target=self._read_lines, args=(self._proc, self._lines), daemon=True).start()
+
+    @staticmethod
+    def _read_lines(proc, lines) -> None:
+        for line in proc.stdout:
+            lines.put(line)
+        lines.put(None)
+
+    def close(self) -> None:
+        if self._proc is not None:
+            self._proc.kill()
+            self._proc.wait()
+            self._proc = None
+
+    def check(self, files: List[Tuple[str, str]]) -> List[Tuple[Optional[bool], str]]:
+        """
+        Check [(file_path, source)] in one round trip. Returns (passed, errors)
+        per file; passed is None when the file could not be checked.
+        """
+        if not files:
+            return []
+        with self._lock:
+            try:
+                if self._proc is None or self._proc.poll() is not None:
+                    self._start()
+                self._next_id += 1
+                request = {"id": self._next_id, "files": [{"path": path, "text": text} for path, text in files]}
+                self._proc.stdin.write(json.dumps(request) + "\n")
+                self._proc.stdin.flush()
+                while True:
+                    line = self._lines.get(timeout=self.timeout)
+                    if line is None:
+                        raise OSError("TypeScript checker exited")
+                    reply = json.loads(line)
+                    if reply.get("id") == self._next_id:
+                        break
+            except (OSError, ValueError, queue.Empty) as e:
+                print(f"⚠️ TypeScript checker unavailable: {e}")
+                self.close()
+                return [(None, str(e)) for _ in files]
+        return [(result["ok"], "\n".join(result["errors"])) for result in reply["results"]]
+
+
+def get_ts_checker() -> Optional[TypeScriptChecker]:
+    """
+    The shared TypeScriptChecker, or None when node is not installed.
+    """
+    global _ts_checker
+    with _ts_checker_lock:
+        if _ts_checker is None:
+            node = os.getenv("CODEBOT_NODE") or shutil.which("node")
+            if not node:
+                return None
+            _ts_checker = TypeScriptChecker(node=node, timeout=float(os.getenv("CODEBOT_TS_CHECK_TIMEOUT", "30")))
+        return _ts_checker
+
+
+def _local_tsc(folder: str) -> Optional[str]:
+    """The tsc binary of the nearest node_modules above folder, if any."""
+    folder = os.path.abspath(folder)
+    while True:
+        candidate = os.path.join(folder, "node_modules", ".bin", "tsc")
+        if os.path.isfile(candidate):
+            return candidate
+        parent = os.path.dirname(folder)
+        if parent == folder:
+            return None
+        folder = parent
+
+
+TSC_ERROR = re.compile(r"^(?P<path>.+?)\(\d+,\d+\): error TS(?P<code>\d+)\b")
+
+
+def _tsc_check(files):
     """
+    Cold `tsc --noEmit` check of [(file_path, source)] in a single compiler
+    run, used for the files the warm checker cannot handle. Only the
+    project's own compiler is used: node_modules/.bin/tsc above the first
+    file, else `npx --no-install tsc`, which never downloads a package.
+    In-memory sources are written to a temporary folder first (source None
+    checks the file on disk). Only syntax errors (TS1xxx) fail a file, as in
+    the warm checker. Returns (passed, error_message) per file; passed is
+    None when no compiler could run.
+    """
+    if not files:
+        return []
+    folder = os.path.dirname(os.path.abspath(files[0][0]))
+    if not os.path.isdir(folder):
+        folder = os.getcwd()
+    tsc = _local_tsc(folder)
+    npx = shutil.which("npx")
+    if tsc is None and npx is None:
+        return [(None, "TypeScript compiler not available") for _ in files]
+    command = [tsc] if tsc else [npx, "--no-install", "tsc"]
+
+    tmp_dir = tempfile.mkdtemp(prefix="codebot_tsc_")
     try:
-        # Run tsc to check syntax
+        checked = []  # path given to tsc for each file
+        for number, (file_path, source) in enumerate(files):
+            if source is None:
+                checked.append(os.path.abspath(file_path))
+                continue
+            path = os.path.join(tmp_dir, str(number), os.path.basename(file_path))
+            os.makedirs(os.path.dirname(path))
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(source)
+            checked.append(path)
         result = subprocess.run(
-            ["npx", "tsc", "--noEmit", file_path],
+            command + ["--noEmit"] + checked,
+            cwd=folder,
             capture_output=True,
-            text=True
+            text=True,
+            timeout=float(os.getenv("CODEBOT_TS_CHECK_TIMEOUT", "30")),
         )
-        if result.returncode == 0:
-            return True, ""
-        return False, result.stderr
-    except subprocess.CalledProcessError as e:
-        return False, str(e)
-    except FileNotFoundError:
-        return False, "TypeScript compiler (tsc) not found. Please install Node.js and TypeScript."
+    except (OSError, subprocess.SubprocessError) as e:
+        return [(None, f"TypeScript compiler could not run: {e}") for _ in files]
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    output = result.stdout + result.stderr
+    if result.returncode != 0 and "error TS" not in output:
+        # npx found no local typescript, or tsc itself failed to start
+        return [(None, f"TypeScript compiler not available: {output.strip()[:500]}") for _ in files]
+    index = {path: number for number, path in enumerate(checked)}
+    syntax_errors = [[] for _ in files]
+    for line in output.splitlines():
+        match = TSC_ERROR.match(line)
+        if not match or not re.fullmatch(r"1\d{3}", match.group("code")):
+            continue
+        number = index.get(os.path.normpath(os.path.join(folder, match.group("path"))))
+        if number is not None:
+            # Report the error against the real file, not its temporary copy
+            syntax_errors[number].append(files[number][0] + line[len(match.group("path")):])
+    return [(False, "\n".join(errors)) if errors else (True, "") for errors in syntax_errors]
+
+
+def verify_typescript_sources(files):
+    """
+    Verify TS/TSX/JS sources given as [(file_path, source)] in one batch.
+    Files the warm checker cannot handle go to one cold tsc run together.
+    Returns (passed, error_message) per file; passed is None when no
+    TypeScript compiler was available, which callers treat as unchecked.
+    """
+    checker = get_ts_checker()
+    results = checker.check(files) if checker else [(None, "") for _ in files]
+    unchecked = [number for number, (passed, _) in enumerate(results) if passed is None]
+    for number, result in zip(unchecked, _tsc_check([files[number] for number in unchecked])):
+        results[number] = result
+    return results
+
+
+def verify_typescript(file_path):
+    """
+    Verify TypeScript/TSX syntax with the warm checker, falling back to tsc
+    Returns (passed, error_message); passed is None if it could not be checked
+    """
+    try:
+        with open(file_path, 'r', encoding='utf-8') as f:
+            source = f.read()
+    except OSError as e:
+        return False, f"Error reading TypeScript file: {str(e)}"
+    return verify_typescript_sources([(file_path, source)])[0]
+
+
+def verify_json_source(source):
+    """
+    Verify JSON syntax of an in-memory string
+    Returns (bool, str): (success, error_message)
+    """
+    try:
+        json.loads(source)
+        return True, ""
+    except json.JSONDecodeError as e:
+        return False, f"JSON syntax error: {str(e)}"
+
 
 def verify_json(file_path):
     """
@@ -47,4 +241,4 @@ def get_file_type(file_path):
     elif lower_path.endswith('.json'):
         return 'json'
     else:
-        return 'unknown'
\ No newline at end of file
+        return 'unknown'
@@ -0,0 +1,90 @@
+import os
+import time
+import random
+import threading
+from typing import Callable, List, Optional
+
+from git import Repo, GitCommandError
+
+from .tracing import traced
+
+_pending_pushes = set()  # repo paths with a push job queued or running
+_pending_lock = threading.Lock()
+
+
+def ensure_main_branch(repo: Repo) -> None:
+    """
+    Make "main" the current branch. Reading HEAD is a file read, so the git
+    subprocesses only run when the repo is not already on main.
+    """
+    if not repo.head.is_detached and repo.head.ref.name == "main":
+        return
+    try:
+        repo.git.rev_parse("--verify", "main")
+        repo.git.checkout("main")
+    except GitCommandError:
+        # rename current branch to main
+        try:
+            repo.git.branch("-M", "main")
+        except GitCommandError:
+            pass
+
+
+@traced("git_commit")
+def commit_paths(repo: Repo, repo_path: str, file_paths: List[str], message: str) -> Optional[str]:
+    """
+    Stage only file_paths (including deletions) and commit them.
+    Returns the commit sha, or None when nothing changed.
+    """
+    rel_paths = [os.path.relpath(os.path.abspath(path), repo_path) for path in file_paths]
+    repo.git.add("--all", "--", *rel_paths)
+    if repo.head.is_valid() and not repo.index.diff("HEAD"):
+        return None
+    return repo.index.commit(message).hexsha
+
+
+def push_with_retry(repo_path: str, retries: int = 3, backoff: float = 2.0,
+                    is_cancelled: Callable[[], bool] = lambda: False, sleep=time.sleep) -> dict:
+    """
+    Push main to origin, retrying failed pushes with jittered exponential backoff.
+    """
+    repo = Repo(repo_path)
+    for attempt in range(retries + 1):
+        if is_cancelled():
+            break
+        try:
+            repo.git.push("--set-upstream", "origin", "main")
+            return {"pushed": True, "attempts": attempt + 1}
+        except GitCommandError as e:
+            if attempt == retries:
+                raise
+            delay = random.uniform(0, backoff * 2 ** attempt)
+            print(f"Push of {repo_path} failed ({e.status}), retrying in {delay:.1f}s")
+            sleep(delay)
+    return {"pushed": False, "attempts": 0}
+
+
+def push_in_background(repo_path: str, job_queue, retries: int = 3) -> Optional[str]:
+    """
+    Queue a push of repo_path on job_queue. A push sends every commit made so
+    far, so while one is pending for the repo no second one is queued.
+    Returns the job id, or None if a push was already pending.
+    """
+    repo_path = os.path.abspath(repo_path)
+    with _pending_lock:
+        if repo_path in _pending_pushes:
+            return None
+        _pending_pushes.add(repo_path)
+
+    def run_push(params, is_cancelled):
+        with _pending_lock:
+            # Commits made from here on need a new push
+            _pending_pushes.discard(params["repo_path"])
+        return push_with_retry(params["repo_path"], retries=retries, is_cancelled=is_cancelled)
+
+    try:
+        return job_queue.submit("git_push", {"repo_path": repo_path}, run_push)
+    except Exception:
+        with _pending_lock:
+            _pending_pushes.discard(repo_path)
+        raise
@@ -0,0 +1,140 @@
+import os
+import time
+import random
+import threading
+from email.utils import parsedate_to_datetime
+from typing import Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+IDEMPOTENT_METHODS = {"GET", "HEAD", "OPTIONS", "PUT", "DELETE"}
+
+_default_client = None
+_default_client_lock = threading.Lock()
+
+
+class RateLimiter:
+    """
+    Token bucket allowing `rate` requests per second with bursts of up to `burst`.
+    """
+
+    def __init__(self, rate: float, burst: Optional[int] = None):
+        self.rate = rate
+        self.capacity = burst or max(1, int(rate))
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+def retry_after_seconds(response) -> Optional[float]:
+    """
+    Parse a Retry-After header given either in seconds or as an HTTP date.
+    """
+    value = response.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class HttpClient:
+    """
+    Shared requests.Session with connection pooling and keep-alive, a default
+    timeout, retries with exponential backoff and full jitter (honoring
+    Retry-After on 429/5xx) and an optional client-side rate limit.
+
+    Non-idempotent requests (POST, PATCH) are only retried when the
+    connection could not be made: a read timeout means the server may still
+    be working on it, and retrying would multiply the wait by the retries.
+    Pass idempotent=True for a POST that is safe to resend.
+    """
+
+    def __init__(self, timeout: float = 30, max_retries: int = 3, backoff: float = 0.5,
+                 max_backoff: float = 30, pool_size: int = 10, rate: Optional[float] = None):
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.limiter = RateLimiter(rate) if rate else None
+        self.sleep = time.sleep
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def _delay(self, attempt: int, response=None) -> float:
+        if response is not None:
+            retry_after = retry_after_seconds(response)
+            if retry_after is not None:
+                return min(retry_after, self.max_backoff)
+        return random.uniform(0, min(self.max_backoff, self.backoff * (2 ** attempt)))
+
+    def request(self, method: str, url: str, idempotent: Optional[bool] = None, **kwargs) -> requests.Response:
+        kwargs.setdefault("timeout", self.timeout)
+        if idempotent is None:
+            idempotent = method.upper() in IDEMPOTENT_METHODS
+        retryable = (requests.ConnectionError, requests.Timeout) if idempotent else (requests.ConnectionError,)
+        attempt = 0
+        while True:
+            if self.limiter is not None:
+                self.limiter.acquire()
+            try:
+                response = self.session.request(method, url, **kwargs)
+            except retryable:
+                if attempt >= self.max_retries:
+                    raise
+                self.sleep(self._delay(attempt))
+                attempt += 1
+                continue
+
+            if response.status_code in RETRY_STATUSES and attempt < self.max_retries:
+                delay = self._delay(attempt, response)
+                response.close()
+                self.sleep(delay)
+                attempt += 1
+                continue
+            return response
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url: str, **kwargs) -> requests.Response:
+        return self.request("POST", url, **kwargs)
+
+
+def get_client() -> HttpClient:
+    """
+    Process-wide HttpClient configured from the environment:
+    CODEBOT_HTTP_TIMEOUT, CODEBOT_HTTP_RETRIES, CODEBOT_HTTP_RATE (requests/second).
+    """
+    global _default_client
+    with _default_client_lock:
+        if _default_client is None:
+            rate = os.getenv("CODEBOT_HTTP_RATE")
+            _default_client = HttpClient(
+                timeout=float(os.getenv("CODEBOT_HTTP_TIMEOUT", "30")),
+                max_retries=int(os.getenv("CODEBOT_HTTP_RETRIES", "3")),
+                rate=float(rate) if rate else None,
+            )
+        return _default_client
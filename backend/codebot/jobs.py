@@ -0,0 +1,203 @@
+import os
+import json
+import time
+import uuid
+import sqlite3
+import threading
+from contextlib import closing
+from concurrent.futures import ThreadPoolExecutor, CancelledError, TimeoutError as FutureTimeoutError
+from typing import Callable, Optional
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+CANCELLED = "cancelled"
+FINISHED = {SUCCEEDED, FAILED, CANCELLED}
+
+_queues = {}
+_queues_lock = threading.Lock()
+
+
+class JobCancelled(Exception):
+    """Raised by a job function when it notices its job was cancelled."""
+
+
+def _process_start(pid: int) -> Optional[str]:
+    """Start time of a process in clock ticks since boot (Linux), to tell a live pid from a reused one."""
+    try:
+        with open(f"/proc/{pid}/stat", "r") as f:
+            return f.read().rsplit(")", 1)[1].split()[19]
+    except (OSError, IndexError):
+        return None
+
+
+def process_owner() -> str:
+    """Owner token for jobs run by this process: "pid:start time" (or a random token without /proc)."""
+    pid = os.getpid()
+    return f"{pid}:{_process_start(pid) or uuid.uuid4().hex}"
+
+
+def owner_alive(owner: Optional[str]) -> bool:
+    """
+    Whether the process that owns a job is still running. Jobs without an
+    owner (older databases) count as orphaned.
+    """
+    if not owner:
+        return False
+    pid_text, _, token = owner.partition(":")
+    try:
+        pid = int(pid_text)
+        os.kill(pid, 0)
+    except (ValueError, ProcessLookupError):
+        return False
+    except PermissionError:
+        pass  # exists, owned by another user
+    except OSError:
+        return False
+    start = _process_start(pid)
+    return start is None or start == token
+
+
+class JobQueue:
+    """
+    Local background job runner: a thread pool for execution and a SQLite
+    table for job status and results, so no external broker is needed.
+
+    A job function is called as func(params, is_cancelled) and should check
+    is_cancelled() between steps; queued jobs are cancelled before they start.
+    Each job records the process that runs it, so several processes can
+    share the database and only jobs whose process is gone are failed.
+    """
+
+    def __init__(self, db_path: str, workers: int = 2):
+        self.db_path = db_path
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="codebot-job")
+        self._futures = {}
+        self._cancelled = set()
+        self._lock = threading.Lock()
+        self.owner = process_owner()
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        with closing(self._connect()) as conn, conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                "id TEXT PRIMARY KEY, kind TEXT NOT NULL, status TEXT NOT NULL, params TEXT, "
+                "result TEXT, error TEXT, created REAL, started REAL, finished REAL, owner TEXT)"
+            )
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(jobs)")}
+            if "owner" not in columns:
+                conn.execute("ALTER TABLE jobs ADD COLUMN owner TEXT")
+            # Jobs whose process has exited can never finish
+            unfinished = conn.execute(
+                "SELECT id, owner FROM jobs WHERE status IN (?, ?)", (QUEUED, RUNNING)
+            ).fetchall()
+            now = time.time()
+            conn.executemany(
+                "UPDATE jobs SET status = ?, error = ?, finished = ? WHERE id = ?",
+                [
+                    (FAILED, "Interrupted by server restart", now, job_id)
+                    for job_id, owner in unfinished if owner != self.owner and not owner_alive(owner)
+                ],
+            )
+
+    def _connect(self):
+        return sqlite3.connect(self.db_path, timeout=10)
+
+    def _update(self, job_id: str, **fields) -> None:
+        columns = ", ".join(f"{name} = ?" for name in fields)
+        with closing(self._connect()) as conn, conn:
+            conn.execute(f"UPDATE jobs SET {columns} WHERE id = ?", (*fields.values(), job_id))
+
+    def submit(self, kind: str, params: dict, func: Callable) -> str:
+        job_id = uuid.uuid4().hex
+        with closing(self._connect()) as conn, conn:
+            conn.execute(
+                "INSERT INTO jobs (id, kind, status, params, created, owner) VALUES (?, ?, ?, ?, ?, ?)",
+                (job_id, kind, QUEUED, json.dumps(params), time.time(), self.owner),
+            )
+        with self._lock:
+            self._futures[job_id] = self.pool.submit(self._run, job_id, func, params)
+        return job_id
+
+    def _run(self, job_id: str, func: Callable, params: dict) -> None:
+        def is_cancelled():
+            return job_id in self._cancelled
+
+        try:
+            if is_cancelled():
+                raise JobCancelled()
+            self._update(job_id, status=RUNNING, started=time.time())
+            result = func(params, is_cancelled)
+            if is_cancelled():
+                raise JobCancelled()
+            self._update(job_id, status=SUCCEEDED, result=json.dumps(result), finished=time.time())
+        except JobCancelled:
+            self._update(job_id, status=CANCELLED, finished=time.time())
+        except Exception as e:
+            print(f"Job {job_id} failed: {e}")
+            self._update(job_id, status=FAILED, error=str(e), finished=time.time())
+        finally:
+            with self._lock:
+                self._futures.pop(job_id, None)
+                self._cancelled.discard(job_id)
+
+    def get(self, job_id: str) -> Optional[dict]:
+        with closing(self._connect()) as conn:
+            conn.row_factory = sqlite3.Row
+            row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = dict(row)
+        job["params"] = json.loads(job["params"]) if job["params"] else {}
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        return job
+
+    def cancel(self, job_id: str) -> Optional[dict]:
+        """
+        Cancel a job. Queued jobs stop immediately, running jobs at their next
+        is_cancelled() check. Only jobs run by this queue can be cancelled;
+        others are returned unchanged. Returns the job, or None if it does not exist.
+        """
+        job = self.get(job_id)
+        if job is None or job["status"] in FINISHED:
+            return job
+        with self._lock:
+            future = self._futures.get(job_id)
+            if future is None:
+                return job  # finished meanwhile, or owned by another process
+            self._cancelled.add(job_id)  # _run discards it when the job ends
+            if future.cancel():
+                self._futures.pop(job_id, None)
+                self._cancelled.discard(job_id)
+                self._update(job_id, status=CANCELLED, finished=time.time())
+        return self.get(job_id)
+
+    def wait(self, job_id: str, timeout: Optional[float] = None) -> Optional[dict]:
+        """
+        Block until the job finishes or timeout seconds pass, then return the
+        job as it stands (still queued or running if the timeout was hit).
+        """
+        with self._lock:
+            future = self._futures.get(job_id)
+        if future is not None:
+            try:
+                future.exception(timeout=timeout)
+            except (FutureTimeoutError, CancelledError):
+                pass
+        return self.get(job_id)
+
+
+def get_job_queue(storage_dir: str = "project_store") -> JobQueue:
+    """
+    Process-wide job queue for a storage_dir. CODEBOT_JOB_WORKERS sets the pool size.
+    """
+    key = os.path.abspath(storage_dir)
+    with _queues_lock:
+        job_queue = _queues.get(key)
+        if job_queue is None:
+            job_queue = JobQueue(
+                os.path.join(storage_dir, "jobs.sqlite3"),
+                workers=int(os.getenv("CODEBOT_JOB_WORKERS", "2")),
+            )
+            _queues[key] = job_queue
+        return job_queue
@@ -0,0 +1,151 @@
+import os
+import time
+import sqlite3
+import hashlib
+import threading
+from contextlib import closing
+from collections import OrderedDict
+from typing import Optional
+
+DEFAULT_MAX_ENTRIES = 256
+DEFAULT_TTL = 24 * 60 * 60
+DEFAULT_MAX_DB_BYTES = 64 * 1024 * 1024
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def make_key(*parts) -> str:
+    """
+    Content-addressed cache key: sha256 over the given parts.
+    """
+    digest = hashlib.sha256()
+    for part in parts:
+        data = part if isinstance(part, bytes) else str(part).encode("utf-8")
+        digest.update(len(data).to_bytes(8, "big"))
+        digest.update(data)
+    return digest.hexdigest()
+
+
+class LLMCache:
+    """
+    Two-tier cache for LLM responses.
+
+    An in-memory LRU of at most max_entries items sits in front of an optional
+    SQLite table (db_path) that is trimmed to max_db_bytes, oldest access first.
+    Entries older than ttl seconds are treated as misses in both tiers.
+    """
+
+    def __init__(self, db_path: Optional[str] = None, max_entries: int = DEFAULT_MAX_ENTRIES,
+                 ttl: float = DEFAULT_TTL, max_db_bytes: int = DEFAULT_MAX_DB_BYTES):
+        self.db_path = db_path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_db_bytes = max_db_bytes
+        self.hits = 0
+        self.misses = 0
+        self._memory = OrderedDict()  # key -> (created, value)
+        self._lock = threading.Lock()
+        if db_path:
+            os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+            with closing(self._connect()) as conn, conn:
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS llm_cache ("
+                    "key TEXT PRIMARY KEY, value TEXT NOT NULL, created REAL NOT NULL, "
+                    "accessed REAL NOT NULL, size INTEGER NOT NULL)"
+                )
+
+    def _connect(self):
+        return sqlite3.connect(self.db_path, timeout=10)
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                created, value = entry
+                if now - created <= self.ttl:
+                    self._memory.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._memory[key]
+
+        value = self._db_get(key, now)
+        with self._lock:
+            if value is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._remember(key, value, now)
+        return value
+
+    def set(self, key: str, value: str) -> None:
+        now = time.time()
+        with self._lock:
+            self._remember(key, value, now)
+        self._db_set(key, value, now)
+
+    def _remember(self, key: str, value: str, created: float) -> None:
+        self._memory[key] = (created, value)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def _db_get(self, key: str, now: float) -> Optional[str]:
+        if not self.db_path:
+            return None
+        try:
+            with closing(self._connect()) as conn, conn:
+                row = conn.execute("SELECT value, created FROM llm_cache WHERE key = ?", (key,)).fetchone()
+                if row is None:
+                    return None
+                if now - row[1] > self.ttl:
+                    conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                    return None
+                conn.execute("UPDATE llm_cache SET accessed = ? WHERE key = ?", (now, key))
+                return row[0]
+        except sqlite3.Error as e:
+            print(f"⚠️ LLM cache read failed: {e}")
+            return None
+
+    def _db_set(self, key: str, value: str, now: float) -> None:
+        if not self.db_path:
+            return
+        try:
+            with closing(self._connect()) as conn, conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO llm_cache (key, value, created, accessed, size) VALUES (?, ?, ?, ?, ?)",
+                    (key, value, now, now, len(value.encode("utf-8"))),
+                )
+                conn.execute("DELETE FROM llm_cache WHERE created < ?", (now - self.ttl,))
+                total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM llm_cache").fetchone()[0]
+                if total > self.max_db_bytes:
+                    rows = conn.execute("SELECT key, size FROM llm_cache ORDER BY accessed").fetchall()
+                    stale = []
+                    for old_key, size in rows:
+                        if total <= self.max_db_bytes:
+                            break
+                        stale.append((old_key,))
+                        total -= size
+                    conn.executemany("DELETE FROM llm_cache WHERE key = ?", stale)
+        except sqlite3.Error as e:
+            print(f"⚠️ LLM cache write failed: {e}")
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "memory_entries": len(self._memory)}
+
+
+def get_cache(storage_dir: str, use_disk: bool = True, **kwargs) -> LLMCache:
+    """
+    Return the process-wide cache for a storage_dir, so the memory tier is
+    shared between CodeBot instances.
+    """
+    db_path = os.path.join(storage_dir, "llm_cache.sqlite3") if use_disk else None
+    key = (os.path.abspath(storage_dir), use_disk)
+    with _caches_lock:
+        cache = _caches.get(key)
+        if cache is None:
+            cache = LLMCache(db_path=db_path, **kwargs)
+            _caches[key] = cache
+        return cache
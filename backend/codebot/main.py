@@ -1,6 +1,10 @@
+"""
+Interactive CodeBot CLI. Run from the backend folder:
+    python -m codebot.main
+"""
 import os
 from dotenv import load_dotenv
-from hello_project.hello_app.bot_core import CodeBot
+from .bot_core import CodeBot
 
 def print_help():
     print("""
@@ -11,6 +15,7 @@ Commands:
   show <project>          - Show project details
   remove <project> [files] - Remove project from registry (use 'files' to delete files too)
   fix                     - Enter fix mode to fix multiple bugs in active project
+  batch                   - Describe several bugs, then fix them together (one request per file)
   exit                     - Exit
 Examples:
   upload /home/me/myproj
@@ -20,22 +25,64 @@ Examples:
   fix                    # Enter fix mode
   > Describe bug...     # Describe each bug
   > 'done'             # Type 'done' when finished fixing bugs
+  batch                  # Enter batch mode
+  > Describe bug...     # One bug per line
+  > 'run'              # Fix all of them with one scan
 """)
 
 # Load environment variables from .env
 load_dotenv()
 
+def run_batch(codebot):
+    """
+    Collect bug descriptions until 'run', fix them with smart_fix_bugs and
+    offer to apply the proposed changes.
+    """
+    print("\nEntering batch mode. Describe one bug per line, then 'run' to fix them or 'done' to cancel.")
+    bug_descriptions = []
+    while True:
+        line = input(f"\nBug #{len(bug_descriptions) + 1} (or 'run'/'done'): ").strip()
+        if line.lower() == 'done':
+            print("Returning to main menu.")
+            return
+        if line.lower() == 'run':
+            break
+        if line:
+            bug_descriptions.append(line)
+    if not bug_descriptions:
+        print("No bugs described.")
+        return
+
+    summary = codebot.smart_fix_bugs(bug_descriptions)
+    fixes = [f for f in summary["files"] if "fixed_code" in f["proposal"]]
+    for number, bug in enumerate(summary["bugs"], 1):
+        files = ", ".join(os.path.relpath(path, codebot.project_path) for path in bug["files"]) or "no matching files"
+        print(f"{number}. {bug['description']} -> {files}")
+    if not fixes:
+        print("\nNo changes were proposed.")
+        return
+    for fix in fixes:
+        print(f"\n{os.path.relpath(fix['file'], codebot.project_path)} (bugs {', '.join(str(n + 1) for n in fix['bugs'])}):")
+        print("\n".join(fix["proposal"]["changes"]))
+    if input(f"\nApply changes to {len(fixes)} file(s)? (y/n): ").strip().lower() == 'y':
+        result = codebot.apply_fixes(
+            [{"file_path": f["file"], "fixed_code": f["proposal"]["fixed_code"]} for f in fixes],
+            "; ".join(bug_descriptions),
+        )
+        print(result.get("message") or result.get("error"))
+
+
 def main():
-    # Load Groq API key from .env
-    GEMINI_API_KEY = os.getenv("GROQ_API_KEY")
+    # Load Gemini API key from .env
+    GEMINI_API_KEY = os.getenv("GEMINI_API_KEY") or os.getenv("GROQ_API_KEY")
     if not GEMINI_API_KEY:
-        print("Error: GROQ_API_KEY not found in .env")
+        print("Error: GEMINI_API_KEY not found in .env")
         return
 
-    codebot = CodeBot(GEMINI_API_KEY=GEMINI_API_KEY)
+    codebot = CodeBot(groq_api_key=os.getenv("GROQ_API_KEY"), gemini_api_key=GEMINI_API_KEY)
 
     while True:
-        command = input("Enter command (upload/fix/exit): ").strip()
+        command = input("Enter command (upload/fix/batch/exit): ").strip()
         if command == "upload":
             project_path = input("Enter path to your project folder: ").strip()
             codebot.load_project(project_path)
@@ -50,11 +97,16 @@ def main():
                     print("Exiting CodeBot.")
                     return
                 codebot.smart_fix_bug(bug_description)
+        elif command == "batch":
+            if not codebot.project_path:
+                print("No project loaded. Use 'upload' first.")
+                continue
+            run_batch(codebot)
         elif command == "exit":
             print("Exiting CodeBot.")
             break
         else:
-            print("Invalid command. Use upload/fix/exit.")
+            print("Invalid command. Use upload/fix/batch/exit.")
 
 if __name__ == "__main__":
     main()
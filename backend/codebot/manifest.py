@@ -0,0 +1,176 @@
+import os
+import codecs
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Set, Tuple
+
+from .code_analyzer import iter_project_files, SOURCE_EXTENSIONS
+from .file_index import MAX_INDEX_FILE_BYTES
+from .project_loader import is_binary_file
+from .row_store import RowStore
+
+MANIFEST_VERSION = 2
+HASH_CHUNK_BYTES = 64 * 1024
+
+LANGUAGES = {
+    '.py': 'python', '.ts': 'typescript', '.tsx': 'typescript', '.js': 'javascript',
+    '.jsx': 'javascript', '.mjs': 'javascript', '.cjs': 'javascript', '.json': 'json',
+    '.css': 'css', '.scss': 'css', '.html': 'html', '.md': 'markdown', '.yml': 'yaml',
+    '.yaml': 'yaml', '.toml': 'toml', '.sh': 'shell', '.sql': 'sql',
+}
+
+
+def manifest_path_for(project_path: str, storage_dir: str) -> str:
+    key = hashlib.sha1(os.path.abspath(project_path).encode("utf-8")).hexdigest()[:12]
+    return os.path.join(storage_dir, f"manifest_{key}.sqlite3")
+
+
+def describe_file(file_path: str, size: int = None) -> dict:
+    """
+    Content hash, encoding and language of one file, read in HASH_CHUNK_BYTES
+    chunks. Binary files are not read past the sniff, and files larger than
+    MAX_INDEX_FILE_BYTES are not read at all ("skipped": True, no hash).
+    """
+    ext = os.path.splitext(file_path)[1].lower()
+    if is_binary_file(file_path):
+        return {"binary": True, "sha1": None, "encoding": None, "language": None}
+    language = LANGUAGES.get(ext, "text")
+    if size is None:
+        size = os.stat(file_path).st_size
+    if size > MAX_INDEX_FILE_BYTES:
+        return {"binary": False, "sha1": None, "encoding": None, "language": language, "skipped": True}
+
+    digest = hashlib.sha1()
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    encoding = "utf-8"
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_BYTES), b""):
+            digest.update(chunk)
+            if encoding == "utf-8":
+                try:
+                    decoder.decode(chunk)
+                except UnicodeDecodeError:
+                    encoding = "latin-1"
+    if encoding == "utf-8":
+        try:
+            decoder.decode(b"", final=True)
+        except UnicodeDecodeError:
+            encoding = "latin-1"
+    return {"binary": False, "sha1": digest.hexdigest(), "encoding": encoding, "language": language}
+
+
+class ProjectManifest:
+    """
+    Persisted list of every file in a project with its size, mtime, content
+    hash, encoding and language. A refresh only stats files; new and changed
+    files are re-described, so warm reloads cost one stat per file plus work
+    proportional to what changed. Entries are stored one row per file and
+    save() writes only the entries changed since the last save.
+    """
+
+    def __init__(self, project_path: str, manifest_path: str):
+        self.project_path = os.path.abspath(project_path)
+        self.manifest_path = manifest_path
+        self.store = RowStore(manifest_path, MANIFEST_VERSION, self.project_path)
+        self.files: Dict[str, dict] = {}
+        self._dirty: Set[str] = set()
+
+    @classmethod
+    def open(cls, project_path: str, storage_dir: str) -> "ProjectManifest":
+        manifest = cls(project_path, manifest_path_for(project_path, storage_dir))
+        manifest.load()
+        return manifest
+
+    def load(self) -> None:
+        self.files = self.store.load()
+
+    def save(self) -> None:
+        """
+        Write the entries changed or removed since the last save.
+        """
+        if not self._dirty:
+            return
+        rows = {rel_path: self.files[rel_path] for rel_path in self._dirty if rel_path in self.files}
+        self.store.write(rows, [rel_path for rel_path in self._dirty if rel_path not in self.files])
+        self._dirty.clear()
+
+    def refresh(self, workers: int = 8) -> Tuple[List[str], List[str]]:
+        """
+        Stat every file and re-describe the new or changed ones.
+        Returns (changed, removed) relative paths.
+        """
+        stats = {}
+        for file_path in iter_project_files(self.project_path):
+            try:
+                st = os.stat(file_path)
+            except OSError:
+                continue
+            stats[os.path.relpath(file_path, self.project_path)] = st
+
+        changed = [
+            rel_path for rel_path, st in stats.items()
+            if rel_path not in self.files
+            or self.files[rel_path]["mtime"] != st.st_mtime
+            or self.files[rel_path]["size"] != st.st_size
+        ]
+        removed = [rel_path for rel_path in self.files if rel_path not in stats]
+        self.remove_files(removed)
+        self.update_files(changed, stats, workers=workers)
+        return changed, removed
+
+    def update_files(self, changed: List[str], stats: Dict[str, os.stat_result] = None, workers: int = 8) -> None:
+        """
+        Re-describe the given relative paths, statting them unless stats are provided.
+        """
+        def describe(rel_path):
+            file_path = os.path.join(self.project_path, rel_path)
+            try:
+                st = stats[rel_path] if stats and rel_path in stats else os.stat(file_path)
+                return rel_path, dict(describe_file(file_path, st.st_size), path=rel_path, size=st.st_size, mtime=st.st_mtime)
+            except OSError:
+                return rel_path, None
+
+        if workers > 1 and len(changed) > workers:
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                described = list(pool.map(describe, changed))
+        else:
+            described = [describe(rel_path) for rel_path in changed]
+
+        for rel_path, entry in described:
+            self._dirty.add(rel_path)
+            if entry is None:
+                self.files.pop(rel_path, None)
+            else:
+                self.files[rel_path] = entry
+
+    def apply_changes(self, rel_paths: List[str], workers: int = 8) -> Tuple[List[str], List[str]]:
+        """
+        Update the manifest from a list of paths reported as changed (e.g. by
+        a ProjectWatcher) without walking the tree. Returns (changed, removed).
+        """
+        changed, removed = [], []
+        for rel_path in rel_paths:
+            if os.path.isfile(os.path.join(self.project_path, rel_path)):
+                changed.append(rel_path)
+            elif rel_path in self.files:
+                removed.append(rel_path)
+        self.remove_files(removed)
+        self.update_files(changed, workers=workers)
+        return changed, removed
+
+    def remove_files(self, removed: List[str]) -> None:
+        for rel_path in removed:
+            self.files.pop(rel_path, None)
+            self._dirty.add(rel_path)
+
+    def text_files(self) -> List[str]:
+        return [rel_path for rel_path, entry in self.files.items() if not entry["binary"]]
+
+    def source_files(self) -> Dict[str, dict]:
+        """
+        {relative path: entry} for the text files the search index covers.
+        """
+        return {
+            rel_path: entry for rel_path, entry in self.files.items()
+            if not entry["binary"] and rel_path.endswith(SOURCE_EXTENSIONS)
+        }
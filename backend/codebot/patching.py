@@ -0,0 +1,208 @@
+import re
+from typing import List, Tuple
+
+from .code_analyzer import tokenize, query_terms
+
+MAX_REGIONS = 3
+CONTEXT_LINES = 3
+
+PY_BLOCK_RE = re.compile(r'^(\s*)(async\s+def|def|class)\s+\w+')
+BRACE_BLOCK_RE = re.compile(
+    r'^\s*(export\s+)?(default\s+)?(async\s+)?'
+    r'(function\b|class\b|interface\b|(const|let|var)\s+\w+\s*(:[^=]+)?=\s*(async\s+)?(\(|function\b|\w+\s*=>))'
+)
+HUNK_HEADER_RE = re.compile(r'^@@ -(\d+)(?:,(\d+))? \+(\d+)(?:,(\d+))? @@')
+
+
+class PatchError(Exception):
+    """Raised when a model-generated diff cannot be parsed or applied cleanly."""
+
+
+def _indent(line: str) -> int:
+    return len(line) - len(line.lstrip())
+
+
+def _python_block(lines: List[str], hit: int) -> Tuple[int, int]:
+    """
+    Line range of the innermost def/class enclosing line `hit` (0-based, inclusive).
+    """
+    hit_indent = _indent(lines[hit]) if lines[hit].strip() else None
+    for start in range(hit, -1, -1):
+        match = PY_BLOCK_RE.match(lines[start])
+        if not match:
+            continue
+        block_indent = len(match.group(1))
+        if start != hit and hit_indent is not None and hit_indent <= block_indent:
+            continue
+        end = start
+        for i in range(start + 1, len(lines)):
+            if not lines[i].strip():
+                continue
+            if _indent(lines[i]) <= block_indent:
+                break
+            end = i
+        if end >= hit:
+            return start, end
+    return hit, hit
+
+
+def _brace_block(lines: List[str], hit: int) -> Tuple[int, int]:
+    """
+    Line range of the nearest function/class/arrow-function block around line `hit`,
+    found by matching braces from its declaration line.
+    """
+    for start in range(hit, -1, -1):
+        if not BRACE_BLOCK_RE.match(lines[start]):
+            continue
+        depth = 0
+        opened = False
+        for end in range(start, len(lines)):
+            for char in lines[end]:
+                if char == '{':
+                    depth += 1
+                    opened = True
+                elif char == '}':
+                    depth -= 1
+            if opened and depth <= 0:
+                break
+        if end >= hit:
+            return start, end
+    return hit, hit
+
+
+def enclosing_block(lines: List[str], hit: int, file_path: str, symbols=None) -> Tuple[int, int]:
+    """
+    0-based line range of the innermost function/class around line `hit`.
+    Uses symbol spans from the SymbolIndex when given, otherwise indentation
+    (Python) or brace matching (TS/JS).
+    """
+    if symbols:
+        spans = [(s["start"] - 1, s["end"] - 1) for s in symbols if s["start"] - 1 <= hit <= s["end"] - 1]
+        if spans:
+            return min(spans, key=lambda span: span[1] - span[0])
+        return hit, hit
+    if file_path.endswith('.py'):
+        return _python_block(lines, hit)
+    if file_path.endswith(('.ts', '.tsx', '.js', '.jsx')):
+        return _brace_block(lines, hit)
+    return hit, hit
+
+
+def merge_ranges(ranges: List[Tuple[int, int]]) -> List[Tuple[int, int]]:
+    merged = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1] + 1:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def find_regions(code: str, file_path: str, bug_description: str, symbols=None,
+                 max_regions: int = MAX_REGIONS, context: int = CONTEXT_LINES) -> List[Tuple[int, int]]:
+    """
+    Locate the parts of a file most likely involved in the bug: lines with
+    bug-description keyword hits, widened to their enclosing function/class
+    plus a few lines of context. The max_regions blocks with the most hits are
+    returned as merged 0-based inclusive line ranges, in file order.
+    """
+    lines = code.splitlines()
+    best = rank_blocks(lines, file_path, bug_description, symbols)[:max_regions]
+    padded = [(max(0, start - context), min(len(lines) - 1, end + context)) for (start, end), _ in best]
+    return merge_ranges(padded)
+
+
+def rank_blocks(lines: List[str], file_path: str, bug_description: str, symbols=None) -> List[Tuple[Tuple[int, int], int]]:
+    """
+    Enclosing blocks of the lines with bug-description keyword hits, as
+    ((start, end), hits) pairs with the most hits first.
+    """
+    terms = set(query_terms(bug_description))
+    if not lines or not terms:
+        return []
+
+    blocks = {}
+    for number, line in enumerate(lines):
+        hits = len(terms.intersection(token for token, _ in tokenize(line)))
+        if hits:
+            block = enclosing_block(lines, number, file_path, symbols)
+            blocks[block] = blocks.get(block, 0) + hits
+    return sorted(blocks.items(), key=lambda x: x[1], reverse=True)
+
+
+def number_lines(lines: List[str], start: int, end: int) -> str:
+    return "\n".join(f"{number + 1:>5} | {lines[number]}" for number in range(start, end + 1))
+
+
+def parse_unified_diff(diff_text: str) -> List[dict]:
+    """
+    Parse hunks from a unified diff. Each hunk is
+    {"old_start": 1-based line, "old": [lines], "new": [lines]}.
+    """
+    hunks = []
+    current = None
+    for line in diff_text.splitlines():
+        header = HUNK_HEADER_RE.match(line)
+        if header:
+            current = {"old_start": int(header.group(1)), "old": [], "new": []}
+            hunks.append(current)
+            continue
+        if current is None or line.startswith(('--- ', '+++ ', '\\')):
+            continue
+        if line.startswith('-'):
+            current["old"].append(line[1:])
+        elif line.startswith('+'):
+            current["new"].append(line[1:])
+        else:
+            text = line[1:] if line.startswith(' ') else line
+            current["old"].append(text)
+            current["new"].append(text)
+    hunks = [hunk for hunk in hunks if hunk["old"] != hunk["new"]]
+    if not hunks:
+        raise PatchError("No hunks found in model output")
+    return hunks
+
+
+def _locate(lines: List[str], old: List[str], hint: int) -> int:
+    """
+    Find where `old` occurs in `lines`, preferring the occurrence closest to
+    `hint`. Falls back to comparing with trailing whitespace stripped.
+    """
+    size = len(old)
+    for normalize in (lambda s: s, lambda s: s.rstrip()):
+        target = [normalize(line) for line in old]
+        candidates = [
+            i for i in range(len(lines) - size + 1)
+            if [normalize(line) for line in lines[i:i + size]] == target
+        ]
+        if candidates:
+            return min(candidates, key=lambda i: abs(i - hint))
+    raise PatchError(f"Hunk near line {hint + 1} does not match the file")
+
+
+def apply_hunks(code: str, hunks: List[dict]) -> str:
+    """
+    Apply parsed hunks to code. Each hunk's context and removed lines must be
+    found in the file; hunks are applied bottom-up so line numbers stay valid.
+    """
+    lines = code.splitlines()
+    placed = []
+    for hunk in hunks:
+        if not hunk["old"]:
+            start = min(max(hunk["old_start"], 0), len(lines))
+        else:
+            start = _locate(lines, hunk["old"], hunk["old_start"] - 1)
+        placed.append((start, hunk))
+
+    placed.sort(key=lambda x: x[0])
+    for (start, hunk), (next_start, _) in zip(placed, placed[1:]):
+        if start + len(hunk["old"]) > next_start:
+            raise PatchError("Overlapping hunks in model output")
+
+    for start, hunk in reversed(placed):
+        lines[start:start + len(hunk["old"])] = hunk["new"]
+
+    result = "\n".join(lines)
+    if code.endswith("\n"):
+        result += "\n"
+    return result
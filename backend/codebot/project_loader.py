@@ -0,0 +1,50 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import List
+
+from .code_analyzer import iter_project_files, SOURCE_EXTENSIONS
+
+SNIFF_BYTES = 1024
+
+TEXT_EXTENSIONS = set(SOURCE_EXTENSIONS) | {
+    '.md', '.txt', '.rst', '.yml', '.yaml', '.toml', '.ini', '.cfg', '.env', '.sh',
+    '.scss', '.less', '.svg', '.xml', '.csv', '.sql', '.lock', '.mjs', '.cjs', '.vue',
+}
+BINARY_EXTENSIONS = {
+    '.png', '.jpg', '.jpeg', '.gif', '.bmp', '.ico', '.webp', '.pdf', '.zip', '.gz', '.tgz',
+    '.tar', '.bz2', '.xz', '.7z', '.rar', '.jar', '.war', '.whl', '.egg', '.pyc', '.pyo',
+    '.so', '.dll', '.dylib', '.exe', '.bin', '.o', '.a', '.class', '.woff', '.woff2', '.ttf',
+    '.otf', '.eot', '.mp3', '.mp4', '.mov', '.avi', '.wav', '.sqlite3', '.db', '.pkl',
+}
+
+
+def is_binary_file(file_path: str) -> bool:
+    """
+    Cheap binary check: known extensions decide without I/O, anything else
+    is sniffed for a NUL byte in its first SNIFF_BYTES bytes.
+    """
+    ext = os.path.splitext(file_path)[1].lower()
+    if ext in TEXT_EXTENSIONS:
+        return False
+    if ext in BINARY_EXTENSIONS:
+        return True
+    try:
+        with open(file_path, "rb") as f:
+            return b"\0" in f.read(SNIFF_BYTES)
+    except OSError:
+        return True
+
+
+def scan_text_files(project_path: str, workers: int = 8) -> List[str]:
+    """
+    Relative paths of the project's text files. Excluded folders are pruned
+    during the walk and unknown extensions are sniffed on a thread pool;
+    no file is read in full.
+    """
+    paths = list(iter_project_files(project_path))
+    if workers > 1 and len(paths) > workers:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            binary = list(pool.map(is_binary_file, paths, chunksize=64))
+    else:
+        binary = [is_binary_file(path) for path in paths]
+    return [os.path.relpath(path, project_path) for path, is_binary in zip(paths, binary) if not is_binary]
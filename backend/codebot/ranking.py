@@ -0,0 +1,111 @@
+import os
+import math
+import heapq
+import weakref
+from typing import Dict, List, Optional, Tuple
+
+from .code_analyzer import query_terms
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+# Raw BM25 score a file needs before it is ranked at all. One match of a term
+# found in about half the files scores ~0.7; terms in nearly every file score ~0.
+BM25_MIN_SCORE = 0.5
+
+_scorers = weakref.WeakKeyDictionary()
+
+
+class BM25Scorer:
+    """
+    Okapi BM25 ranking over a FileIndex.
+
+    Corpus statistics (document count, average length, per-term IDF) are
+    computed once per index generation and reused across queries. Scores are
+    accumulated term-at-a-time over the posting lists, so only files that
+    contain at least one query term are ever touched.
+    """
+
+    def __init__(self, index, k1: float = BM25_K1, b: float = BM25_B):
+        self.index = index
+        self.k1 = k1
+        self.b = b
+        self.generation = None
+        self.doc_count = 0
+        self.avg_length = 0.0
+        self.length_norm: Dict[str, float] = {}
+        self.idf: Dict[str, float] = {}
+
+    def _refresh_stats(self) -> None:
+        if self.generation == self.index.generation:
+            return
+        lengths = {rel_path: meta.get("length", 0) for rel_path, meta in self.index.indexed_files().items()}
+        self.doc_count = len(lengths)
+        self.avg_length = (sum(lengths.values()) / self.doc_count) if self.doc_count else 0.0
+        avg = self.avg_length or 1.0
+        # k1 * (1 - b + b * |d| / avgdl) is constant per document, precompute it
+        self.length_norm = {
+            rel_path: self.k1 * (1 - self.b + self.b * length / avg)
+            for rel_path, length in lengths.items()
+        }
+        self.idf = {}
+        self.generation = self.index.generation
+
+    def term_idf(self, term: str) -> float:
+        if term not in self.idf:
+            df = len(self.index.postings.get(term, ()))
+            self.idf[term] = math.log(1 + (self.doc_count - df + 0.5) / (df + 0.5))
+        return self.idf[term]
+
+    def raw_scores(self, terms: List[str]) -> Dict[str, float]:
+        """
+        Return {relative path: BM25 score} for files matching any of the terms.
+        """
+        self._refresh_stats()
+        scores: Dict[str, float] = {}
+        for term in terms:
+            docs = self.index.postings.get(term)
+            if not docs:
+                continue
+            weight = self.term_idf(term) * (self.k1 + 1)
+            for rel_path, positions in docs.items():
+                tf = len(positions)
+                norm = self.length_norm.get(rel_path, self.k1)
+                scores[rel_path] = scores.get(rel_path, 0.0) + weight * tf / (tf + norm)
+        return scores
+
+    def score(self, bug_description: str, top_k: Optional[int] = None,
+              min_raw_score: float = BM25_MIN_SCORE) -> List[Tuple[str, float]]:
+        """
+        Rank files for a bug description.
+        Returns (absolute file path, score) sorted by score, where scores are
+        scaled so the best match is 1.0. Files whose raw BM25 score is below
+        min_raw_score are dropped first, so weak matches are not promoted to
+        1.0 when nothing better exists. With top_k only the k best are kept.
+        """
+        scores = {
+            rel_path: score
+            for rel_path, score in self.raw_scores(query_terms(bug_description)).items()
+            if score >= min_raw_score
+        }
+        if not scores:
+            return []
+
+        if top_k is not None:
+            ranked = heapq.nlargest(top_k, scores.items(), key=lambda x: x[1])
+        else:
+            ranked = sorted(scores.items(), key=lambda x: x[1], reverse=True)
+
+        best = ranked[0][1] or 1.0
+        project_path = self.index.project_path
+        return [(os.path.join(project_path, rel_path), score / best) for rel_path, score in ranked]
+
+
+def get_scorer(index) -> BM25Scorer:
+    """
+    Return the shared BM25Scorer for an index so corpus stats are reused between queries.
+    """
+    scorer = _scorers.get(index)
+    if scorer is None:
+        scorer = BM25Scorer(index)
+        _scorers[index] = scorer
+    return scorer
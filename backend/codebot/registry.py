@@ -0,0 +1,148 @@
+import os
+import time
+import threading
+from collections import OrderedDict
+from typing import Callable, List, Optional
+
+from .bot_core import CodeBot
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def default_factory(project_path: Optional[str]) -> CodeBot:
+    return CodeBot(
+        project_path=project_path,
+        groq_api_key=os.getenv("GROQ_API_KEY"),
+        gemini_api_key=os.getenv("GEMINI_API_KEY"),
+    )
+
+
+class ProjectRegistry:
+    """
+    Process-wide pool of long-lived CodeBot instances, one per project path,
+    so indexes, caches and the HTTP session survive between requests.
+
+    Projects are kept in least-recently-used order. A project is evicted when
+    more than max_projects are held, when their estimated memory exceeds
+    max_memory_bytes (the most recently used one is always kept), or when it
+    has been idle for longer than idle_ttl seconds.
+    """
+
+    def __init__(self, max_projects: int = 8, max_memory_bytes: int = 512 * 1024 * 1024,
+                 idle_ttl: float = 3600, factory: Callable[[Optional[str]], CodeBot] = default_factory):
+        self.max_projects = max_projects
+        self.max_memory_bytes = max_memory_bytes
+        self.idle_ttl = idle_ttl
+        self.factory = factory
+        self._bots = OrderedDict()  # abs project path -> (CodeBot, last used)
+        self._lock = threading.Lock()
+        self._loading = {}  # abs project path -> Lock held while the bot is created
+
+    def get(self, project_path: str) -> CodeBot:
+        """
+        The CodeBot for project_path, created on first use. Concurrent first
+        calls for the same project share one instance.
+        """
+        key = os.path.abspath(project_path)
+        with self._lock:
+            entry = self._bots.get(key)
+            if entry is not None:
+                self._bots[key] = (entry[0], time.monotonic())
+                self._bots.move_to_end(key)
+                return entry[0]
+            loading = self._loading.setdefault(key, threading.Lock())
+
+        with loading:
+            with self._lock:
+                entry = self._bots.get(key)
+            if entry is not None:
+                return entry[0]
+            bot = self.factory(key)
+            with self._lock:
+                self._bots[key] = (bot, time.monotonic())
+                self._loading.pop(key, None)
+        self.evict()
+        return bot
+
+    def find_for_file(self, file_path: str) -> Optional[CodeBot]:
+        """
+        The registered CodeBot whose project contains file_path, if any.
+        """
+        file_path = os.path.abspath(file_path)
+        with self._lock:
+            owners = [key for key in self._bots if file_path.startswith(key + os.sep)]
+        if not owners:
+            return None
+        return self.get(max(owners, key=len))
+
+    def projects(self) -> List[str]:
+        with self._lock:
+            return list(self._bots)
+
+    def remove(self, project_path: str) -> None:
+        with self._lock:
+            self._bots.pop(os.path.abspath(project_path), None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._bots.clear()
+
+    def evict(self) -> List[str]:
+        """
+        Drop idle and least recently used projects until within limits.
+        Returns the evicted project paths.
+        """
+        now = time.monotonic()
+        evicted = []
+        with self._lock:
+            for key, (bot, last_used) in list(self._bots.items()):
+                if self.idle_ttl and now - last_used > self.idle_ttl:
+                    del self._bots[key]
+                    evicted.append(key)
+            while len(self._bots) > self.max_projects:
+                evicted.append(self._bots.popitem(last=False)[0])
+            bots = [bot for bot, _ in self._bots.values()]
+
+        # Estimating memory walks the indexes, so do it outside the lock
+        sizes = [bot.approx_memory_bytes() for bot in bots]
+        total = sum(sizes)
+        with self._lock:
+            for bot, size in zip(bots, sizes):
+                if total <= self.max_memory_bytes or len(self._bots) <= 1:
+                    break
+                key = bot.project_path and os.path.abspath(bot.project_path)
+                if key in self._bots and self._bots[key][0] is bot:
+                    del self._bots[key]
+                    evicted.append(key)
+                    total -= size
+        if evicted:
+            print(f"Evicted {len(evicted)} idle project(s) from the CodeBot registry")
+        return evicted
+
+
+def get_registry() -> ProjectRegistry:
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = ProjectRegistry(
+                max_projects=int(os.getenv("CODEBOT_MAX_PROJECTS", "8")),
+                max_memory_bytes=int(os.getenv("CODEBOT_REGISTRY_MEMORY_MB", "512")) * 1024 * 1024,
+                idle_ttl=float(os.getenv("CODEBOT_PROJECT_IDLE_TTL", "3600")),
+            )
+        return _registry
+
+
+def get_bot(project_path: Optional[str] = None, file_path: Optional[str] = None) -> CodeBot:
+    """
+    Shared CodeBot for a project path, or for the registered project containing
+    file_path. Without either, a fresh CodeBot with no project is returned.
+    """
+    registry = get_registry()
+    if project_path:
+        return registry.get(project_path)
+    if file_path:
+        bot = registry.find_for_file(file_path)
+        if bot is not None:
+            return bot
+    return default_factory(None)
@@ -0,0 +1,66 @@
+import os
+import json
+import sqlite3
+from contextlib import closing
+from typing import Dict, Iterable
+
+
+class RowStore:
+    """
+    Persistent {key: JSON value} rows in a SQLite file, for the per-project
+    indexes. write() only touches the rows it is given, so saving after a
+    few files change costs a few rows instead of rewriting the whole index.
+
+    The file is tagged with a version and project path; a store written by
+    another version or for another project loads as empty and is cleared on
+    the next write.
+    """
+
+    def __init__(self, db_path: str, version: int, project_path: str):
+        self.db_path = db_path
+        self.version = str(version)
+        self.project_path = project_path
+        self.rows_written = 0  # upserted plus deleted rows since creation
+
+    def _connect(self):
+        return sqlite3.connect(self.db_path, timeout=10)
+
+    def _matches(self, conn) -> bool:
+        meta = dict(conn.execute("SELECT key, value FROM meta"))
+        return meta.get("version") == self.version and meta.get("project_path") == self.project_path
+
+    def load(self) -> Dict[str, dict]:
+        if not os.path.exists(self.db_path):
+            return {}
+        try:
+            with closing(self._connect()) as conn:
+                if not self._matches(conn):
+                    return {}
+                return {key: json.loads(value) for key, value in conn.execute("SELECT key, value FROM rows")}
+        except (sqlite3.Error, ValueError) as e:
+            print(f"⚠️ Ignoring unreadable store {self.db_path}: {e}")
+            return {}
+
+    def write(self, rows: Dict[str, dict], deleted: Iterable[str] = ()) -> None:
+        """
+        Insert or replace rows and delete the deleted keys, in one transaction.
+        """
+        deleted = list(deleted)
+        if not rows and not deleted:
+            return
+        os.makedirs(os.path.dirname(self.db_path) or ".", exist_ok=True)
+        with closing(self._connect()) as conn, conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+            conn.execute("CREATE TABLE IF NOT EXISTS rows (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+            if not self._matches(conn):
+                conn.execute("DELETE FROM rows")
+                conn.executemany(
+                    "INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)",
+                    [("version", self.version), ("project_path", self.project_path)],
+                )
+            conn.executemany(
+                "INSERT OR REPLACE INTO rows (key, value) VALUES (?, ?)",
+                [(key, json.dumps(value, separators=(",", ":"))) for key, value in rows.items()],
+            )
+            conn.executemany("DELETE FROM rows WHERE key = ?", [(key,) for key in deleted])
+        self.rows_written += len(rows) + len(deleted)
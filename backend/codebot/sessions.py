@@ -0,0 +1,170 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+from contextlib import closing
+from typing import List, Optional, Union
+
+from .jobs import JobQueue, get_job_queue, FINISHED, SUCCEEDED
+from .registry import get_bot
+
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+
+class SessionError(Exception):
+    """A fix session request that cannot be served; status is the HTTP status to answer with."""
+
+    def __init__(self, message: str, status: int = 400):
+        super().__init__(message)
+        self.status = status
+
+
+def run_fix_session(params, is_cancelled):
+    bot = get_bot(params["project_path"])
+    if "bug_descriptions" in params:
+        return bot.smart_fix_bugs(params["bug_descriptions"], should_stop=is_cancelled)
+    return bot.smart_fix_bug(params["bug_description"], should_stop=is_cancelled)
+
+
+class FixSessions:
+    """
+    Fix sessions on top of the job queue. Creating a session queues one
+    job that ranks the project files and computes the proposals once; preview
+    and apply then read that stored result by session id (the job id) instead
+    of scanning and calling the LLM again. The fix_sessions table records
+    each session and whether it has been applied.
+    """
+
+    def __init__(self, job_queue: JobQueue, db_path: str):
+        self.job_queue = job_queue
+        self.db_path = db_path
+        with closing(self._connect()) as conn, conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS fix_sessions ("
+                "id TEXT PRIMARY KEY, project_path TEXT NOT NULL, bug_description TEXT NOT NULL, "
+                "created REAL, applied REAL, apply_result TEXT)"
+            )
+
+    def _connect(self):
+        return sqlite3.connect(self.db_path, timeout=10)
+
+    def _row(self, session_id: str) -> Optional[sqlite3.Row]:
+        with closing(self._connect()) as conn:
+            conn.row_factory = sqlite3.Row
+            return conn.execute("SELECT * FROM fix_sessions WHERE id = ?", (session_id,)).fetchone()
+
+    def create(self, project_path: str, bug_description: Union[str, List[str]]) -> str:
+        """
+        Queue the session's job. A list of descriptions makes a batch session
+        (CodeBot.smart_fix_bugs): one request per file for all of its bugs.
+        """
+        if isinstance(bug_description, str):
+            params = {"project_path": project_path, "bug_description": bug_description}
+            session_id = self.job_queue.submit("fix_bug", params, run_fix_session)
+        else:
+            params = {"project_path": project_path, "bug_descriptions": list(bug_description)}
+            session_id = self.job_queue.submit("fix_bugs", params, run_fix_session)
+            bug_description = "; ".join(bug_description)
+        with closing(self._connect()) as conn, conn:
+            conn.execute(
+                "INSERT INTO fix_sessions (id, project_path, bug_description, created) VALUES (?, ?, ?, ?)",
+                (session_id, project_path, bug_description, time.time()),
+            )
+        return session_id
+
+    def get(self, session_id: str, wait: float = 0) -> Optional[dict]:
+        """
+        Session status with its previews once the job has finished. With wait,
+        blocks up to that many seconds for the job to finish.
+        """
+        row = self._row(session_id)
+        if row is None:
+            return None
+        job = self.job_queue.get(session_id)
+        if job is not None and wait > 0 and job["status"] not in FINISHED:
+            job = self.job_queue.wait(session_id, timeout=wait)
+        if job is None:
+            return None
+
+        session = {
+            "session_id": session_id,
+            "status": job["status"],
+            "project_path": row["project_path"],
+            "bug_description": row["bug_description"],
+            "applied": row["applied"] is not None,
+            "error": job["error"],
+        }
+        if job["status"] == SUCCEEDED:
+            result = job["result"] or {}
+            ranked = sorted(result.get("files", []), key=lambda f: f["score"], reverse=True)
+            session["bug_type"] = result.get("bug_type")
+            session["message"] = result.get("message")
+            if "bugs" in result:
+                session["bugs"] = result["bugs"]
+            session["previews"] = [f["proposal"] for f in ranked if "fixed_code" in f["proposal"]]
+            session["skipped"] = [
+                dict(f["proposal"], file=f["file"]) for f in ranked if "fixed_code" not in f["proposal"]
+            ]
+        return session
+
+    def apply(self, session_id: str, files: Optional[List[str]] = None) -> dict:
+        """
+        Apply the session's stored proposals (or only those for `files`) as one
+        batch through CodeBot.apply_fixes. A session is applied at most once,
+        and not at all (status "stale") if a file changed after its preview.
+        """
+        session = self.get(session_id)
+        if session is None:
+            raise SessionError("Session not found", status=404)
+        if session["status"] != SUCCEEDED:
+            raise SessionError(f"Session is {session['status']}, not ready to apply", status=409)
+        previews = [p for p in session["previews"] if files is None or p["file"] in files]
+        if not previews:
+            raise SessionError("No proposed changes to apply")
+
+        with closing(self._connect()) as conn, conn:
+            claimed = conn.execute(
+                "UPDATE fix_sessions SET applied = ? WHERE id = ? AND applied IS NULL", (time.time(), session_id)
+            ).rowcount
+        if not claimed:
+            raise SessionError("Session was already applied", status=409)
+
+        try:
+            bot = get_bot(session["project_path"])
+            result = bot.apply_fixes(
+                [
+                    {"file_path": p["file"], "fixed_code": p["fixed_code"], "original_sha1": p.get("original_sha1")}
+                    for p in previews
+                ],
+                session["bug_description"],
+            )
+        except Exception:
+            self._release(session_id)
+            raise
+        if result["status"] != "success":
+            self._release(session_id)
+        else:
+            with closing(self._connect()) as conn, conn:
+                conn.execute("UPDATE fix_sessions SET apply_result = ? WHERE id = ?", (json.dumps(result), session_id))
+        return dict(result, session_id=session_id)
+
+    def _release(self, session_id: str) -> None:
+        """Let a session whose apply failed be applied again."""
+        with closing(self._connect()) as conn, conn:
+            conn.execute("UPDATE fix_sessions SET applied = NULL WHERE id = ?", (session_id,))
+
+
+def get_sessions(storage_dir: str = "project_store") -> FixSessions:
+    """
+    Process-wide FixSessions for a storage_dir, sharing its job queue and database.
+    """
+    key = os.path.abspath(storage_dir)
+    with _sessions_lock:
+        sessions = _sessions.get(key)
+        if sessions is None:
+            job_queue = get_job_queue(storage_dir)
+            sessions = FixSessions(job_queue, job_queue.db_path)
+            _sessions[key] = sessions
+        return sessions
@@ -0,0 +1,238 @@
+import os
+import re
+import ast
+import hashlib
+from typing import Dict, List, Set, Tuple
+
+from .row_store import RowStore
+
+SYMBOLS_VERSION = 1
+
+SYMBOL_EXTENSIONS = ('.py', '.ts', '.tsx', '.js', '.jsx')
+
+SCRIPT_PATTERNS = [
+    ("function", re.compile(r'^\s*(?:export\s+)?(?:default\s+)?(?:async\s+)?function\s*\*?\s*(\w+)')),
+    ("class", re.compile(r'^\s*(?:export\s+)?(?:default\s+)?(?:abstract\s+)?class\s+(\w+)')),
+    ("interface", re.compile(r'^\s*(?:export\s+)?interface\s+(\w+)')),
+    ("function", re.compile(
+        r'^\s*(?:export\s+)?(?:const|let|var)\s+(\w+)\s*(?::[^=]+)?=\s*(?:async\s+)?'
+        r'(?:function\b|\([^)]*\)\s*(?::[^=]+)?=>|\w+\s*=>|React\.memo|memo|forwardRef)'
+    )),
+    ("method", re.compile(
+        r'^\s+(?:public\s+|private\s+|protected\s+|static\s+|async\s+|readonly\s+)*'
+        r'(?!(?:if|for|while|switch|catch|return|function)\b)(\w+)\s*\([^;]*\)\s*(?::\s*[^{;]+)?\{\s*$'
+    )),
+]
+
+
+def python_symbols(code: str) -> List[dict]:
+    """
+    Functions, methods and classes of a Python file with 1-based line spans, via ast.
+    """
+    try:
+        tree = ast.parse(code)
+    except (SyntaxError, ValueError):
+        return []
+
+    symbols = []
+
+    def visit(node, parents):
+        for child in ast.iter_child_nodes(node):
+            if isinstance(child, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+                if isinstance(child, ast.ClassDef):
+                    kind = "class"
+                else:
+                    kind = "method" if parents and parents[-1][1] == "class" else "function"
+                start = min([child.lineno] + [d.lineno for d in child.decorator_list])
+                symbols.append({
+                    "name": child.name,
+                    "qualname": ".".join([p[0] for p in parents] + [child.name]),
+                    "kind": kind,
+                    "start": start,
+                    "end": child.end_lineno,
+                })
+                visit(child, parents + [(child.name, kind)])
+            else:
+                visit(child, parents)
+
+    visit(tree, [])
+    return symbols
+
+
+def _brace_end(lines: List[str], start: int) -> int:
+    """
+    0-based index of the line closing the brace block opened at or after `start`.
+    """
+    depth = 0
+    opened = False
+    for end in range(start, len(lines)):
+        for char in lines[end]:
+            if char == '{':
+                depth += 1
+                opened = True
+            elif char == '}':
+                depth -= 1
+        if opened and depth <= 0:
+            return end
+        if not opened and end > start and lines[end].rstrip().endswith(';'):
+            return end
+    return len(lines) - 1
+
+
+def script_symbols(code: str) -> List[dict]:
+    """
+    Functions, classes, interfaces and methods of a TS/JS file with 1-based
+    line spans, found with a lightweight line tokenizer and brace matching.
+    """
+    lines = code.splitlines()
+    symbols = []
+    for number, line in enumerate(lines):
+        for kind, pattern in SCRIPT_PATTERNS:
+            match = pattern.match(line)
+            if match:
+                end = _brace_end(lines, number)
+                symbols.append({"name": match.group(1), "qualname": match.group(1), "kind": kind,
+                                "start": number + 1, "end": end + 1})
+                break
+    return symbols
+
+
+def symbols_path_for(project_path: str, storage_dir: str) -> str:
+    key = hashlib.sha1(os.path.abspath(project_path).encode("utf-8")).hexdigest()[:12]
+    return os.path.join(storage_dir, f"symbols_{key}.sqlite3")
+
+
+def extract_symbols(file_path: str, code: str) -> List[dict]:
+    if file_path.endswith('.py'):
+        return python_symbols(code)
+    if file_path.endswith(SYMBOL_EXTENSIONS):
+        return script_symbols(code)
+    return []
+
+
+class SymbolIndex:
+    """
+    Functions and classes per project file, updated incrementally from file
+    mtime/size. by_name gives O(1) lookup of a symbol name to the files and
+    line spans that define it. Each project has its own store with one row
+    per file, and save() writes only the files changed since the last save.
+    """
+
+    def __init__(self, project_path: str, db_path: str):
+        self.project_path = os.path.abspath(project_path)
+        self.db_path = db_path
+        self.store = RowStore(db_path, SYMBOLS_VERSION, self.project_path)
+        self.files: Dict[str, dict] = {}
+        self.by_name: Dict[str, List[dict]] = {}
+        self._dirty: Set[str] = set()
+
+    @classmethod
+    def open(cls, project_path: str, storage_dir: str) -> "SymbolIndex":
+        symbols = cls(project_path, symbols_path_for(project_path, storage_dir))
+        symbols.load()
+        return symbols
+
+    def load(self) -> None:
+        self.files = self.store.load()
+        self._rebuild_names()
+
+    def save(self) -> None:
+        """
+        Write the files changed or removed since the last save.
+        """
+        if not self._dirty:
+            return
+        rows = {rel_path: self.files[rel_path] for rel_path in self._dirty if rel_path in self.files}
+        self.store.write(rows, [rel_path for rel_path in self._dirty if rel_path not in self.files])
+        self._dirty.clear()
+
+    def sync(self, file_meta: Dict[str, dict]) -> Tuple[List[str], List[str]]:
+        """
+        Re-parse files whose mtime/size in file_meta ({relative path: {"mtime", "size", "sha1"?}},
+        e.g. FileIndex.files) differ from what was indexed, unless their sha1
+        is unchanged, and drop files no longer listed. Returns (re-parsed, removed) relative paths.
+        """
+        changed = []
+        for rel_path, meta in file_meta.items():
+            if not rel_path.endswith(SYMBOL_EXTENSIONS):
+                continue
+            entry = self.files.get(rel_path)
+            if entry is not None and entry["mtime"] == meta["mtime"] and entry["size"] == meta["size"]:
+                continue
+            if entry is not None and meta.get("sha1") and entry.get("sha1") == meta["sha1"]:
+                entry["mtime"] = meta["mtime"]  # touched, not modified
+                self._dirty.add(rel_path)
+                continue
+            changed.append(rel_path)
+        removed = [rel_path for rel_path in self.files if rel_path not in file_meta]
+        for rel_path in removed:
+            self._forget_names(rel_path)
+            del self.files[rel_path]
+        self._dirty.update(changed)
+        self._dirty.update(removed)
+        for rel_path in changed:
+            self._forget_names(rel_path)
+            file_path = os.path.join(self.project_path, rel_path)
+            try:
+                with open(file_path, "r", encoding="utf-8", errors="ignore") as f:
+                    code = f.read()
+            except OSError:
+                self.files.pop(rel_path, None)
+                continue
+            meta = file_meta[rel_path]
+            self.files[rel_path] = {"mtime": meta["mtime"], "size": meta["size"], "sha1": meta.get("sha1"),
+                                    "symbols": extract_symbols(rel_path, code)}
+            self._add_names(rel_path)
+        return changed, removed
+
+    def _rebuild_names(self) -> None:
+        self.by_name = {}
+        for rel_path in self.files:
+            self._add_names(rel_path)
+
+    def _add_names(self, rel_path: str) -> None:
+        file_path = os.path.join(self.project_path, rel_path)
+        for symbol in self.files[rel_path]["symbols"]:
+            location = dict(symbol, file=file_path)
+            self.by_name.setdefault(symbol["name"], []).append(location)
+            if symbol["qualname"] != symbol["name"]:
+                self.by_name.setdefault(symbol["qualname"], []).append(location)
+
+    def _forget_names(self, rel_path: str) -> None:
+        """
+        Drop the by_name entries of one file, so a sync costs the changed files, not the project.
+        """
+        entry = self.files.get(rel_path)
+        if entry is None:
+            return
+        file_path = os.path.join(self.project_path, rel_path)
+        for name in {n for s in entry["symbols"] for n in (s["name"], s["qualname"])}:
+            locations = [loc for loc in self.by_name.get(name, []) if loc["file"] != file_path]
+            if locations:
+                self.by_name[name] = locations
+            else:
+                self.by_name.pop(name, None)
+
+    def lookup(self, name: str) -> List[dict]:
+        """
+        Definitions of a function/class name (or Class.method qualname) as
+        {"file", "name", "qualname", "kind", "start", "end"} with 1-based lines.
+        """
+        return self.by_name.get(name, [])
+
+    def symbols_for(self, file_path: str) -> List[dict]:
+        rel_path = os.path.relpath(os.path.abspath(file_path), self.project_path)
+        entry = self.files.get(rel_path)
+        return entry["symbols"] if entry else []
+
+    def functions_by_file(self) -> Dict[str, dict]:
+        """
+        {relative path: {"functions": [...], "classes": [...]}} for CodeBot.state.
+        """
+        state = {}
+        for rel_path, entry in self.files.items():
+            state[rel_path] = {
+                "functions": [s["qualname"] for s in entry["symbols"] if s["kind"] in ("function", "method")],
+                "classes": [s["name"] for s in entry["symbols"] if s["kind"] in ("class", "interface")],
+            }
+        return state
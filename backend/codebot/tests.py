@@ -1,3 +1,1320 @@
+import os
+import time
+import shutil
+import json
+import hashlib
+import tempfile
+import threading
+import socket
+import sqlite3
+import subprocess
+from contextlib import closing
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock, skipUnless
+
+import requests
 from django.test import TestCase
+from git import Repo
+
+from .code_analyzer import tokenize, analyze_file_content, find_relevant_files
+from .file_index import FileIndex
+from .ranking import get_scorer
+from .bot_core import CodeBot
+from .llm_cache import LLMCache
+from .http_client import HttpClient
+from .jobs import JobQueue, SUCCEEDED, CANCELLED, FAILED, RUNNING, _process_start
+from .patching import find_regions, parse_unified_diff, apply_hunks, number_lines, PatchError
+from .symbol_index import SymbolIndex, python_symbols, script_symbols
+from .project_loader import scan_text_files
+from .manifest import ProjectManifest, describe_file
+from .watcher import ProjectWatcher, get_watcher, stop_watcher
+from .folder_tree import build_tree, tree_from_files, list_directory
+from .registry import ProjectRegistry, get_registry
+from .utils import verify_sources, write_file, read_file
+from .git_sync import push_with_retry
+from .context_builder import estimate_tokens, pack_regions, imported_files, UsageLog
+from .sessions import FixSessions, SessionError
+from .frontend_utils import TypeScriptChecker
+from .tracing import Metrics, span
+from .benchmarks import bench_pipeline, start_fake_gemini
+from .diffing import diff_lines, diff_texts, unified_diff, changed_lines
+
+
+def make_project(files):
+    """Create a throwaway project directory from a {relative path: content} dict."""
+    root = tempfile.mkdtemp(prefix="codebot_test_")
+    for rel_path, content in files.items():
+        full_path = os.path.join(root, rel_path)
+        os.makedirs(os.path.dirname(full_path), exist_ok=True)
+        with open(full_path, "w", encoding="utf-8") as f:
+            f.write(content)
+    return root
+
+
+class FileIndexTests(TestCase):
+    def setUp(self):
+        self.project = make_project({
+            "app/views.py": "def get_user(user_id):\n    raise ValueError('user not found')\n",
+            "app/models.py": "class Todo:\n    title = ''\n",
+            "web/style.css": ".box { width: 10px; }\n",
+        })
+        self.storage = tempfile.mkdtemp(prefix="codebot_store_")
+
+    def tearDown(self):
+        shutil.rmtree(self.project, ignore_errors=True)
+        shutil.rmtree(self.storage, ignore_errors=True)
+
+    def test_tokenize_splits_identifiers(self):
+        terms = {term for term, _ in tokenize("getUserName(user_id)")}
+        self.assertTrue({"getusername", "get", "user", "name", "user_id", "id"} <= terms)
+
+    def test_oversized_file_is_skipped_once(self):
+        with open(os.path.join(self.project, "data.json"), "w") as f:
+            f.write('{"user": "' + "x" * 400 + '"}')
+        index = FileIndex.open(self.project, self.storage)
+        with mock.patch("codebot.file_index.MAX_INDEX_FILE_BYTES", 300):
+            changed, _ = index.refresh()
+            generation = index.generation
+            self.assertIn("data.json", changed)
+            self.assertEqual(index.refresh(), ([], []))
+            meta = {rel: {"mtime": e["mtime"], "size": e["size"]} for rel, e in index.files.items()}
+            self.assertEqual(index.sync(meta), ([], []))
+        self.assertEqual(index.generation, generation)
+        self.assertTrue(index.files["data.json"]["skipped"])
+        self.assertNotIn("data.json", index.indexed_files())
+        scorer = get_scorer(index)
+        scorer.score("user")
+        self.assertEqual(scorer.doc_count, 3)
+
+    def test_score_uses_whole_tokens(self):
+        index = FileIndex.open(self.project, self.storage)
+        index.refresh()
+        scores = dict(get_scorer(index).score("user id"))
+        self.assertIn(os.path.join(self.project, "app/views.py"), scores)
+        # "id" must not match inside "width"
+        self.assertNotIn(os.path.join(self.project, "web/style.css"), scores)
+        self.assertEqual(analyze_file_content(os.path.join(self.project, "web/style.css"), "id"), 0.0)
+
+    def test_bm25_top_k_ranks_best_match_first(self):
+        index = FileIndex.open(self.project, self.storage)
+        index.refresh()
+        results = find_relevant_files(self.project, "user not found", scorer=get_scorer(index), top_k=1)
+        self.assertEqual(results, [(os.path.join(self.project, "app/views.py"), 1.0)])
+
+    def test_bm25_drops_weak_matches_before_normalizing(self):
+        index = FileIndex.open(self.project, self.storage)
+        index.refresh()
+        scorer = get_scorer(index)
+        raw = scorer.raw_scores(["user"])
+        weakest = min(raw.values())
+        self.assertEqual(len(scorer.score("user", min_raw_score=weakest)), len(raw))
+        # With a floor above every match nothing is ranked, instead of the best weak hit becoming 1.0
+        self.assertEqual(scorer.score("user", min_raw_score=max(raw.values()) + 1), [])
+
+    def test_parallel_scan_matches_serial(self):
+        serial = find_relevant_files(self.project, "user todo title", min_score=0.0)
+        parallel = find_relevant_files(self.project, "user todo title", min_score=0.0, workers=2, top_k=2)
+        self.assertEqual(parallel, serial[:2])
+
+    def test_refresh_is_incremental_and_persisted(self):
+        index = FileIndex.open(self.project, self.storage)
+        changed, removed = index.refresh()
+        self.assertEqual(len(changed), 3)
+        index.save()
+
+        reloaded = FileIndex.open(self.project, self.storage)
+        self.assertEqual(reloaded.refresh(), ([], []))
+
+        with open(os.path.join(self.project, "app/models.py"), "a", encoding="utf-8") as f:
+            f.write("    done = False\n")
+        os.remove(os.path.join(self.project, "web/style.css"))
+        changed, removed = reloaded.refresh()
+        self.assertEqual(changed, ["app/models.py"])
+        self.assertEqual(removed, ["web/style.css"])
+        self.assertIn("app/models.py", reloaded.lookup(["done"]))
+        self.assertNotIn("width", reloaded.postings)
+
+        # Saving writes only the changed and the removed file's rows
+        written = reloaded.store.rows_written
+        reloaded.save()
+        self.assertEqual(reloaded.store.rows_written - written, 2)
+        again = FileIndex.open(self.project, self.storage)
+        self.assertEqual(again.postings, reloaded.postings)
+        self.assertEqual(again.files, reloaded.files)
+
+    def test_one_file_change_writes_one_row_per_store(self):
+        bot = CodeBot(storage_dir=self.storage, project_path=self.project)
+        bot.refresh_project()
+        stores = (bot.manifest.store, bot.index.store, bot.symbols.store)
+        written = [store.rows_written for store in stores]
+        with open(os.path.join(self.project, "app/views.py"), "a", encoding="utf-8") as f:
+            f.write("# touched\n")
+        bot.refresh_project()
+        self.assertEqual([store.rows_written - before for store, before in zip(stores, written)], [1, 1, 1])
+        self.assertIn("touched", bot.index.file_terms["app/views.py"])
+
+
+class ProposeFixTests(TestCase):
+    def setUp(self):
+        self.project = make_project({
+            "a.py": "def a():\n    x = 1\n",
+            "b.py": "def b():\n    y = 2\n",
+            "c.py": "def c():\n    z = 3\n",
+        })
+        self.storage = tempfile.mkdtemp(prefix="codebot_store_")
+        self.bot = CodeBot(storage_dir=self.storage, project_path=self.project)
+
+    def tearDown(self):
+        shutil.rmtree(self.project, ignore_errors=True)
+        shutil.rmtree(self.storage, ignore_errors=True)
+
+    def test_propose_fixes_runs_llm_calls_concurrently(self):
+        def slow_fix(code, file_path, prompt, **kwargs):
+            time.sleep(0.3)
+            return code.replace("=", "= 10 +")
+
+        paths = [os.path.join(self.project, name) for name in ("a.py", "b.py", "c.py")]
+        with mock.patch.object(self.bot, "get_groq_fix", side_effect=slow_fix):
+            start = time.perf_counter()
+            previews = self.bot.propose_fixes(paths, "bump values")
+            elapsed = time.perf_counter() - start
+
+        self.assertLess(elapsed, 0.8)
+        self.assertEqual([p["file"] for p in previews], paths)
+
+    def test_failed_verification_reprompts_with_errors(self):
+        replies = ["def a(:\n    x = 2\n", "def a():\n    x = 2\n"]
+        prompts = []
+
+        def fix(code, file_path, prompt, **kwargs):
+            prompts.append(prompt)
+            return replies[len(prompts) - 1]
+
+        with mock.patch.object(self.bot, "get_groq_fix", side_effect=fix):
+            preview = self.bot._propose_fix(os.path.join(self.project, "a.py"), "x should be 2")
+
+        self.assertEqual(preview["fixed_code"], "def a():\n    x = 2")
+        self.assertEqual(preview["verification"], {"checked": True, "passed": True, "errors": "", "attempts": 2})
+        self.assertIn("a.py:1", prompts[1])
+
+    def test_over_budget_file_is_never_sent_whole(self):
+        code = "".join(f"def f{i}():\n    return {i}\n" for i in range(60))
+        path = os.path.join(self.project, "big.py")
+        write_file(path, code)
+        self.bot.context_tokens = 40
+        broken = "--- a/big.py\n+++ b/big.py\n@@ -1,2 +1,2 @@\n-def f0():\n+def f0(:\n     return 0\n"
+        patches = [broken]
+
+        def next_patch(*args, **kwargs):
+            if not patches:
+                raise PatchError("model returned no usable diff")
+            return patches.pop(0)
+
+        with mock.patch.object(self.bot, "get_groq_patch", side_effect=next_patch) as patch, \
+                mock.patch.object(self.bot, "get_groq_fix") as full_file:
+            preview = self.bot._propose_fix(path, "f0 should return 0")
+            self.assertEqual(patch.call_count, 2)  # the verification retry asks for a patch too
+            self.assertIn("did not pass a syntax check", patch.call_args[0][2])
+            self.assertEqual(preview["verification"]["attempts"], 1)
+            self.assertFalse(preview["verification"]["passed"])
+
+            preview = self.bot._propose_fix(path, "f0 should return 0")
+            self.assertIn("context budget", preview["error"])
+        self.assertFalse(full_file.called)
+
+    def test_smart_fix_bugs_sends_one_request_per_file(self):
+        project = make_project({
+            "cart.py": "def cart_total(prices):\n    return sum(prices)\n",
+            "login.py": "def login_session(user):\n    return user\n",
+        })
+        self.addCleanup(shutil.rmtree, project, True)
+        self.bot.load_project(project)
+        calls = []
+
+        def fix(code, file_path, prompt, **kwargs):
+            calls.append((os.path.basename(file_path), prompt))
+            return code + "# fixed\n"
+
+        bugs = ["cart total ignores prices", "login session leaks user", "cart prices rounding"]
+        with mock.patch.object(self.bot, "get_groq_fix", side_effect=fix):
+            summary = self.bot.smart_fix_bugs(bugs)
+
+        self.assertEqual(sorted(name for name, _ in calls), ["cart.py", "login.py"])
+        prompts = dict(calls)
+        self.assertIn("1. cart total ignores prices\n2. cart prices rounding", prompts["cart.py"])
+        self.assertEqual(prompts["login.py"], "login session leaks user")
+        by_file = {os.path.basename(f["file"]): f["bugs"] for f in summary["files"]}
+        self.assertEqual(by_file, {"cart.py": [0, 2], "login.py": [1]})
+        self.assertEqual([len(bug["files"]) for bug in summary["bugs"]], [1, 1, 1])
+
+    def test_batch_regions_are_ranked_on_the_bug_texts_only(self):
+        project = make_project({"cart.py": "def cart_total(prices):\n    return sum(prices)\n"})
+        self.addCleanup(shutil.rmtree, project, True)
+        self.bot.load_project(project)
+        self.bot.patch_mode = "always"
+        patch = "--- a/cart.py\n+++ b/cart.py\n@@ -2 +2 @@\n-    return sum(prices)\n+    return round(sum(prices), 2)\n"
+        bugs = ["cart total ignores prices", "cart prices rounding"]
+        with mock.patch("codebot.bot_core.pack_regions", wraps=pack_regions) as pack, \
+                mock.patch.object(self.bot, "get_groq_patch", return_value=patch) as get_patch:
+            self.bot.smart_fix_bugs(bugs)
+        self.assertEqual(pack.call_args[0][2], "cart total ignores prices\ncart prices rounding")
+        self.assertIn("Fix all of the following bugs", get_patch.call_args[0][2])
+
+    def test_fix_bug_for_file_and_symbol_targets(self):
+        self.bot.load_project(self.project)
+        a_path = os.path.join(self.project, "a.py")
+        with mock.patch.object(self.bot, "get_groq_fix", side_effect=lambda code, *a, **k: code.replace("1", "2")), \
+                mock.patch.object(self.bot, "commit_changes") as commit:
+            self.bot.fix_bug(a_path, "x should be 2")
+            self.assertEqual(read_file(a_path), "def a():\n    x = 2")
+            commit.assert_called_once_with(a_path, "x should be 2")
+
+        patch = "```diff\n@@ -1,2 +1,2 @@\n def b():\n-    y = 2\n+    y = 3\n```"
+        with mock.patch.object(self.bot, "get_groq_patch", return_value=patch) as get_patch, \
+                mock.patch.object(self.bot, "commit_changes"):
+            self.bot.fix_bug("b", "y should be 3")
+        self.assertEqual(get_patch.call_args[0][3], [(0, 1)])
+        self.assertEqual(read_file(os.path.join(self.project, "b.py")), "def b():\n    y = 3\n")
+
+    def test_fix_bug_keeps_large_files_within_the_budget(self):
+        code = "".join(f"def f{i}():\n    return {i}\n" for i in range(60))
+        path = os.path.join(self.project, "big.py")
+        write_file(path, code)
+        self.bot.context_tokens = 40
+        patch = "--- a/big.py\n+++ b/big.py\n@@ -1,2 +1,2 @@\n def f0():\n-    return 0\n+    return -1\n"
+        with mock.patch.object(self.bot, "get_groq_patch", return_value=patch) as get_patch, \
+                mock.patch.object(self.bot, "get_groq_fix") as full_file, \
+                mock.patch.object(self.bot, "commit_changes"):
+            self.bot.fix_bug(path, "f0 should return -1")
+        self.assertFalse(full_file.called)
+        regions = get_patch.call_args[0][3]
+        self.assertLessEqual(sum(estimate_tokens(number_lines(code.splitlines(), s, e)) for s, e in regions), 40)
+        self.assertTrue(read_file(path).startswith("def f0():\n    return -1\n"))
+
+    def test_failed_file_does_not_abort_others(self):
+        def flaky_fix(code, file_path, prompt, **kwargs):
+            if file_path.endswith("b.py"):
+                raise RuntimeError("boom")
+            return code + "    w = 4\n"
+
+        paths = [os.path.join(self.project, name) for name in ("a.py", "b.py")]
+        with mock.patch.object(self.bot, "get_groq_fix", side_effect=flaky_fix):
+            previews = self.bot.propose_fixes(paths, "add w")
+
+        self.assertIn("fixed_code", previews[0])
+        self.assertEqual(previews[1], {"file": paths[1], "error": "boom"})
+
+
+class LLMCacheTests(TestCase):
+    def setUp(self):
+        self.storage = tempfile.mkdtemp(prefix="codebot_store_")
+
+    def tearDown(self):
+        shutil.rmtree(self.storage, ignore_errors=True)
+
+    def test_lru_eviction_and_counters(self):
+        cache = LLMCache(max_entries=2)
+        cache.set("a", "1")
+        cache.set("b", "2")
+        cache.get("a")
+        cache.set("c", "3")
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.get("a"), "1")
+        self.assertEqual(cache.stats()["hits"], 2)
+        self.assertEqual(cache.stats()["misses"], 1)
+
+    def test_disk_tier_survives_new_instance_and_expires(self):
+        db_path = os.path.join(self.storage, "cache.sqlite3")
+        LLMCache(db_path=db_path).set("key", "value")
+        self.assertEqual(LLMCache(db_path=db_path).get("key"), "value")
+        self.assertIsNone(LLMCache(db_path=db_path, ttl=-1).get("key"))
+
+    def test_get_groq_fix_reuses_cached_response(self):
+        bot = CodeBot(storage_dir=self.storage)
+        reply = mock.Mock()
+        reply.json.return_value = {"candidates": [{"content": {"parts": [{"text": "fixed"}]}}]}
+        with mock.patch.object(bot.http, "post", return_value=reply) as post:
+            self.assertEqual(bot.get_groq_fix("code", "a.py", "bug"), "fixed")
+            self.assertEqual(bot.get_groq_fix("code", "a.py", "bug"), "fixed")
+            self.assertEqual(post.call_count, 1)
+            bot.get_groq_fix("changed code", "a.py", "bug")
+            self.assertEqual(post.call_count, 2)
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """Answers with the queued (status, headers) replies, then 200 with `body`."""
+    replies = []
+    seen = []
+    body = b'{"ok": true}'
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        StubHandler.seen.append(self.path)
+        status, headers = StubHandler.replies.pop(0) if StubHandler.replies else (200, {})
+        body = StubHandler.body
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class HttpClientTests(TestCase):
+    def setUp(self):
+        StubHandler.replies = []
+        StubHandler.seen = []
+        StubHandler.body = b'{"ok": true}'
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/generate"
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_retries_429_honoring_retry_after(self):
+        StubHandler.replies = [(429, {"Retry-After": "2"}), (503, {})]
+        client = HttpClient(max_retries=3, backoff=0.01)
+        delays = []
+        client.sleep = delays.append
+        response = client.post(self.url, json={})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(StubHandler.seen), 3)
+        self.assertEqual(delays[0], 2.0)
+        self.assertLessEqual(delays[1], 0.02)
+
+    def test_gives_up_after_max_retries(self):
+        StubHandler.replies = [(429, {"Retry-After": "0"})] * 3
+        client = HttpClient(max_retries=1)
+        client.sleep = lambda delay: None
+        self.assertEqual(client.post(self.url, json={}).status_code, 429)
+        self.assertEqual(len(StubHandler.seen), 2)
+
+    def test_post_read_timeout_is_not_retried(self):
+        server, base_url = start_fake_gemini(latency=1.0)
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        client = HttpClient(timeout=0.2, max_retries=3)
+        delays = []
+        client.sleep = delays.append
+        start = time.perf_counter()
+        with self.assertRaises(requests.Timeout):
+            client.post(f"{base_url}/models/fake:generateContent", json={"contents": [{"parts": [{"text": ""}]}]})
+        self.assertLess(time.perf_counter() - start, 0.6)
+        self.assertEqual(delays, [])
+
+    def test_connection_errors_are_retried_for_post(self):
+        client = HttpClient(max_retries=2, backoff=0.01)
+        delays = []
+        client.sleep = delays.append
+        with closing(socket.socket()) as sock:
+            sock.bind(("127.0.0.1", 0))
+            port = sock.getsockname()[1]  # nothing listens here once it is closed
+        with self.assertRaises(requests.ConnectionError):
+            client.post(f"http://127.0.0.1:{port}/generate", json={})
+        self.assertEqual(len(delays), 2)
+
+    def test_streaming_fix_reports_chunks(self):
+        events = [{"candidates": [{"content": {"parts": [{"text": text}]}}]}
+                  for text in ("def a():\n", "    return 1\n")]
+        StubHandler.body = "".join(f"data: {json.dumps(e)}\r\n\r\n" for e in events).encode("utf-8")
+        client = HttpClient()
+        storage = tempfile.mkdtemp(prefix="codebot_store_")
+        self.addCleanup(shutil.rmtree, storage, True)
+        bot = CodeBot(storage_dir=storage)
+        chunks = []
+        with mock.patch.object(bot.http, "post", side_effect=lambda url, **kw: client.post(self.url, **kw)):
+            text = bot.get_groq_fix("def a(): pass", "a.py", "return 1", on_chunk=chunks.append)
+        self.assertEqual(chunks, ["def a():\n", "    return 1\n"])
+        self.assertEqual(text, "def a():\n    return 1\n")
+
+
+class PreviewStreamViewTests(TestCase):
+    def setUp(self):
+        self.project = make_project({"app/todo.py": "def load_todo():\n    return None\n"})
+        self.addCleanup(shutil.rmtree, self.project, True)
+
+    def test_streams_files_chunks_and_previews(self):
+        def fake_fix(code, file_path, prompt, on_chunk=None):
+            fixed = "def load_todo():\n    return []\n"
+            if on_chunk:
+                on_chunk(fixed)
+            return fixed
+
+        with mock.patch.dict(os.environ, {"CODEBOT_LLM_CACHE": "0"}), \
+                mock.patch("codebot.views.CodeBot.get_groq_fix", side_effect=fake_fix):
+            response = self.client.post(
+                "/api/preview_fix/stream/",
+                data=json.dumps({"bug_description": "load todo returns none", "project_path": self.project}),
+                content_type="application/json",
+            )
+            lines = [json.loads(line) for line in b"".join(response.streaming_content).splitlines()]
+
+        self.assertEqual([line["event"] for line in lines], ["files", "chunk", "preview", "done"])
+        self.assertEqual(lines[2]["preview"]["fixed_code"], "def load_todo():\n    return []")
+
+
+class JobQueueTests(TestCase):
+    def setUp(self):
+        self.storage = tempfile.mkdtemp(prefix="codebot_store_")
+        self.addCleanup(shutil.rmtree, self.storage, True)
+        self.jobs = JobQueue(os.path.join(self.storage, "jobs.sqlite3"), workers=1)
+
+    def test_restart_only_fails_jobs_of_exited_processes(self):
+        other = subprocess.Popen(["sleep", "30"])
+        self.addCleanup(other.wait)
+        self.addCleanup(other.kill)
+        db_path = os.path.join(self.storage, "jobs.sqlite3")
+        owners = {
+            "ours": self.jobs.owner,
+            "other_live": f"{other.pid}:{_process_start(other.pid) or 'x'}",
+            "exited": "999999999:1",
+            "legacy": None,
+        }
+        with closing(sqlite3.connect(db_path)) as conn, conn:
+            for job_id, owner in owners.items():
+                conn.execute("INSERT INTO jobs (id, kind, status, owner) VALUES (?, 'test', ?, ?)", (job_id, RUNNING, owner))
+
+        JobQueue(db_path, workers=1)
+        statuses = {job_id: self.jobs.get(job_id)["status"] for job_id in owners}
+        self.assertEqual(statuses, {"ours": RUNNING, "other_live": RUNNING, "exited": FAILED, "legacy": FAILED})
+
+    def test_job_result_is_stored(self):
+        job_id = self.jobs.submit("echo", {"value": 3}, lambda params, is_cancelled: {"double": params["value"] * 2})
+        job = self.jobs.wait(job_id, timeout=5)
+        self.assertEqual(job["status"], SUCCEEDED)
+        self.assertEqual(job["result"], {"double": 6})
+
+    def test_failed_job_records_error(self):
+        def fail(params, is_cancelled):
+            raise ValueError("bad input")
+
+        job = self.jobs.wait(self.jobs.submit("fail", {}, fail), timeout=5)
+        self.assertEqual((job["status"], job["error"]), (FAILED, "bad input"))
+
+    def test_cancel_running_and_queued_jobs(self):
+        started = threading.Event()
+
+        def long_job(params, is_cancelled):
+            started.set()
+            while not is_cancelled():
+                time.sleep(0.01)
+            return {}
+
+        running = self.jobs.submit("long", {}, long_job)
+        queued = self.jobs.submit("long", {}, long_job)
+        started.wait(5)
+        self.assertEqual(self.jobs.cancel(queued)["status"], CANCELLED)
+        self.jobs.cancel(running)
+        self.assertEqual(self.jobs.wait(running, timeout=5)["status"], CANCELLED)
+        self.assertEqual(self.jobs._cancelled, set())
+
+    def test_cancel_leaves_other_processes_jobs_alone(self):
+        with closing(sqlite3.connect(self.jobs.db_path)) as conn, conn:
+            conn.execute("INSERT INTO jobs (id, kind, status, owner) VALUES ('theirs', 'test', ?, '1:1')", (RUNNING,))
+        self.assertEqual(self.jobs.cancel("theirs")["status"], RUNNING)
+        self.assertEqual(self.jobs._cancelled, set())
+
+
+PATCH_SOURCE = """import os
+
+
+def helper():
+    return 1
+
+
+def load_todos(path):
+    items = []
+    for line in open(path):
+        items.append(line)
+    return items[1:]
+
+
+def other():
+    return 2
+"""
+
+PATCH_DIFF = """--- a/todos.py
++++ b/todos.py
+@@ -9,6 +9,6 @@
+ def load_todos(path):
+     items = []
+     for line in open(path):
+         items.append(line)
+-    return items[1:]
++    return items
+"""
+
+
+class PatchModeTests(TestCase):
+    def test_regions_cover_enclosing_function(self):
+        regions = find_regions(PATCH_SOURCE, "todos.py", "load todos skips first item", context=0)
+        self.assertEqual(regions, [(7, 11)])
+
+    def test_apply_hunks(self):
+        patched = apply_hunks(PATCH_SOURCE, parse_unified_diff(PATCH_DIFF))
+        self.assertIn("    return items\n", patched)
+        self.assertNotIn("items[1:]", patched)
+        self.assertIn("def other():", patched)
+
+    def test_mismatched_hunk_is_rejected(self):
+        with self.assertRaises(PatchError):
+            apply_hunks(PATCH_SOURCE.replace("items.append", "items.add"), parse_unified_diff(PATCH_DIFF))
+
+    def test_propose_fix_uses_patch_mode(self):
+        project = make_project({"todos.py": PATCH_SOURCE})
+        storage = tempfile.mkdtemp(prefix="codebot_store_")
+        self.addCleanup(shutil.rmtree, project, True)
+        self.addCleanup(shutil.rmtree, storage, True)
+        bot = CodeBot(storage_dir=storage)
+        bot.patch_mode = "always"
+        with mock.patch.object(bot, "get_groq_patch", return_value=PATCH_DIFF) as patch, \
+                mock.patch.object(bot, "get_groq_fix") as full:
+            preview = bot._propose_fix(os.path.join(project, "todos.py"), "load todos skips first item")
+        self.assertTrue(patch.called)
+        self.assertFalse(full.called)
+        self.assertNotIn("items[1:]", preview["fixed_code"])
+
+
+TS_SOURCE = """import React from 'react';
+
+export interface Todo {
+  id: number;
+}
+
+export const TodoItem = ({ todo }: { todo: Todo }) => {
+  return <li>{todo.id}</li>;
+};
+
+export function loadTodos(): Todo[] {
+  return [];
+}
+"""
+
+
+class SymbolIndexTests(TestCase):
+    def test_python_symbols_have_spans(self):
+        code = "class Store:\n    def load(self):\n        return 1\n\n\ndef helper():\n    pass\n"
+        spans = {(s["qualname"], s["kind"]): (s["start"], s["end"]) for s in python_symbols(code)}
+        self.assertEqual(spans, {
+            ("Store", "class"): (1, 3),
+            ("Store.load", "method"): (2, 3),
+            ("helper", "function"): (6, 7),
+        })
+
+    def test_script_symbols(self):
+        spans = {s["name"]: (s["kind"], s["start"], s["end"]) for s in script_symbols(TS_SOURCE)}
+        self.assertEqual(spans["Todo"], ("interface", 3, 5))
+        self.assertEqual(spans["TodoItem"], ("function", 7, 9))
+        self.assertEqual(spans["loadTodos"], ("function", 11, 13))
+
+    def test_load_project_populates_state_and_lookup(self):
+        project = make_project({"app/store.py": "class Store:\n    def load(self):\n        return 1\n",
+                                "web/TodoItem.tsx": TS_SOURCE})
+        storage = tempfile.mkdtemp(prefix="codebot_store_")
+        self.addCleanup(shutil.rmtree, project, True)
+        self.addCleanup(shutil.rmtree, storage, True)
+
+        bot = CodeBot(storage_dir=storage)
+        bot.load_project(project)
+        name = os.path.basename(project)
+        self.assertEqual(bot.state[f"{name}/app/store.py"]["functions"], ["Store.load"])
+        self.assertEqual(bot.get_symbols().lookup("loadTodos")[0]["file"], os.path.join(project, "web/TodoItem.tsx"))
+
+        # A fresh bot reads the persisted symbols and re-parses nothing
+        other = CodeBot(storage_dir=storage, project_path=project)
+        other.index = bot.index
+        with mock.patch("codebot.symbol_index.extract_symbols") as extract:
+            self.assertEqual(other.get_symbols().lookup("Store.load")[0]["start"], 2)
+        self.assertFalse(extract.called)
+
+    def test_sync_updates_names_of_changed_files_only(self):
+        project = make_project({"a.py": "def shared():\n    pass\n", "b.py": "def shared():\n    pass\n\n\ndef old():\n    pass\n"})
+        storage = tempfile.mkdtemp(prefix="codebot_store_")
+        self.addCleanup(shutil.rmtree, project, True)
+        self.addCleanup(shutil.rmtree, storage, True)
+        symbols = SymbolIndex.open(project, storage)
+        symbols.sync({"a.py": {"mtime": 1, "size": 1}, "b.py": {"mtime": 1, "size": 1}})
+
+        with open(os.path.join(project, "b.py"), "w") as f:
+            f.write("def new():\n    pass\n")
+        with mock.patch.object(symbols, "_rebuild_names") as rebuild:
+            symbols.sync({"a.py": {"mtime": 1, "size": 1}, "b.py": {"mtime": 2, "size": 2}})
+        self.assertFalse(rebuild.called)
+        self.assertEqual([loc["file"] for loc in symbols.lookup("shared")], [os.path.join(project, "a.py")])
+        self.assertEqual(symbols.lookup("old"), [])
+        self.assertEqual(symbols.lookup("new")[0]["file"], os.path.join(project, "b.py"))
+
+        symbols.sync({"b.py": {"mtime": 2, "size": 2}})
+        self.assertEqual(symbols.lookup("shared"), [])
+
+    def test_projects_sharing_storage_keep_their_own_symbols(self):
+        storage = tempfile.mkdtemp(prefix="codebot_store_")
+        self.addCleanup(shutil.rmtree, storage, True)
+        projects = []
+        for number in range(4):
+            project = make_project({f"mod{number}.py": f"def func{number}():\n    pass\n"})
+            self.addCleanup(shutil.rmtree, project, True)
+            projects.append(project)
+
+        def index(project):
+            symbols = SymbolIndex.open(project, storage)
+            symbols.sync({name: {"mtime": 1, "size": 1} for name in os.listdir(project)})
+            symbols.save()
+
+        threads = [threading.Thread(target=index, args=(project,)) for project in projects]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        for number, project in enumerate(projects):
+            self.assertEqual(SymbolIndex.open(project, storage).lookup(f"func{number}")[0]["start"], 1)
+
+
+class ProjectLoaderTests(TestCase):
+    def test_scan_skips_dependencies_and_binaries(self):
+        project = make_project({
+            "app/main.py": "print('hi')\n",
+            "README": "plain text without extension\n",
+            "node_modules/dep/index.js": "module.exports = 1;\n",
+            ".git/config": "[core]\n",
+        })
+        self.addCleanup(shutil.rmtree, project, True)
+        for name, data in (("logo.png", b"not even a png"), ("blob", b"abc\0def")):
+            with open(os.path.join(project, name), "wb") as f:
+                f.write(data)
+
+        self.assertEqual(sorted(scan_text_files(project, workers=1)), ["README", "app/main.py"])
+        self.assertEqual(sorted(scan_text_files(project, workers=2)), ["README", "app/main.py"])
+
+
+class ManifestTests(TestCase):
+    def setUp(self):
+        self.project = make_project({"app/main.py": "print('hi')\n", "web/app.ts": "export const a = 1;\n"})
+        self.storage = tempfile.mkdtemp(prefix="codebot_store_")
+        self.addCleanup(shutil.rmtree, self.project, True)
+        self.addCleanup(shutil.rmtree, self.storage, True)
+
+    def test_entries_describe_files(self):
+        manifest = ProjectManifest.open(self.project, self.storage)
+        manifest.refresh(workers=1)
+        entry = manifest.files["web/app.ts"]
+        self.assertEqual((entry["language"], entry["encoding"], entry["binary"]), ("typescript", "utf-8", False))
+        self.assertEqual(len(entry["sha1"]), 40)
+
+    def test_warm_reload_only_processes_changes(self):
+        bot = CodeBot(storage_dir=self.storage)
+        bot.load_project(self.project)
+
+        path = os.path.join(self.project, "app/main.py")
+        st = os.stat(path)
+        os.utime(path, (st.st_atime, st.st_mtime + 10))  # touched, same content
+
+        warm = CodeBot(storage_dir=self.storage)
+        with mock.patch("codebot.manifest.describe_file", wraps=describe_file) as describe, \
+                mock.patch("codebot.file_index.tokenize") as retokenize:
+            warm.load_project(self.project)
+        self.assertEqual(describe.call_count, 1)
+        self.assertFalse(retokenize.called)
+        self.assertEqual(warm.manifest.store.rows_written, 1)
+
+    def test_large_and_latin1_files(self):
+        with open(os.path.join(self.project, "app/big.py"), "w") as f:
+            f.write("x = 1\n" * 40000)
+        with open(os.path.join(self.project, "app/old.py"), "wb") as f:
+            f.write(b"# caf\xe9\n" * 15000)  # spans two hash chunks
+        manifest = ProjectManifest.open(self.project, self.storage)
+        with mock.patch("codebot.manifest.MAX_INDEX_FILE_BYTES", 150000):
+            manifest.refresh(workers=1)
+        big = manifest.files["app/big.py"]
+        self.assertEqual((big["sha1"], big["skipped"]), (None, True))
+        old = manifest.files["app/old.py"]
+        self.assertEqual(old["encoding"], "latin-1")
+        with open(os.path.join(self.project, "app/old.py"), "rb") as f:
+            self.assertEqual(old["sha1"], hashlib.sha1(f.read()).hexdigest())
+
+
+class WatcherTests(TestCase):
+    def setUp(self):
+        self.project = make_project({"app/main.py": "def main():\n    pass\n"})
+        self.storage = tempfile.mkdtemp(prefix="codebot_store_")
+        self.addCleanup(shutil.rmtree, self.project, True)
+        self.addCleanup(shutil.rmtree, self.storage, True)
+
+    def wait_for_changes(self, watcher, expected):
+        seen = set()
+        deadline = time.time() + 5
+        while time.time() < deadline and not expected <= seen:
+            seen.update(watcher.drain_changes())
+            time.sleep(0.05)
+        return seen
+
+    def check_backend(self, use_inotify):
+        watcher = ProjectWatcher(self.project, interval=0.1, use_inotify=use_inotify).start()
+        self.addCleanup(watcher.stop)
+        self.assertEqual(watcher.files(), ["app/main.py"])
+
+        os.makedirs(os.path.join(self.project, "lib"))
+        with open(os.path.join(self.project, "lib/util.py"), "w") as f:
+            f.write("def util():\n    return 1\n")
+        os.remove(os.path.join(self.project, "app/main.py"))
+
+        seen = self.wait_for_changes(watcher, {"lib/util.py", "app/main.py"})
+        self.assertTrue({"lib/util.py", "app/main.py"} <= seen)
+        self.assertEqual(watcher.files(), ["lib/util.py"])
+
+    def test_polling_backend_reports_changes(self):
+        self.check_backend(use_inotify=False)
+
+    def test_inotify_backend_reports_changes(self):
+        self.check_backend(use_inotify=True)
+
+    def test_refresh_applies_watcher_changes_without_walking(self):
+        watcher = ProjectWatcher(self.project, interval=0.1).start()
+        self.addCleanup(watcher.stop)
+        bot = CodeBot(storage_dir=self.storage, project_path=self.project)
+        bot.watcher = watcher
+        bot.refresh_project()  # first refresh walks the tree once
+        self.assertFalse(watcher.needs_full_scan)
+
+        with open(os.path.join(self.project, "app/todo.py"), "w") as f:
+            f.write("def load_todo():\n    return None\n")
+        deadline = time.time() + 5
+        while time.time() < deadline and not watcher.pending_count():
+            time.sleep(0.05)
+
+        with mock.patch("codebot.manifest.iter_project_files") as walk:
+            changed, removed = bot.refresh_project()
+        self.assertFalse(walk.called)
+        self.assertEqual((changed, removed), (["app/todo.py"], []))
+        self.assertTrue(bot.symbols.lookup("load_todo"))
+        self.assertIsNotNone(watcher.last_indexed)
+
+    def test_read_does_not_cache_text_changed_while_reading(self):
+        watcher = ProjectWatcher(self.project, use_inotify=False)
+        real_open = open
+
+        def open_then_change(path, *args, **kwargs):
+            f = real_open(path, *args, **kwargs)
+            watcher._record("app/main.py")  # change event lands between the read and the insert
+            return f
+
+        with mock.patch("codebot.watcher.open", open_then_change, create=True):
+            watcher.read("app/main.py")
+        self.assertNotIn("app/main.py", watcher._contents)
+
+    def test_write_file_invalidates_cached_text(self):
+        watcher = get_watcher(self.project, start=True)
+        self.addCleanup(stop_watcher, self.project)
+        path = os.path.join(self.project, "app/main.py")
+        self.assertEqual(watcher.read("app/main.py"), "def main():\n    pass\n")
+        write_file(path, "def main():\n    return 1\n")
+        self.assertEqual(watcher.read("app/main.py"), "def main():\n    return 1\n")
+
+
+class FolderTreeTests(TestCase):
+    def setUp(self):
+        self.project = make_project({
+            "README.md": "# demo\n",
+            "src/app.py": "print('hi')\n",
+            "src/lib/util.py": "def util():\n    pass\n",
+            "src/lib/deep/more.py": "x = 1\n",
+            "node_modules/dep/index.js": "module.exports = 1;\n",
+        })
+        os.makedirs(os.path.join(self.project, "empty"))
+        self.addCleanup(shutil.rmtree, self.project, True)
+
+    def test_depth_is_honored(self):
+        expected = {"README.md": "README.md", "src": {"app.py": "app.py", "lib": {}}}
+        self.assertEqual(build_tree(self.project, 2), expected)
+        files = ["README.md", "src/app.py", "src/lib/util.py", "src/lib/deep/more.py"]
+        self.assertEqual(tree_from_files(files, 2), expected)
+        self.assertEqual(build_tree(self.project, 1), {"README.md": "README.md", "src": {}})
+
+    def test_listing_cached_until_directory_changes(self):
+        list_directory(self.project)
+        with mock.patch("codebot.folder_tree.os.scandir", wraps=os.scandir) as scandir:
+            list_directory(self.project)
+            self.assertFalse(scandir.called)
+            time.sleep(0.01)
+            with open(os.path.join(self.project, "NEW.md"), "w") as f:
+                f.write("new\n")
+            names = [entry["name"] for entry in list_directory(self.project)]
+            self.assertEqual(scandir.call_count, 1)
+        self.assertIn("NEW.md", names)
+
+    def test_tree_endpoint_expands_one_level(self):
+        get_registry().get(self.project)
+        self.addCleanup(get_registry().remove, self.project)
+        response = self.client.get("/api/tree/", {"project_path": self.project, "path": "src"})
+        self.assertEqual(response.status_code, 200)
+        entries = response.json()["entries"]
+        self.assertEqual(entries[0], {"name": "lib", "type": "dir", "children": 2, "path": "src/lib"})
+        self.assertEqual(entries[1]["path"], "src/app.py")
+
+        outside = self.client.get("/api/tree/", {"project_path": self.project, "path": "../"})
+        self.assertEqual(outside.status_code, 400)
+        os.symlink("/", os.path.join(self.project, "src/escape"))
+        outside = self.client.get("/api/tree/", {"project_path": self.project, "path": "src/escape/etc"})
+        self.assertEqual(outside.status_code, 400)
+
+    def test_tree_endpoint_rejects_unloaded_roots(self):
+        for root in ("/", self.project):
+            response = self.client.get("/api/tree/", {"project_path": root, "path": "etc"})
+            self.assertEqual(response.status_code, 403)
+
+
+class FakeBot:
+    def __init__(self, project_path, size=0):
+        self.project_path = project_path
+        self.size = size
+
+    def approx_memory_bytes(self):
+        return self.size
+
+
+class ProjectRegistryTests(TestCase):
+    def test_concurrent_first_use_shares_one_bot(self):
+        created = []
+
+        def factory(project_path):
+            time.sleep(0.05)
+            created.append(project_path)
+            return FakeBot(project_path)
+
+        registry = ProjectRegistry(factory=factory)
+        bots = []
+        threads = [threading.Thread(target=lambda: bots.append(registry.get("/tmp/project_a"))) for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(created, ["/tmp/project_a"])
+        self.assertTrue(all(bot is bots[0] for bot in bots))
+        self.assertIs(registry.find_for_file("/tmp/project_a/app/main.py"), bots[0])
+
+    def test_least_recently_used_evicted(self):
+        registry = ProjectRegistry(max_projects=2, factory=FakeBot)
+        registry.get("/tmp/a")
+        registry.get("/tmp/b")
+        registry.get("/tmp/a")
+        registry.get("/tmp/c")
+        self.assertEqual(registry.projects(), ["/tmp/a", "/tmp/c"])
+
+    def test_memory_cap_keeps_most_recent(self):
+        registry = ProjectRegistry(max_memory_bytes=100, factory=lambda path: FakeBot(path, size=80))
+        registry.get("/tmp/a")
+        registry.get("/tmp/b")
+        self.assertEqual(registry.projects(), ["/tmp/b"])
+
+
+FAKE_TYPESCRIPT = """
+module.exports = {
+  JsxEmit: { Preserve: 1 },
+  flattenDiagnosticMessageText: (text) => text,
+  transpileModule: (text, options) => ({
+    diagnostics: text.includes('<<<') ? [{ code: 1109, messageText: 'Expression expected.' }] : [],
+  }),
+};
+"""
+
+
+class VerificationTests(TestCase):
+    def test_python_and_json_checked_in_memory(self):
+        results = verify_sources([
+            ("app/ok.py", "def ok():\n    return 1\n"),
+            ("app/bad.py", "def bad(:\n    pass\n"),
+            ("data.json", '{"a": }'),
+            ("README.md", "# docs\n"),
+        ])
+        self.assertEqual(results[0], (True, ""))
+        self.assertFalse(results[1][0])
+        self.assertIn("app/bad.py:1", results[1][1])
+        self.assertFalse(results[2][0])
+        self.assertEqual(results[3], (None, ""))
+
+    @skipUnless(shutil.which("node"), "node is not installed")
+    def test_typescript_checker_stays_warm_between_batches(self):
+        project = make_project({
+            "node_modules/typescript/index.js": FAKE_TYPESCRIPT,
+            "src/App.tsx": "",
+        })
+        self.addCleanup(shutil.rmtree, project, True)
+        checker = TypeScriptChecker(timeout=10)
+        self.addCleanup(checker.close)
+        app = os.path.join(project, "src/App.tsx")
+
+        first = checker.check([(app, "export const a = 1;\n"), (app, "const b = <<<;\n")])
+        pid = checker._proc.pid
+        second = checker.check([(app, "export const c = 2;\n")])
+
+        self.assertEqual(first[0], (True, ""))
+        self.assertEqual(first[1], (False, "error TS1109: Expression expected."))
+        self.assertEqual(second, [(True, "")])
+        self.assertEqual(checker._proc.pid, pid)
+        # Files without a resolvable typescript module are reported as unchecked
+        self.assertEqual(checker.check([("/nonexistent/x.ts", "x")])[0][0], None)
+
+
+    def test_typescript_without_a_compiler_is_unchecked(self):
+        with mock.patch("codebot.frontend_utils.get_ts_checker", return_value=None), \
+                mock.patch("codebot.frontend_utils.shutil.which", return_value=None):
+            self.assertEqual(verify_sources([("/tmp/app.ts", "const x: number = 1;\n")])[0][0], None)
+
+        failed_npx = subprocess.CompletedProcess([], 1, "", "npm error code ENOTFOUND registry.npmjs.org/tsc")
+        with mock.patch("codebot.frontend_utils.get_ts_checker", return_value=None), \
+                mock.patch("codebot.frontend_utils.shutil.which", return_value="/usr/bin/npx"), \
+                mock.patch("codebot.frontend_utils.subprocess.run", return_value=failed_npx) as run:
+            self.assertEqual(verify_sources([("/tmp/app.ts", "const x: number = 1;\n")])[0][0], None)
+        self.assertEqual(run.call_args[0][0][:3], ["/usr/bin/npx", "--no-install", "tsc"])
+
+    def test_local_tsc_fails_only_on_syntax_errors(self):
+        project = make_project({
+            # Reports every file of a run, with its path relative to the working folder as tsc does
+            "node_modules/.bin/tsc": "#!/bin/sh\necho run >> \"$(dirname \"$0\")/runs\"\nshift\n"
+                                     "for f in \"$@\"; do rel=$(realpath --relative-to=. \"$f\")\n"
+                                     "if grep -q '<<<' \"$f\"; then echo \"$rel(1,11): error TS1109: Expression expected.\"\n"
+                                     "else echo \"$rel(1,1): error TS2307: Cannot find module './api'.\"; fi; done; exit 2\n",
+            "src/app.ts": "",
+        })
+        self.addCleanup(shutil.rmtree, project, True)
+        os.chmod(os.path.join(project, "node_modules/.bin/tsc"), 0o755)
+        app = os.path.join(project, "src/app.ts")
+        with mock.patch("codebot.frontend_utils.get_ts_checker", return_value=None):
+            results = verify_sources([(app, "import { a } from './api';\n"), (app, "const b = <<<;\n")])
+        self.assertEqual(results[0], (True, ""))
+        self.assertEqual(results[1], (False, f"{app}(1,11): error TS1109: Expression expected."))
+        self.assertEqual(read_file(os.path.join(project, "node_modules/.bin/runs")), "run\n")  # one tsc for the batch
+
+
+class ApplyFixesTests(TestCase):
+    def setUp(self):
+        self.project = make_project({"a.py": "A = 1\n", "b.json": '{"b": 1}\n'})
+        self.addCleanup(shutil.rmtree, self.project, True)
+        self.bot = CodeBot(storage_dir=tempfile.mkdtemp(prefix="codebot_store_"))
+        self.addCleanup(shutil.rmtree, self.bot.storage_dir, True)
+        self.a = os.path.join(self.project, "a.py")
+        self.b = os.path.join(self.project, "b.json")
+
+    def read(self, path):
+        with open(path, encoding="utf-8") as f:
+            return f.read()
+
+    def test_write_file_is_atomic_and_keeps_mode(self):
+        os.chmod(self.a, 0o640)
+        write_file(self.a, "A = 2\n")
+        self.assertEqual(self.read(self.a), "A = 2\n")
+        self.assertEqual(os.stat(self.a).st_mode & 0o777, 0o640)
+        self.assertEqual(sorted(os.listdir(self.project)), ["a.py", "b.json"])
+
+    def test_batch_is_verified_before_any_write(self):
+        result = self.bot.apply_fixes([
+            {"file_path": self.a, "fixed_code": "A = 2\n"},
+            {"file_path": self.b, "fixed_code": '{"b": }'},
+        ], "bump", commit=False)
+        self.assertEqual(result["status"], "failed")
+        self.assertEqual(self.read(self.a), "A = 1\n")
+
+    def test_failed_write_rolls_back_batch(self):
+        new_file = os.path.join(self.project, "new.py")
+        real_write = write_file
+
+        def failing_write(path, content):
+            if path == self.b:
+                raise OSError("disk full")
+            real_write(path, content)
+
+        with mock.patch("codebot.bot_core.write_file", side_effect=failing_write):
+            result = self.bot.apply_fixes([
+                {"file_path": self.a, "fixed_code": "A = 2\n"},
+                {"file_path": new_file, "fixed_code": "B = 1\n"},
+                {"file_path": self.b, "fixed_code": '{"b": 2}\n'},
+            ], "bump", commit=False)
+
+        self.assertEqual(result["status"], "failed")
+        self.assertEqual(self.read(self.a), "A = 1\n")
+        self.assertFalse(os.path.exists(new_file))
+
+    def test_successful_batch_commits_once(self):
+        with mock.patch.object(self.bot, "commit_changes") as commit:
+            result = self.bot.apply_fixes([
+                {"file_path": self.a, "fixed_code": "A = 2\n"},
+                {"file_path": self.b, "fixed_code": '{"b": 2}\n'},
+            ], "bump")
+        self.assertEqual(result["status"], "success")
+        commit.assert_called_once_with([self.a, self.b], "bump")
+        self.assertEqual(self.read(self.b), '{"b": 2}\n')
+
+    def test_endpoint_rejects_malformed_fixes(self):
+        bodies = (
+            ["x"],
+            {"fixes": ["x"], "prompt": "yes"},
+            {"fixes": "x", "prompt": "yes"},
+            {"fixes": [{"file_path": self.a, "fixed_code": 1}], "prompt": "yes"},
+        )
+        for body in bodies:
+            response = self.client.post("/api/apply_fixes/", json.dumps(body), content_type="application/json")
+            self.assertEqual(response.status_code, 400, body)
+        self.assertEqual(self.read(self.a), "A = 1\n")
+
+
+class CommitChangesTests(TestCase):
+    def setUp(self):
+        self.project = make_project({"a.py": "A = 1\n", "notes.txt": "scratch\n"})
+        self.addCleanup(shutil.rmtree, self.project, True)
+        self.repo = Repo.init(self.project)
+        with self.repo.config_writer() as config:
+            config.set_value("user", "name", "test")
+            config.set_value("user", "email", "test@example.com")
+        self.bot = CodeBot(storage_dir=tempfile.mkdtemp(prefix="codebot_store_"))
+        self.addCleanup(shutil.rmtree, self.bot.storage_dir, True)
+        self.a = os.path.join(self.project, "a.py")
+
+    def test_only_given_paths_are_staged(self):
+        outcome = self.bot.commit_changes(self.a, "fix")
+        self.assertIsNotNone(outcome["commit"])
+        self.assertEqual(self.repo.active_branch.name, "main")
+        self.assertEqual([item.path for item in self.repo.head.commit.tree.traverse()], ["a.py"])
+        self.assertEqual(self.bot.commit_changes(self.a, "again")["commit"], None)
+
+    def test_remote_set_up_once_and_push_queued(self):
+        self.bot.github_token, self.bot.github_user = "token", "someone"
+        with mock.patch("codebot.bot_core.create_github_repo", return_value=True) as create, \
+                mock.patch("codebot.bot_core.push_in_background", return_value="job") as push:
+            self.bot.commit_changes(self.a, "fix")
+            write_file(self.a, "A = 2\n")
+            outcome = self.bot.commit_changes(self.a, "fix again")
+        self.assertEqual(create.call_count, 1)
+        self.assertEqual(push.call_count, 2)
+        self.assertEqual(outcome["push_job"], "job")
+        self.assertIn("someone", self.repo.remote("origin").url)
+
+    def test_push_retries_then_succeeds(self):
+        remote = tempfile.mkdtemp(prefix="codebot_remote_")
+        self.addCleanup(shutil.rmtree, remote, True)
+        Repo.init(remote, bare=True)
+        self.bot.commit_changes(self.a, "fix")
+        self.repo.create_remote("origin", "/nonexistent/remote.git")
+        sleeps = []
+
+        def fix_remote(delay):
+            sleeps.append(delay)
+            self.repo.remote("origin").set_url(remote)
+
+        result = push_with_retry(self.project, retries=2, backoff=0.01, sleep=fix_remote)
+        self.assertEqual(result, {"pushed": True, "attempts": 2})
+        self.assertEqual(len(sleeps), 1)
+        self.assertEqual(Repo(remote).commit("main").hexsha, self.repo.head.commit.hexsha)
+
+
+class ContextBuilderTests(TestCase):
+    def test_pack_regions_stays_within_budget(self):
+        functions = [f"def helper_{i}(value):\n" + "    value = value + 1\n" * 20 + "    return value\n" for i in range(40)]
+        functions[25] = "def load_todos(items):\n    # todos loader\n    return items[1:]\n"
+        code = "\n".join(functions)
+        regions = pack_regions(code, "todos.py", "load todos skips the first item", budget_tokens=120)
+        lines = code.splitlines()
+        excerpt = "\n".join(number_lines(lines, start, end) for start, end in regions)
+        self.assertLessEqual(estimate_tokens(excerpt), 120)
+        self.assertIn("def load_todos(items):", excerpt)
+
+    def test_imported_project_files_are_resolved(self):
+        project = make_project({
+            "app/main.py": "from .models import Todo\nimport app.utils\nimport os\n",
+            "app/models.py": "class Todo:\n    pass\n",
+            "app/utils.py": "def util():\n    pass\n",
+            "web/App.tsx": "import { api } from './api';\nimport React from 'react';\n",
+            "web/api.ts": "export function api() {}\n",
+        })
+        self.addCleanup(shutil.rmtree, project, True)
+        main = os.path.join(project, "app/main.py")
+        with open(main) as f:
+            found = imported_files(f.read(), main, project)
+        self.assertEqual([os.path.relpath(path, project) for path in found], ["app/models.py", "app/utils.py"])
+        app = os.path.join(project, "web/App.tsx")
+        with open(app) as f:
+            self.assertEqual(imported_files(f.read(), app, project), [os.path.join(project, "web/api.ts")])
+
+    def test_token_usage_recorded_per_request(self):
+        storage = tempfile.mkdtemp(prefix="codebot_store_")
+        self.addCleanup(shutil.rmtree, storage, True)
+        bot = CodeBot(storage_dir=storage)
+        bot.llm_cache = None
+        bot.usage = UsageLog()
+        reply = mock.Mock()
+        reply.json.return_value = {
+            "candidates": [{"content": {"parts": [{"text": "fixed"}]}}],
+            "usageMetadata": {"promptTokenCount": 120, "candidatesTokenCount": 7},
+        }
+        with mock.patch.object(bot.http, "post", return_value=reply):
+            bot.get_groq_fix("code", "a.py", "bug")
+        record = bot.usage.summary()["recent"][0]
+        self.assertEqual((record["kind"], record["file"], record["prompt_tokens"], record["output_tokens"]),
+                         ("fix", "a.py", 120, 7))
+        self.assertEqual(bot.usage.summary()["totals"]["requests"], 1)
+
+
+class FixSessionTests(TestCase):
+    def setUp(self):
+        storage = tempfile.mkdtemp(prefix="codebot_store_")
+        self.addCleanup(shutil.rmtree, storage, True)
+        db_path = os.path.join(storage, "jobs.sqlite3")
+        self.sessions = FixSessions(JobQueue(db_path, workers=1), db_path)
+        self.bot = mock.Mock()
+        self.bot.smart_fix_bug.return_value = {"bug_type": "logic", "files": [
+            {"file": "/p/b.py", "score": 0.4, "proposal": {"file": "/p/b.py", "fixed_code": "B = 2\n"}},
+            {"file": "/p/c.py", "score": 0.2, "proposal": {"message": "No changes needed"}},
+            {"file": "/p/a.py", "score": 1.0, "proposal": {"file": "/p/a.py", "fixed_code": "A = 2\n"}},
+        ]}
+        self.bot.apply_fixes.return_value = {"status": "success", "results": []}
+        patcher = mock.patch("codebot.sessions.get_bot", return_value=self.bot)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_proposals_computed_once_and_applied_once(self):
+        session_id = self.sessions.create("/p", "values are off by one")
+        session = self.sessions.get(session_id, wait=5)
+        self.assertEqual(session["status"], SUCCEEDED)
+        self.assertEqual([p["file"] for p in session["previews"]], ["/p/a.py", "/p/b.py"])
+        self.assertEqual(session["skipped"], [{"file": "/p/c.py", "message": "No changes needed"}])
+
+        result = self.sessions.apply(session_id)
+        self.assertEqual(result["session_id"], session_id)
+        self.bot.apply_fixes.assert_called_once_with(
+            [
+                {"file_path": "/p/a.py", "fixed_code": "A = 2\n", "original_sha1": None},
+                {"file_path": "/p/b.py", "fixed_code": "B = 2\n", "original_sha1": None},
+            ],
+            "values are off by one",
+        )
+        with self.assertRaises(SessionError) as raised:
+            self.sessions.apply(session_id)
+        self.assertEqual(raised.exception.status, 409)
+        self.assertTrue(self.sessions.get(session_id)["applied"])
+        self.assertEqual(self.bot.smart_fix_bug.call_count, 1)
+
+    def test_wait_returns_running_session_when_job_outlives_it(self):
+        release = threading.Event()
+        self.bot.smart_fix_bug.side_effect = lambda *args, **kwargs: release.wait(5) and {"files": []}
+        session_id = self.sessions.create("/p", "slow bug")
+        self.addCleanup(release.set)
+        session = self.sessions.get(session_id, wait=0.2)
+        self.assertIn(session["status"], ("queued", "running"))
+        with mock.patch("codebot.views.get_sessions", return_value=self.sessions):
+            response = self.client.get(f"/api/sessions/{session_id}/?wait=0.2")
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(response.json()["status"], ("queued", "running"))
+        release.set()
+        self.assertEqual(self.sessions.get(session_id, wait=5)["status"], SUCCEEDED)
+
+    def test_batch_session_uses_smart_fix_bugs(self):
+        self.bot.smart_fix_bugs.return_value = {
+            "bugs": [{"description": "one", "bug_type": "logic", "files": ["/p/a.py"]}],
+            "files": [{"file": "/p/a.py", "score": 1.0, "bugs": [0, 1], "proposal": {"file": "/p/a.py", "fixed_code": "A = 3\n"}}],
+        }
+        session_id = self.sessions.create("/p", ["one", "two"])
+        session = self.sessions.get(session_id, wait=5)
+        self.bot.smart_fix_bugs.assert_called_once_with(["one", "two"], should_stop=mock.ANY)
+        self.assertEqual(session["bug_description"], "one; two")
+        self.assertEqual(session["bugs"][0]["files"], ["/p/a.py"])
+        self.assertEqual([p["file"] for p in session["previews"]], ["/p/a.py"])
+
+    def test_failed_apply_can_be_retried(self):
+        session_id = self.sessions.create("/p", "bug")
+        self.sessions.get(session_id, wait=5)
+        self.bot.apply_fixes.return_value = {"status": "failed", "error": "Verification failed"}
+        self.assertEqual(self.sessions.apply(session_id)["status"], "failed")
+        self.assertFalse(self.sessions.get(session_id)["applied"])
+
+    def test_apply_refuses_files_changed_since_the_preview(self):
+        project = make_project({"a.py": "A = 1\n"})
+        storage = tempfile.mkdtemp(prefix="codebot_store_")
+        self.addCleanup(shutil.rmtree, project, True)
+        self.addCleanup(shutil.rmtree, storage, True)
+        bot = CodeBot(storage_dir=storage, project_path=project)
+        path = os.path.join(project, "a.py")
+        with mock.patch.object(bot, "get_groq_fix", return_value="A = 2\n"):
+            proposal = bot._propose_fix(path, "A should be 2")
+        self.bot.smart_fix_bug.return_value = {"files": [{"file": path, "score": 1.0, "proposal": proposal}]}
+        self.bot.apply_fixes.side_effect = lambda fixes, message: bot.apply_fixes(fixes, message, commit=False)
+        session_id = self.sessions.create(project, "A should be 2")
+        self.sessions.get(session_id, wait=5)
+
+        write_file(path, "A = 1  # edited by hand\n")
+        with mock.patch("codebot.views.get_sessions", return_value=self.sessions):
+            response = self.client.post(f"/api/sessions/{session_id}/apply/", json.dumps({"prompt": "yes"}),
+                                        content_type="application/json")
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual((response.json()["status"], response.json()["files"]), ("stale", [path]))
+        self.assertEqual(read_file(path), "A = 1  # edited by hand\n")
+        self.assertFalse(self.sessions.get(session_id)["applied"])
+
+
+class TracingTests(TestCase):
+    def test_summary_quantiles_and_prometheus_text(self):
+        registry = Metrics()
+        for ms in range(1, 101):
+            registry.observe("codebot_stage_seconds", ms / 1000, stage="llm")
+        text = registry.render()
+        self.assertIn("# TYPE codebot_stage_seconds summary", text)
+        self.assertIn('codebot_stage_seconds{stage="llm",quantile="0.5"} 0.051000', text)
+        self.assertIn('codebot_stage_seconds{stage="llm",quantile="0.99"} 0.100000', text)
+        self.assertIn('codebot_stage_seconds_count{stage="llm"} 100', text)
+
+    @mock.patch.dict(os.environ, {"CODEBOT_SERVER_TIMING": "0"})
+    def test_server_timing_header_and_metrics_endpoint(self):
+        response = self.client.get("/api/usage/", HTTP_X_CODEBOT_TIMING="1")
+        self.assertIn("total;dur=", response["Server-Timing"])
+        self.assertNotIn("Server-Timing", self.client.get("/api/usage/"))
+
+        with span("diff"):
+            pass
+        response = self.client.get("/api/metrics/")
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response["Content-Type"].startswith("text/plain; version=0.0.4"))
+        body = response.content.decode()
+        self.assertIn('codebot_request_seconds_count{endpoint="llm_usage",method="GET"}', body)
+        self.assertIn('codebot_stage_seconds_count{stage="diff"}', body)
+        self.assertIn("codebot_llm_tokens_total", body)
+
+    def test_usage_rejects_bad_recent(self):
+        self.assertEqual(self.client.get("/api/usage/?recent=abc").status_code, 400)
+        self.assertEqual(self.client.get("/api/usage/?recent=-1").status_code, 400)
+        self.assertEqual(self.client.get("/api/usage/?recent=5").status_code, 200)
+
+
+class PipelineBenchmarkTests(TestCase):
+    def test_pipeline_smoke(self):
+        report = bench_pipeline(60, llm_latency=0, verify=False)
+        self.assertEqual(report["proposals"], 3)
+        self.assertTrue(report["committed"])
+        for stage in ("load_project", "find_relevant_files", "folder_tree", "propose_fixes", "commit_changes"):
+            self.assertIn("wall_s", report["stages"][stage])
+            self.assertGreater(report["stages"][stage]["peak_rss_mb"], 0)
+        self.assertGreater(report["stages"]["load_project"]["file_opens"], 60)
+
+
+class DiffingTests(TestCase):
+    def test_difflib_backend_matches_unified_diff(self):
+        import difflib
+        old = ["a", "b", "c", "d", "e", "f", "g", "h", "i", "j"]
+        new = ["a", "B", "c", "d", "e", "f", "g", "h", "j", "k"]
+        for context in (0, 1, 3):
+            expected = "\n".join(difflib.unified_diff(old, new, lineterm="", n=context))
+            self.assertEqual(unified_diff(diff_lines(old, new, context, backend="difflib")), expected)
+
+    def test_fast_hunks_apply_back_to_the_new_text(self):
+        old = "".join(f"line {i}\n" for i in range(200)) + "}\n" * 50
+        new = old.replace("line 10\n", "line 10 fixed\n").replace("line 150\n", "") + "x\n"
+        hunks = diff_texts(old, new)
+        self.assertEqual([h["header"] for h in hunks][:2], ["@@ -8,7 +8,7 @@", "@@ -148,7 +148,6 @@"])
+        self.assertEqual(apply_hunks(old, parse_unified_diff(unified_diff(hunks))), new)
 
-# Create your tests here.
+    def test_changes_without_a_space_after_the_marker_are_kept(self):
+        hunks = diff_texts("x = 1\nprint(x)\n", "x = 2\nprint(x)\n")
+        self.assertEqual(changed_lines(hunks), ["-x = 1", "+x = 2"])
+        self.assertEqual(diff_texts("same\n", "same\n"), [])
@@ -0,0 +1,176 @@
+import os
+import time
+import threading
+import functools
+import contextvars
+from collections import deque
+from contextlib import contextmanager
+from typing import Dict, Optional, Tuple
+
+QUANTILES = (0.5, 0.95, 0.99)
+WINDOW = 1024  # recent samples kept per series for quantiles
+
+_current_trace = contextvars.ContextVar("codebot_trace", default=None)
+
+
+class Histogram:
+    """
+    Latency series: exact count and sum, and quantiles over the last WINDOW samples.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.sum = 0.0
+        self.samples = deque(maxlen=WINDOW)
+        self._lock = threading.Lock()
+
+    def observe(self, seconds: float) -> None:
+        with self._lock:
+            self.count += 1
+            self.sum += seconds
+            self.samples.append(seconds)
+
+    def snapshot(self) -> Tuple[int, float, Dict[float, float]]:
+        with self._lock:
+            ordered = sorted(self.samples)
+            count, total = self.count, self.sum
+        quantiles = {}
+        if ordered:
+            for q in QUANTILES:
+                quantiles[q] = ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+        return count, total, quantiles
+
+
+class Metrics:
+    """
+    Named latency summaries keyed by label values, rendered in the
+    Prometheus text exposition format.
+    """
+
+    def __init__(self):
+        self.series: Dict[Tuple[str, Tuple[Tuple[str, str], ...]], Histogram] = {}
+        self.help: Dict[str, str] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, metric: str, seconds: float, **labels) -> None:
+        key = (metric, tuple(sorted(labels.items())))
+        histogram = self.series.get(key)
+        if histogram is None:
+            with self._lock:
+                histogram = self.series.setdefault(key, Histogram())
+        histogram.observe(seconds)
+
+    def render(self) -> str:
+        lines = []
+        with self._lock:
+            items = sorted(self.series.items())
+        seen = set()
+        for (metric, labels), histogram in items:
+            if metric not in seen:
+                seen.add(metric)
+                if metric in self.help:
+                    lines.append(f"# HELP {metric} {self.help[metric]}")
+                lines.append(f"# TYPE {metric} summary")
+            count, total, quantiles = histogram.snapshot()
+            for q, value in quantiles.items():
+                lines.append(f"{metric}{_labels(labels + (('quantile', str(q)),))} {value:.6f}")
+            lines.append(f"{metric}_sum{_labels(labels)} {total:.6f}")
+            lines.append(f"{metric}_count{_labels(labels)} {count}")
+        return "\n".join(lines) + "\n"
+
+
+def _labels(labels) -> str:
+    if not labels:
+        return ""
+    def escape(value):
+        return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+    return "{" + ",".join(f'{name}="{escape(value)}"' for name, value in labels) + "}"
+
+
+metrics = Metrics()
+metrics.help["codebot_stage_seconds"] = "Time spent in each codebot pipeline stage."
+metrics.help["codebot_request_seconds"] = "Time to produce a response, per endpoint."
+
+
+class Trace:
+    """
+    Stage timings collected while serving one request, summed per stage.
+    Spans from worker threads started with a copied context land here too.
+    """
+
+    def __init__(self):
+        self.stages: Dict[str, Tuple[float, int]] = {}
+        self._lock = threading.Lock()
+
+    def add(self, name: str, seconds: float) -> None:
+        with self._lock:
+            total, count = self.stages.get(name, (0.0, 0))
+            self.stages[name] = (total + seconds, count + 1)
+
+    def server_timing(self) -> str:
+        with self._lock:
+            stages = sorted(self.stages.items())
+        return ", ".join(f"{name};dur={total * 1000:.1f}" for name, (total, _) in stages)
+
+
+@contextmanager
+def span(name: str):
+    """
+    Time a pipeline stage: recorded in codebot_stage_seconds{stage=name}
+    and in the current request's trace, if any.
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        metrics.observe("codebot_stage_seconds", elapsed, stage=name)
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.add(name, elapsed)
+
+
+def traced(name: str):
+    """Decorator form of span()."""
+    def decorate(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def current_trace() -> Optional[Trace]:
+    return _current_trace.get()
+
+
+class TracingMiddleware:
+    """
+    Times every request into codebot_request_seconds{endpoint, method}.
+    The stage breakdown is returned in a Server-Timing header when
+    CODEBOT_SERVER_TIMING=1 or the request sends "X-Codebot-Timing: 1".
+    For streaming responses the time is up to the first byte.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.always_time = os.getenv("CODEBOT_SERVER_TIMING", "0") == "1"
+
+    def __call__(self, request):
+        trace = Trace()
+        token = _current_trace.set(trace)
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _current_trace.reset(token)
+        elapsed = time.perf_counter() - start
+
+        match = getattr(request, "resolver_match", None)
+        endpoint = match.url_name if match is not None and match.url_name else "unmatched"
+        metrics.observe("codebot_request_seconds", elapsed, endpoint=endpoint, method=request.method)
+        if self.always_time or request.headers.get("X-Codebot-Timing") == "1":
+            trace.add("total", elapsed)
+            response["Server-Timing"] = trace.server_timing()
+        return response
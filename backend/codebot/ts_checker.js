@@ -0,0 +1,62 @@
+// Long-lived TypeScript/JavaScript syntax checker used by codebot.frontend_utils.
+//
+// Reads one JSON request per line on stdin:
+//   {"id": 1, "files": [{"path": "src/App.tsx", "text": "..."}]}
+// and writes one JSON line per request on stdout:
+//   {"id": 1, "results": [{"path": "src/App.tsx", "ok": true, "errors": []}]}
+//
+// "ok" is null when no typescript module can be resolved for a file, so the
+// caller can fall back to tsc. The typescript module is resolved from the
+// checked file's folder upwards (like npx would) and cached per install.
+const path = require('path');
+const readline = require('readline');
+
+const compilers = new Map();
+
+function loadTypeScript(filePath) {
+  const resolved = require.resolve('typescript', { paths: [path.dirname(filePath), process.cwd()] });
+  if (!compilers.has(resolved)) {
+    compilers.set(resolved, require(resolved));
+  }
+  return compilers.get(resolved);
+}
+
+function check(file) {
+  let ts;
+  try {
+    ts = loadTypeScript(file.path);
+  } catch (e) {
+    return { path: file.path, ok: null, errors: ['typescript module not found'] };
+  }
+  const output = ts.transpileModule(file.text, {
+    fileName: file.path,
+    reportDiagnostics: true,
+    compilerOptions: { jsx: ts.JsxEmit ? ts.JsxEmit.Preserve : 1, isolatedModules: true },
+  });
+  const errors = (output.diagnostics || []).map((d) => {
+    const message = ts.flattenDiagnosticMessageText(d.messageText, '\n');
+    if (d.file && d.start !== undefined) {
+      const { line, character } = d.file.getLineAndCharacterOfPosition(d.start);
+      return `${file.path}(${line + 1},${character + 1}): error TS${d.code}: ${message}`;
+    }
+    return `error TS${d.code}: ${message}`;
+  });
+  return { path: file.path, ok: errors.length === 0, errors };
+}
+
+readline.createInterface({ input: process.stdin }).on('line', (line) => {
+  let request;
+  try {
+    request = JSON.parse(line);
+  } catch (e) {
+    return;
+  }
+  const results = (request.files || []).map((file) => {
+    try {
+      return check(file);
+    } catch (e) {
+      return { path: file.path, ok: null, errors: [String(e)] };
+    }
+  });
+  process.stdout.write(JSON.stringify({ id: request.id, results }) + '\n');
+});
@@ -4,7 +4,18 @@ from . import views
 urlpatterns = [
     path("upload/", views.upload_project, name="upload_project"),
     path("fix/", views.fix_bug_view, name="fix_bug_view"),
+    path("sessions/", views.create_session, name="create_session"),
+    path("sessions/<str:session_id>/", views.session_detail, name="session_detail"),
+    path("sessions/<str:session_id>/apply/", views.apply_session, name="apply_session"),
+    path("jobs/<str:job_id>/", views.job_status, name="job_status"),
+    path("jobs/<str:job_id>/cancel/", views.cancel_job, name="cancel_job"),
+    path("tree/", views.folder_tree, name="folder_tree"),
+    path("usage/", views.llm_usage, name="llm_usage"),
+    path("metrics/", views.metrics, name="metrics"),
+    path("index_status/", views.index_status, name="index_status"),
     path("preview_fix/", views.preview_fix, name="preview_fix"),
+    path("preview_fix/stream/", views.preview_fix_stream, name="preview_fix_stream"),
     path('apply_fix/', views.apply_fix, name='apply_fix'),
+    path("apply_fixes/", views.apply_fixes, name="apply_fixes"),
 ]
 
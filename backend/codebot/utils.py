@@ -1,14 +1,79 @@
-import subprocess
 import os
+import shutil
+import hashlib
+import tempfile
+
+from .frontend_utils import verify_json_source, verify_typescript_sources, SCRIPT_EXTENSIONS
+from .tracing import traced
+from .watcher import invalidate_path
+
+# Read once at import; os.umask can only be queried by setting it, which is not thread-safe
+UMASK = os.umask(0)
+os.umask(UMASK)
 
 def read_file(path):
     with open(path, "r", encoding="utf-8") as f:
         return f.read()
 
+def text_sha1(text):
+    """sha1 of a text's UTF-8 bytes, used to tell whether a file changed since a fix was proposed."""
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
 def write_file(path, content):
-    os.makedirs(os.path.dirname(path), exist_ok=True)
-    with open(path, "w", encoding="utf-8") as f:
-        f.write(content)
+    """
+    Write text atomically: the content goes to a temp file in the same folder,
+    is fsynced and then renamed over path, so readers and crashes only ever see
+    the old or the new file. Existing permissions are kept, and a watcher's
+    cached copy of the file is dropped right away.
+    """
+    folder = os.path.dirname(path) or "."
+    os.makedirs(folder, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=folder, prefix=f".{os.path.basename(path)}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(content)
+            f.flush()
+            os.fsync(f.fileno())
+        if os.path.exists(path):
+            shutil.copymode(path, tmp_path)
+        else:
+            os.chmod(tmp_path, 0o666 & ~UMASK)  # mkstemp creates files as 0600
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+    invalidate_path(path)
+    _fsync_dir(folder)
+
+def _fsync_dir(folder):
+    if os.name != "posix":
+        return
+    try:
+        fd = os.open(folder, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+def verify_python_source(source, file_path="<fix>"):
+    """
+    Compile Python source in-process to check for syntax errors, without writing it anywhere.
+    Returns (bool, str): (success, error_message)
+    """
+    try:
+        compile(source, file_path, "exec", dont_inherit=True)
+        return True, ""
+    except (SyntaxError, ValueError) as e:
+        if isinstance(e, SyntaxError):
+            return False, f"{file_path}:{e.lineno}:{e.offset}: {e.msg}"
+        return False, f"{file_path}: {e}"
 
 def verify_code(file_path):
     """
@@ -16,12 +81,38 @@ def verify_code(file_path):
     Returns True if compilation succeeds, False otherwise.
     """
     try:
-        # Use python found on PATH; for portability use sys.executable in advanced setups
-        subprocess.check_output(["python3", "-m", "py_compile", file_path], stderr=subprocess.STDOUT)
-        return True
-    except subprocess.CalledProcessError as e:
-        try:
-            print(e.output.decode())
-        except Exception:
-            print(e.output)
-        return False
+        passed, error_message = verify_python_source(read_file(file_path), file_path)
+    except (OSError, UnicodeDecodeError) as e:
+        passed, error_message = False, str(e)
+    if not passed:
+        print(error_message)
+    return passed
+
+@traced("verify")
+def verify_sources(files):
+    """
+    Syntax-check in-memory sources given as [(file_path, source)]; TS/JS files
+    go to the warm TypeScript checker as a single batch.
+    Returns [(passed, error_message)] in input order; passed is None for file
+    types without a checker.
+    """
+    results = [None] * len(files)
+    scripts = []
+    for i, (file_path, source) in enumerate(files):
+        lower_path = file_path.lower()
+        if lower_path.endswith('.py'):
+            results[i] = verify_python_source(source, file_path)
+        elif lower_path.endswith('.json'):
+            results[i] = verify_json_source(source)
+        elif lower_path.endswith(SCRIPT_EXTENSIONS):
+            scripts.append(i)
+        else:
+            results[i] = (None, "")
+    if scripts:
+        checked = verify_typescript_sources([files[i] for i in scripts])
+        for i, result in zip(scripts, checked):
+            results[i] = result
+    return results
+
+def verify_source(file_path, source):
+    return verify_sources([(file_path, source)])[0]
@@ -1,11 +1,20 @@
 import os
+import queue
+import threading
 from unittest import result
 from dotenv import load_dotenv
 import zipfile
-from django.http import JsonResponse, HttpResponse
+from django.http import JsonResponse, HttpResponse, StreamingHttpResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.conf import settings
-from .bot_core import CodeBot, find_relevant_files, extract_code, read_file, difflib, write_file, get_file_type, verify_typescript, verify_json, verify_code
+from .registry import get_bot, get_registry
+from .bot_core import CodeBot, find_relevant_files, extract_code, read_file, write_file, get_file_type, verify_typescript, verify_json, verify_code
+from .jobs import get_job_queue
+from .sessions import get_sessions, SessionError
+from .context_builder import get_usage_log
+from .tracing import metrics as trace_metrics
+from .watcher import get_watcher
+from .folder_tree import TREE_EXCLUDE, build_tree, tree_from_files, expand_directory, is_hidden_from_tree
 from rest_framework.decorators import api_view
 from rest_framework.response import Response
 from pathlib import Path
@@ -15,31 +24,20 @@ load_dotenv()
 
 UPLOAD_DIR = os.path.join(settings.MEDIA_ROOT, "projects")
 os.makedirs(UPLOAD_DIR, exist_ok=True)
-EXCLUDE = {
-    "__pycache__", "venv", "env", ".env", ".git",
-    "node_modules", "dist", "build", ".idea", ".vscode"
-}
+EXCLUDE = TREE_EXCLUDE
 
 MAX_DEPTH = 3
 
 def get_folder_structure(path: str, depth: int = MAX_DEPTH):
-    """Recursively build folder structure as a dictionary, excluding unwanted files/folders."""
-    path = Path(path)
-    
-    # Skip excluded files/folders
-    if path.name in EXCLUDE or path.name.startswith(".") or path.name.endswith(('env')):
-        return None
-    
-    if path.is_file():
-        return path.name
-
-    structure = {}
-    for child in path.iterdir():
-        child_struct = get_folder_structure(child, depth - 1)
-        if child_struct:  # skip excluded or empty
-            structure[child.name] = child_struct
-
-    return structure if structure else None
+    """
+    Folder structure as a nested dictionary, `depth` folder levels deep.
+    Uses the project's file watcher when one is running, otherwise the
+    mtime-cached directory listings in folder_tree.
+    """
+    watcher = get_watcher(str(path))
+    if watcher is not None:
+        return tree_from_files(watcher.files(), depth)
+    return build_tree(str(path), depth)
 
 @csrf_exempt
 def upload_project(request):
@@ -62,16 +60,21 @@ def upload_project(request):
                 )
 
             # Load project into CodeBot state
-            bot = CodeBot(project_path=project_path, groq_api_key=os.getenv("GEMINI_API_KEY"), gemini_api_key=os.getenv("GEMINI_API_KEY"))
+            bot = get_bot(project_path)
             bot.load_project(project_path)
 
-            folder_structure = get_folder_structure(str(project_path))
+            try:
+                depth = max(1, int(request.POST.get("depth", MAX_DEPTH)))
+            except ValueError:
+                depth = MAX_DEPTH
+            folder_structure = get_folder_structure(str(project_path), depth)
 
 
             return JsonResponse({
                 "status": "loaded",
                 "project_path": os.path.abspath(project_path),
                 "folder_structure": folder_structure,
+                "last_indexed": bot.last_indexed,
                 "message": f"Project '{os.path.basename(project_path)}' loaded successfully"
             })
 
@@ -83,7 +86,7 @@ def upload_project(request):
 
 
 def fix_bug_view(request):
-    """Fix bug in uploaded project"""
+    """Queue a background job that fixes a bug in the uploaded project"""
     bug_description = request.GET.get("desc")
     project_path = request.GET.get("project")
     print("project_path", project_path)
@@ -95,7 +98,6 @@ def fix_bug_view(request):
         }, status=400)
 
     groq_api_key = os.getenv("GROQ_API_KEY")
-    gemini_api_key= os.getenv("GEMINI_API_KEY")
     if not groq_api_key:
         print("Error: GROQ_API_KEY not found in .env")
         return JsonResponse({
@@ -103,15 +105,174 @@ def fix_bug_view(request):
             "message": "GROQ_API_KEY not configured"
         }, status=500)
 
-    # Call the CodeBot to fix the bug
-    bot = CodeBot(project_path=project_path, groq_api_key=groq_api_key, gemini_api_key=gemini_api_key)
-    bot.smart_fix_bug(bug_description)
+    # The job doubles as a fix session, so its proposals can be previewed and applied by id
+    job_id = get_sessions().create(project_path, bug_description)
 
     return JsonResponse({
-        "status": "success",
+        "status": "queued",
+        "job_id": job_id,
+        "session_id": job_id,
         "filePathwithName": "",  # or actual file path if available
         "message": f"Bug fixing started for: {bug_description}"
-    }, status=200)
+    }, status=202)
+
+
+@csrf_exempt
+def create_session(request):
+    """
+    Start a fix session: POST {"project_path", "bug_description"}, or
+    {"project_path", "bug_descriptions": [...]} to fix several bugs with one
+    request per affected file. Relevant files and proposals are computed once
+    in the background; poll the session for them.
+    """
+    if request.method != "POST":
+        return JsonResponse({"error": "Only POST allowed"}, status=405)
+    try:
+        body = json.loads(request.body.decode("utf-8"))
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+    project_path = body.get("project_path")
+    bug_description = body.get("bug_description")
+    if "bug_descriptions" in body:
+        bug_description = body["bug_descriptions"]
+        if not isinstance(bug_description, list) or not all(isinstance(d, str) for d in bug_description):
+            return JsonResponse({"error": "bug_descriptions must be a list of strings"}, status=400)
+        bug_description = [d for d in bug_description if d.strip()]
+    if not project_path or not bug_description:
+        return JsonResponse({"error": "project_path and bug_description(s) are required"}, status=400)
+
+    session_id = get_sessions().create(project_path, bug_description)
+    return JsonResponse({"status": "queued", "session_id": session_id}, status=202)
+
+
+def session_detail(request, session_id):
+    """Status and previews of a fix session; ?wait=N long-polls up to N seconds for it to finish"""
+    try:
+        wait = min(float(request.GET.get("wait", 0)), 60)
+    except ValueError:
+        wait = 0
+    session = get_sessions().get(session_id, wait=wait)
+    if session is None:
+        return JsonResponse({"error": "Session not found"}, status=404)
+    return JsonResponse(session)
+
+
+@csrf_exempt
+def apply_session(request, session_id):
+    """Apply a fix session's stored proposals: POST {"prompt": "yes", "files": [optional subset]}"""
+    if request.method != "POST":
+        return JsonResponse({"error": "Only POST allowed"}, status=405)
+    try:
+        body = json.loads(request.body.decode("utf-8") or "{}")
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+    if body.get("prompt", "").strip().lower() != "yes":
+        return JsonResponse({
+            "status": "skipped",
+            "message": "Fixes not applied because prompt was not 'Yes'"
+        })
+
+    try:
+        result = get_sessions().apply(session_id, files=body.get("files"))
+    except SessionError as e:
+        return JsonResponse({"error": str(e)}, status=e.status)
+    except Exception as e:
+        import traceback
+        traceback.print_exc()
+        return JsonResponse({"error": str(e)}, status=500)
+    return JsonResponse(result, status=200 if result["status"] == "success" else 409)
+
+
+def job_status(request, job_id):
+    """Poll the status and result of a background job"""
+    job = get_job_queue().get(job_id)
+    if job is None:
+        return JsonResponse({"error": "Job not found"}, status=404)
+    return JsonResponse(job)
+
+
+@csrf_exempt
+def cancel_job(request, job_id):
+    """Cancel a queued or running background job"""
+    if request.method != "POST":
+        return JsonResponse({"error": "Only POST allowed"}, status=405)
+    job = get_job_queue().cancel(job_id)
+    if job is None:
+        return JsonResponse({"error": "Job not found"}, status=404)
+    return JsonResponse(job)
+
+
+def known_project_root(project_path=None):
+    """
+    The project folder a request may browse: the default project (the folder
+    upload_project registers) or one loaded in the registry. Returns None for
+    any other path, so a caller-supplied path never becomes the root.
+    """
+    default = os.path.abspath(str(Path(settings.BASE_DIR).parent))
+    if not project_path:
+        return default
+    project_path = os.path.abspath(project_path)
+    if project_path == default or project_path in get_registry().projects():
+        return project_path
+    return None
+
+
+def folder_tree(request):
+    """Lazily expand one level of the project tree: GET /api/tree/?path=<folder relative to the project>"""
+    project_path = known_project_root(request.GET.get("project_path"))
+    if project_path is None:
+        return JsonResponse({"error": "Project is not loaded"}, status=403)
+    rel_path = request.GET.get("path", "").strip("/")
+    root = os.path.realpath(project_path)
+    target = os.path.realpath(os.path.join(root, rel_path))  # resolves ".." and symlinks
+    if target != root and not target.startswith(root + os.sep):
+        return JsonResponse({"error": "Path is outside the project"}, status=400)
+    if rel_path and any(is_hidden_from_tree(part) for part in Path(rel_path).parts):
+        return JsonResponse({"error": "Folder not found"}, status=404)
+    if not os.path.isdir(target):
+        return JsonResponse({"error": "Folder not found"}, status=404)
+
+    entries = expand_directory(target)
+    for entry in entries:
+        entry["path"] = os.path.join(rel_path, entry["name"]) if rel_path else entry["name"]
+    return JsonResponse({"path": rel_path, "entries": entries})
+
+
+def index_status(request):
+    """Report whether a project's files are being watched and when it was last indexed"""
+    project_path = request.GET.get("project_path") or str(Path(settings.BASE_DIR).parent)
+    watcher = get_watcher(project_path)
+    if watcher is None:
+        return JsonResponse({"project_path": os.path.abspath(project_path), "watching": False, "last_indexed": None})
+    return JsonResponse(dict(watcher.status(), project_path=watcher.project_path))
+
+
+def llm_usage(request):
+    """Token counts and latency of recent LLM requests, plus running totals"""
+    try:
+        recent = int(request.GET.get("recent", 20))
+    except ValueError:
+        return JsonResponse({"error": "recent must be an integer"}, status=400)
+    if recent < 0:
+        return JsonResponse({"error": "recent must not be negative"}, status=400)
+    return JsonResponse(get_usage_log().summary(recent=recent))
+
+
+def metrics(request):
+    """Stage and endpoint latency summaries plus LLM totals, in Prometheus text format"""
+    totals = get_usage_log().summary(recent=0)["totals"]
+    lines = [
+        "# HELP codebot_llm_requests_total LLM requests, including cache hits.",
+        "# TYPE codebot_llm_requests_total counter",
+        f'codebot_llm_requests_total{{cached="false"}} {totals["requests"] - totals["cached"]}',
+        f'codebot_llm_requests_total{{cached="true"}} {totals["cached"]}',
+        "# HELP codebot_llm_tokens_total Tokens reported by the model.",
+        "# TYPE codebot_llm_tokens_total counter",
+        f'codebot_llm_tokens_total{{kind="prompt"}} {totals["prompt_tokens"]}',
+        f'codebot_llm_tokens_total{{kind="output"}} {totals["output_tokens"]}',
+    ]
+    body = trace_metrics.render() + "\n".join(lines) + "\n"
+    return HttpResponse(body, content_type="text/plain; version=0.0.4; charset=utf-8")
 
 
 @csrf_exempt
@@ -125,17 +286,13 @@ def preview_fix(request):
         project_path = body.get("project_path")
 
 
-        bot = CodeBot(groq_api_key=os.getenv("GROQ_API_KEY"), gemini_api_key= os.getenv("GEMINI_API_KEY"))
-        bot.project_path = project_path  # Set project path from request
+        bot = get_bot(project_path)
 
-        relevant_files = find_relevant_files(bot.project_path, bug_description)
+        relevant_files = bot.find_relevant_files(bug_description, top_k=3)
         if not relevant_files:
             return JsonResponse({"message": "No relevant files found for this bug."})
 
-        previews = []
-        for file_path, score in relevant_files[:3]:
-            preview = bot._propose_fix(file_path, bug_description)
-            previews.append(preview)
+        previews = bot.propose_fixes([file_path for file_path, score in relevant_files], bug_description)
 
         return JsonResponse({"previews": previews}, safe=False)
 
@@ -145,6 +302,70 @@ def preview_fix(request):
         return JsonResponse({"error": str(e)}, status=500)
 
 
+def json_line(event: dict) -> str:
+    return json.dumps(event) + "\n"
+
+
+@csrf_exempt
+def preview_fix_stream(request):
+    """
+    Streaming variant of preview_fix. Responds with JSON lines:
+    {"event": "files"} with the ranked files, then "chunk" events with partial
+    LLM output and a "preview" event per file as soon as it is ready, then "done".
+    """
+    if request.method != "POST":
+        return JsonResponse({"error": "Only POST allowed"}, status=405)
+
+    try:
+        body = json.loads(request.body.decode("utf-8"))
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+    bug_description = body.get("bug_description")
+    project_path = body.get("project_path")
+
+    bot = get_bot(project_path)
+
+    def events():
+        try:
+            relevant_files = bot.find_relevant_files(bug_description, top_k=3)
+            yield json_line({"event": "files", "files": [{"file": path, "score": score} for path, score in relevant_files]})
+            if not relevant_files:
+                yield json_line({"event": "done", "message": "No relevant files found for this bug."})
+                return
+
+            pending = queue.Queue()
+
+            def on_chunk(file_path, text):
+                pending.put({"event": "chunk", "file": file_path, "text": text})
+
+            def run():
+                try:
+                    paths = [file_path for file_path, score in relevant_files]
+                    for file_path, preview in bot.iter_proposals(paths, bug_description, on_chunk=on_chunk):
+                        pending.put({"event": "preview", "file": file_path, "preview": preview})
+                except Exception as e:
+                    pending.put({"event": "error", "message": str(e)})
+                finally:
+                    pending.put(None)
+
+            threading.Thread(target=run, daemon=True).start()
+            while True:
+                event = pending.get()
+                if event is None:
+                    break
+                yield json_line(event)
+            yield json_line({"event": "done"})
+        except Exception as e:
+            import traceback
+            traceback.print_exc()
+            yield json_line({"event": "error", "message": str(e)})
+
+    response = StreamingHttpResponse(events(), content_type="application/x-ndjson")
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"
+    return response
+
+
 @csrf_exempt
 def apply_fix(request):
     if request.method != "POST":
@@ -167,7 +388,7 @@ def apply_fix(request):
             })
 
 
-        bot = CodeBot(groq_api_key=os.getenv("GROQ_API_KEY"))
+        bot = get_bot(file_path=file_path)
         result = bot._apply_fix(file_path, fixed_code, prompt)
 
         return JsonResponse(result, safe=False)
@@ -175,4 +396,49 @@ def apply_fix(request):
     except Exception as e:
         import traceback
         traceback.print_exc()
-        return JsonResponse({"error": str(e)}, status=500)
\ No newline at end of file
+        return JsonResponse({"error": str(e)}, status=500)
+
+@csrf_exempt
+def apply_fixes(request):
+    """
+    Apply several fixes in one request: {"fixes": [{"file_path", "fixed_code", "original_sha1"?}],
+    "prompt": "yes", "message": "..."}. Files are verified together, written atomically, rolled back
+    together on failure and committed once.
+    """
+    if request.method != "POST":
+        return JsonResponse({"error": "Only POST allowed"}, status=405)
+
+    try:
+        body = json.loads(request.body.decode("utf-8"))
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+    if not isinstance(body, dict):
+        return JsonResponse({"error": "Request body must be a JSON object"}, status=400)
+
+    fixes = body.get("fixes")
+    if not fixes or not isinstance(fixes, list) or any(
+        not isinstance(fix, dict)
+        or not isinstance(fix.get("file_path"), str) or not fix["file_path"]
+        or not isinstance(fix.get("fixed_code"), str) or not fix["fixed_code"]
+        for fix in fixes
+    ):
+        return JsonResponse({"error": "fixes must be a list of {file_path, fixed_code} objects"}, status=400)
+    if str(body.get("prompt", "")).strip().lower() != "yes":
+        return JsonResponse({
+            "status": "skipped",
+            "message": "Fixes not applied because prompt was not 'Yes'"
+        })
+
+    try:
+        fixes = [
+            {"file_path": fix["file_path"], "fixed_code": fix["fixed_code"].strip("```"),
+             "original_sha1": fix.get("original_sha1")}
+            for fix in fixes
+        ]
+        bot = get_bot(body.get("project_path"), file_path=fixes[0]["file_path"])
+        result = bot.apply_fixes(fixes, body.get("message") or "apply fixes")
+        return JsonResponse(result, status=200 if result["status"] == "success" else 409)
+    except Exception as e:
+        import traceback
+        traceback.print_exc()
+        return JsonResponse({"error": str(e)}, status=500)
@@ -0,0 +1,328 @@
+import os
+import time
+import errno
+import select
+import struct
+import ctypes
+import ctypes.util
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Set
+
+from .code_analyzer import iter_project_files, is_excluded_dir
+
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+WATCH_MASK = (IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO
+              | IN_CREATE | IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF)
+EVENT_HEADER = struct.Struct("iIII")
+
+CONTENT_CACHE_ENTRIES = 512
+CONTENT_CACHE_MAX_BYTES = 512 * 1024  # larger files are not kept in memory
+
+_watchers: Dict[str, "ProjectWatcher"] = {}
+_watchers_lock = threading.Lock()
+
+
+def _load_inotify():
+    if not hasattr(os, "uname") or os.uname().sysname != "Linux":
+        return None
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        libc.inotify_init1.argtypes = [ctypes.c_int]
+        libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        return libc
+    except (OSError, AttributeError):
+        return None
+
+
+class ProjectWatcher:
+    """
+    Keeps an in-memory view of a project's files up to date in a background thread.
+
+    Uses inotify (through ctypes) on Linux and falls back to polling with
+    os.stat every `interval` seconds elsewhere. Changed relative paths collect
+    in a change set that CodeBot drains to update its manifest and indexes,
+    so request handlers never walk the tree. files() lists the current files
+    and read() serves file contents from a small cache invalidated on change.
+    """
+
+    def __init__(self, project_path: str, interval: float = 2.0, use_inotify: bool = True):
+        self.project_path = os.path.abspath(project_path)
+        self.interval = interval
+        self.backend = None
+        self.needs_full_scan = True  # set until a full manifest refresh has seen the tree
+        self.last_indexed: Optional[float] = None
+        self._files: Set[str] = set()
+        self._pending: Set[str] = set()
+        self._contents = OrderedDict()
+        self._generations: Dict[str, int] = {}  # bumped on every change, so stale reads are not cached
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._libc = _load_inotify() if use_inotify else None
+        self._fd = None
+        self._watches: Dict[int, str] = {}
+        self._stats: Dict[str, tuple] = {}
+
+    # Public API
+
+    def start(self) -> "ProjectWatcher":
+        if self._thread is not None:
+            return self
+        if self._libc is not None:
+            fd = self._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+            if fd >= 0:
+                self._fd = fd
+                self.backend = "inotify"
+        if self.backend is None:
+            self.backend = "polling"
+
+        if self.backend == "inotify":
+            self._add_tree(self.project_path, initial=True)
+            target = self._inotify_loop
+        else:
+            self._stats = self._stat_tree()
+            with self._lock:
+                self._files = set(self._stats)
+            target = self._poll_loop
+
+        self._thread = threading.Thread(target=target, name=f"codebot-watch-{os.path.basename(self.project_path)}", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+    def drain_changes(self) -> List[str]:
+        """
+        Return and clear the relative paths changed since the last call.
+        """
+        with self._lock:
+            changes = sorted(self._pending)
+            self._pending.clear()
+        return changes
+
+    def pending_count(self) -> int:
+        with self._lock:
+            return len(self._pending)
+
+    def files(self) -> List[str]:
+        """
+        Relative paths of all files currently in the project.
+        """
+        with self._lock:
+            return sorted(self._files)
+
+    def read(self, rel_path: str) -> str:
+        """
+        Text of a project file, from the content cache when unchanged.
+        """
+        with self._lock:
+            if rel_path in self._contents:
+                self._contents.move_to_end(rel_path)
+                return self._contents[rel_path]
+            generation = self._generations.get(rel_path, 0)
+        with open(os.path.join(self.project_path, rel_path), "r", encoding="utf-8") as f:
+            content = f.read()
+        if len(content) <= CONTENT_CACHE_MAX_BYTES:
+            with self._lock:
+                if self._generations.get(rel_path, 0) != generation:
+                    return content  # changed while reading; the next read caches the new text
+                self._contents[rel_path] = content
+                while len(self._contents) > CONTENT_CACHE_ENTRIES:
+                    self._contents.popitem(last=False)
+        return content
+
+    def invalidate(self, rel_path: str) -> None:
+        """
+        Drop a file's cached text now, without waiting for the change event.
+        """
+        with self._lock:
+            self._forget(rel_path)
+
+    def mark_indexed(self) -> None:
+        self.last_indexed = time.time()
+
+    def status(self) -> dict:
+        return {
+            "watching": self._thread is not None and self._thread.is_alive(),
+            "backend": self.backend,
+            "files": len(self._files),
+            "pending_changes": self.pending_count(),
+            "last_indexed": self.last_indexed,
+        }
+
+    # Change bookkeeping
+
+    def _forget(self, rel_path: str) -> None:
+        # Caller holds self._lock
+        self._generations[rel_path] = self._generations.get(rel_path, 0) + 1
+        self._contents.pop(rel_path, None)
+
+    def _record(self, rel_path: str) -> None:
+        exists = os.path.isfile(os.path.join(self.project_path, rel_path))
+        with self._lock:
+            self._pending.add(rel_path)
+            self._forget(rel_path)
+            if exists:
+                self._files.add(rel_path)
+            else:
+                self._files.discard(rel_path)
+
+    def _record_tree_removed(self, rel_dir: str) -> None:
+        prefix = rel_dir.rstrip(os.sep) + os.sep
+        with self._lock:
+            gone = [rel_path for rel_path in self._files if rel_path.startswith(prefix)]
+            for rel_path in gone:
+                self._files.discard(rel_path)
+                self._forget(rel_path)
+            self._pending.update(gone)
+
+    # Polling backend
+
+    def _stat_tree(self) -> Dict[str, tuple]:
+        stats = {}
+        for file_path in iter_project_files(self.project_path):
+            try:
+                st = os.stat(file_path)
+            except OSError:
+                continue
+            stats[os.path.relpath(file_path, self.project_path)] = (st.st_mtime, st.st_size)
+        return stats
+
+    def _poll_loop(self) -> None:
+        while not self._stop.wait(self.interval):
+            try:
+                current = self._stat_tree()
+            except OSError as e:
+                print(f"⚠️ Watcher poll failed for {self.project_path}: {e}")
+                continue
+            changed = [rel_path for rel_path, stat in current.items() if self._stats.get(rel_path) != stat]
+            removed = [rel_path for rel_path in self._stats if rel_path not in current]
+            self._stats = current
+            for rel_path in changed + removed:
+                self._record(rel_path)
+
+    # inotify backend
+
+    def _add_tree(self, top: str, initial: bool = False) -> None:
+        for root, dirs, files in os.walk(top):
+            dirs[:] = [d for d in dirs if not is_excluded_dir(d)]
+            wd = self._libc.inotify_add_watch(self._fd, os.fsencode(root), WATCH_MASK)
+            if wd < 0:
+                err = ctypes.get_errno()
+                if err == errno.ENOSPC:
+                    print("⚠️ inotify watch limit reached; some folders are not watched")
+                continue
+            self._watches[wd] = root
+            for file in files:
+                rel_path = os.path.relpath(os.path.join(root, file), self.project_path)
+                if initial:
+                    with self._lock:
+                        self._files.add(rel_path)
+                else:
+                    self._record(rel_path)
+        if initial:
+            # Keep the same file set the rest of codebot sees
+            with self._lock:
+                self._files = {
+                    os.path.relpath(path, self.project_path) for path in iter_project_files(self.project_path)
+                }
+
+    def _inotify_loop(self) -> None:
+        while not self._stop.is_set():
+            try:
+                ready, _, _ = select.select([self._fd], [], [], 0.5)
+            except (OSError, ValueError):
+                return
+            if not ready:
+                continue
+            try:
+                data = os.read(self._fd, 64 * 1024)
+            except BlockingIOError:
+                continue
+            except OSError:
+                return
+            self._handle_events(data)
+
+    def _handle_events(self, data: bytes) -> None:
+        offset = 0
+        while offset + EVENT_HEADER.size <= len(data):
+            wd, mask, _cookie, length = EVENT_HEADER.unpack_from(data, offset)
+            name = data[offset + EVENT_HEADER.size: offset + EVENT_HEADER.size + length].rstrip(b"\0")
+            offset += EVENT_HEADER.size + length
+
+            if mask & IN_Q_OVERFLOW:
+                self.needs_full_scan = True
+                continue
+            if mask & IN_IGNORED:
+                self._watches.pop(wd, None)
+                continue
+            root = self._watches.get(wd)
+            if root is None or not name:
+                continue
+
+            path = os.path.join(root, os.fsdecode(name))
+            rel_path = os.path.relpath(path, self.project_path)
+            if mask & IN_ISDIR:
+                if is_excluded_dir(os.path.basename(path)):
+                    continue
+                if mask & (IN_CREATE | IN_MOVED_TO):
+                    self._add_tree(path)
+                elif mask & (IN_DELETE | IN_MOVED_FROM):
+                    self._record_tree_removed(rel_path)
+            else:
+                self._record(rel_path)
+
+
+def get_watcher(project_path: str, start: bool = False) -> Optional[ProjectWatcher]:
+    """
+    The process-wide watcher for a project. With start=True one is created
+    and started if missing; otherwise None is returned when not watching.
+    """
+    key = os.path.abspath(project_path)
+    with _watchers_lock:
+        watcher = _watchers.get(key)
+        if watcher is None and start:
+            watcher = ProjectWatcher(key, interval=float(os.getenv("CODEBOT_WATCH_INTERVAL", "2"))).start()
+            _watchers[key] = watcher
+        return watcher
+
+
+def invalidate_path(file_path: str) -> None:
+    """
+    Drop the cached text of file_path from the watcher of the project that
+    contains it, if any. Called after codebot writes a file itself.
+    """
+    path = os.path.abspath(file_path)
+    with _watchers_lock:
+        watchers = list(_watchers.values())
+    for watcher in watchers:
+        if path.startswith(watcher.project_path + os.sep):
+            watcher.invalidate(os.path.relpath(path, watcher.project_path))
+
+
+def stop_watcher(project_path: str) -> None:
+    with _watchers_lock:
+        watcher = _watchers.pop(os.path.abspath(project_path), None)
+    if watcher is not None:
+        watcher.stop()
@@ -64,11 +64,29 @@ interface ProjectInfo {
   status: string;
 }
 
+interface Verification {
+  checked: boolean;
+  passed: boolean | null;
+  errors: string;
+  attempts: number;
+}
+
+interface DiffHunk {
+  old_start: number;
+  old_count: number;
+  new_start: number;
+  new_count: number;
+  header: string;
+  lines: string[];
+}
+
 interface PreviewItem {
   file: string;
   changes: string[];
   full_diff: string;
+  hunks?: DiffHunk[];
   fixed_code: string;
+  verification?: Verification;
 }
 
 interface PreviewData {
@@ -168,6 +186,7 @@ const CodeBotPage = () => {
   const [currentProjectPath, setCurrentProjectPath] = useState<string | null>(null);
   const [waitingForBugDescription, setWaitingForBugDescription] = useState<boolean>(false);
   const [currentBugDescription, setCurrentBugDescription] = useState<string | null>(null);
+  const [currentSessionId, setCurrentSessionId] = useState<string | null>(null);
   const [previewData, setPreviewData] = useState<PreviewData | null>(null);
   const [waitingForConfirmation, setWaitingForConfirmation] = useState<boolean>(false);
   const [workflowStep, setWorkflowStep] = useState<string>('initial');
@@ -275,43 +294,48 @@ const CodeBotPage = () => {
 
   const handlePreviewFix = async (bugDescription: string, projectPath: string) => {
     try {
-      const fixUrl = `http://127.0.0.1:8000/api/fix/?desc=${encodeURIComponent(bugDescription)}&project=${encodeURIComponent(projectPath)}`;
-      
-      const fixResponse = await fetch(fixUrl, {
-        method: 'GET',
+      // One fix session computes the relevant files and proposals once; preview and apply reuse it.
+      // Several bugs (one per line) go in a single batch session: one scan, one request per file.
+      const bugLines = bugDescription.split('\n').map((line: string) => line.trim()).filter((line: string) => line);
+      const sessionResponse = await fetch('http://127.0.0.1:8000/api/sessions/', {
+        method: 'POST',
+        headers: {
+          'Content-Type': 'application/json',
+        },
+        body: JSON.stringify(bugLines.length > 1
+          ? { project_path: projectPath, bug_descriptions: bugLines }
+          : { project_path: projectPath, bug_description: bugDescription })
       });
 
-      if (!fixResponse.ok) {
-        throw new Error(`Fix API failed: ${fixResponse.statusText}`);
+      if (!sessionResponse.ok) {
+        throw new Error(`Fix API failed: ${sessionResponse.statusText}`);
       }
 
-      const fixData = await fixResponse.json();
-      
+      const { session_id: sessionId } = await sessionResponse.json();
+      setCurrentSessionId(sessionId);
+
       const fixBotResponse: Message = {
         id: Date.now() + 1,
         type: 'bot',
-        content: `🔧 Bug Fix Initiated\n\n${fixData?.message || 'Bug analysis started...'}`,
-        timestamp: new Date(),
-        apiResponse: fixData
+        content: `🔧 Bug Fix Initiated\n\nBug fixing started for: ${bugDescription}`,
+        timestamp: new Date()
       };
       setMessages(prev => [...prev, fixBotResponse]);
 
-      const previewResponse = await fetch('http://127.0.0.1:8000/api/preview_fix/', {
-        method: 'POST',
-        headers: {
-          'Content-Type': 'application/json',
-        },
-        body: JSON.stringify({
-          project_path: projectPath,
-          bug_description: bugDescription
-        })
-      });
+      let session: any = null;
+      do {
+        const previewResponse = await fetch(`http://127.0.0.1:8000/api/sessions/${sessionId}/?wait=25`);
+        if (!previewResponse.ok) {
+          throw new Error(`Preview API failed: ${previewResponse.statusText}`);
+        }
+        session = await previewResponse.json();
+      } while (session.status === 'queued' || session.status === 'running');
 
-      if (!previewResponse.ok) {
-        throw new Error(`Preview API failed: ${previewResponse.statusText}`);
+      if (session.status !== 'succeeded') {
+        throw new Error(session.error || `Fix session ${session.status}`);
       }
 
-      const previewData = await previewResponse.json();
+      const previewData: PreviewData = { previews: session.previews };
       setPreviewData(previewData);
       setWaitingForBugDescription(false);
       setWaitingForConfirmation(true);
@@ -339,36 +363,31 @@ const CodeBotPage = () => {
   const handleUserConfirmation = async (userResponse: string) => {
     if (userResponse.includes('yes') || userResponse.includes('apply') || userResponse.includes('confirm')) {
       try {
-        if (!previewData?.previews) {
+        if (!previewData?.previews || !currentSessionId) {
           throw new Error('No preview data available');
         }
 
-        const applyPromises = previewData.previews.map(async (preview: PreviewItem) => {
-          const applyResponse = await fetch('http://127.0.0.1:8000/api/apply_fix/', {
-            method: 'POST',
-            headers: {
-              'Content-Type': 'application/json',
-            },
-            body: JSON.stringify({
-              file_path: preview.file,
-              fixed_code: preview.fixed_code,
-              prompt: 'yes'
-            })
-          });
-
-          if (!applyResponse.ok) {
-            throw new Error(`Apply fix failed for ${preview.file}: ${applyResponse.statusText}`);
-          }
-
-          return await applyResponse.json();
+        const applyResponse = await fetch(`http://127.0.0.1:8000/api/sessions/${currentSessionId}/apply/`, {
+          method: 'POST',
+          headers: {
+            'Content-Type': 'application/json',
+          },
+          body: JSON.stringify({
+            prompt: 'yes'
+          })
         });
 
-        const applyResults = await Promise.all(applyPromises);
-        
+        const applyData = await applyResponse.json();
+        if (!applyResponse.ok || applyData.status !== 'success') {
+          throw new Error(applyData.error || `Apply fixes failed: ${applyResponse.statusText}`);
+        }
+        const applyResults = applyData.results;
+
         setWaitingForConfirmation(false);
         setPreviewData(null);
         setCurrentProjectPath(null);
         setCurrentBugDescription(null);
+        setCurrentSessionId(null);
         setWorkflowStep('applied');
 
         const successBotResponse: Message = {
@@ -393,6 +412,7 @@ const CodeBotPage = () => {
       setPreviewData(null);
       setCurrentProjectPath(null);
       setCurrentBugDescription(null);
+      setCurrentSessionId(null);
       setWorkflowStep('initial');
 
       const declineBotResponse: Message = {
@@ -405,10 +425,14 @@ const CodeBotPage = () => {
     }
   };
 
-  const formatDiffView = (changes: string[]): string => {
+  const formatDiffView = (changes: string[], hunks?: DiffHunk[]): string => {
     if (!changes || changes.length === 0) return 'No changes detected';
-    
-    return changes
+
+    // With hunks, show each changed block under its location header
+    const lines = hunks
+      ? hunks.flatMap((hunk: DiffHunk) => [hunk.header, ...hunk.lines.filter((line: string) => !line.startsWith(' '))])
+      : changes;
+    return lines
       .map((line: string) => {
         const trimmedLine = line.trim();
         if (trimmedLine.startsWith('-')) {
@@ -481,6 +505,7 @@ const CodeBotPage = () => {
     setCurrentProjectPath(null);
     setWaitingForBugDescription(false);
     setCurrentBugDescription(null);
+    setCurrentSessionId(null);
     setPreviewData(null);
     setWaitingForConfirmation(false);
     setWorkflowStep('initial');
@@ -561,6 +586,11 @@ const CodeBotPage = () => {
             <Typography variant="body2" sx={{ mb: 2 }}>
               File: <Typography component="code" variant="caption" color="info.main">{preview.file}</Typography>
             </Typography>
+            {preview.verification?.checked && (
+              <Typography variant="body2" sx={{ mb: 2 }} color={preview.verification.passed ? 'success.main' : 'error.main'}>
+                {preview.verification.passed ? '✅ Syntax check passed' : `❌ Syntax check failed: ${preview.verification.errors}`}
+              </Typography>
+            )}
             
             <Card sx={{ mb: 2, bgcolor: 'grey.800' }}>
               <CardContent>
@@ -569,7 +599,7 @@ const CodeBotPage = () => {
                 </Typography>
                 <Paper sx={{ p: 2, bgcolor: 'grey.900', maxHeight: 200, overflow: 'auto' }}>
                   <Typography component="pre" variant="caption" sx={{ fontFamily: 'monospace', whiteSpace: 'pre-wrap' }}>
-                    {formatDiffView(preview.changes)}
+                    {formatDiffView(preview.changes, preview.hunks)}
                   </Typography>
                 </Paper>
               </CardContent>